@@ -0,0 +1,132 @@
+# benchmarks/__main__.py
+"""
+Executa os microbenchmarks da camada de serviços.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks                                # roda e imprime os tempos
+    python -m benchmarks --save benchmarks/baseline.json
+    python -m benchmarks --compare benchmarks/baseline.json --threshold 0.2
+
+ATENÇÃO: o banco informado em --database-url é recriado do zero (drop/create).
+Por padrão é usado um arquivo SQLite temporário.
+"""
+
+import argparse
+import importlib
+import inspect
+import os
+import pkgutil
+import sys
+import tempfile
+
+# Módulos com casos registrados via @benchmark
+BENCH_MODULES = ["benchmarks.bench_services", "benchmarks.bench_views"]
+# Todos os módulos de bot/services (novos serviços entram automaticamente na checagem)
+SERVICE_PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot", "services")
+SERVICE_MODULES = sorted(m.name for m in pkgutil.iter_modules([SERVICE_PACKAGE_DIR]))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Microbenchmarks da camada de serviços do Jovis.")
+    parser.add_argument("--database-url", help="Banco descartável (padrão: SQLite temporário).")
+    parser.add_argument("--users", type=int, default=50, help="Quantidade de usuários semeados.")
+    parser.add_argument("--subjects", type=int, default=8, help="Matérias por usuário.")
+    parser.add_argument("--activities", type=int, default=6, help="Atividades por matéria.")
+    parser.add_argument("--absences", type=int, default=4, help="Faltas por matéria.")
+    parser.add_argument("--grades", type=int, default=3, help="Notas por matéria.")
+    parser.add_argument("--rounds", type=int, default=50, help="Execuções cronometradas por caso.")
+    parser.add_argument("--warmup", type=int, default=5, help="Execuções de aquecimento por caso.")
+    parser.add_argument("-k", "--filter", default="", help="Roda apenas casos cujo nome contém este texto.")
+    parser.add_argument("--save", metavar="ARQUIVO", help="Salva os resultados como baseline JSON.")
+    parser.add_argument("--compare", metavar="ARQUIVO", help="Compara com uma baseline JSON salva.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Regressão tolerada (0.2 = 20%%).")
+    return parser.parse_args()
+
+
+def uncovered_service_functions(cases: dict, excluded: dict) -> list:
+    """Lista as funções públicas de bot/services/* que não têm caso registrado."""
+    missing = []
+    for module_name in SERVICE_MODULES:
+        module = importlib.import_module(f"bot.services.{module_name}")
+        for name, func in inspect.getmembers(module, inspect.isfunction):
+            if name.startswith("_") or func.__module__ != module.__name__:
+                continue
+            key = f"{module_name}.{name}"
+            if key not in cases and key not in excluded:
+                missing.append(key)
+    return missing
+
+
+def main() -> int:
+    args = parse_args()
+
+    # As variáveis precisam existir antes de importar bot.* (o engine é criado no import)
+    tmp_dir = None
+    if not args.database_url:
+        tmp_dir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(tmp_dir.name, 'bench.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+
+    from bot.db.base import Base, SessionLocal, engine
+    from benchmarks import harness
+    from benchmarks.fixtures import seed
+
+    for module_name in BENCH_MODULES:
+        importlib.import_module(module_name)
+    from benchmarks.bench_services import EXCLUDED
+
+    missing = uncovered_service_functions(harness.CASES, EXCLUDED)
+    if missing:
+        print("AVISO: funções de serviço sem benchmark: " + ", ".join(missing))
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    print(f"Semeando {args.users} usuário(s) × {args.subjects} matéria(s)...")
+    fixture = seed(
+        SessionLocal, users=args.users, subjects=args.subjects, activities=args.activities,
+        absences=args.absences, grades=args.grades, calls=args.rounds + args.warmup,
+    )
+
+    results = {}
+    for name, setup in sorted(harness.CASES.items()):
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = harness.run_case(setup, fixture, rounds=args.rounds, warmup=args.warmup)
+        stats = results[name]
+        print(f"{name:<55} mediana {stats['median_ms']:>9.3f} ms   mín {stats['min_ms']:>9.3f} ms")
+
+    engine.dispose()
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+    meta = {
+        "dialect": engine.dialect.name,
+        "users": args.users, "subjects": args.subjects, "activities": args.activities,
+        "absences": args.absences, "grades": args.grades, "rounds": args.rounds,
+    }
+
+    exit_code = 0
+    if args.compare:
+        baseline = harness.load_baseline(args.compare)
+        if baseline.get("meta") != meta:
+            print("AVISO: parâmetros diferentes da baseline; a comparação pode não ser justa.")
+        regressions = harness.compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressão(ões) acima de {args.threshold:.0%}:")
+            for name, before, after, ratio in regressions:
+                print(f"  {name}: {before:.3f} ms -> {after:.3f} ms ({ratio:.2f}x)")
+            exit_code = 1
+        else:
+            print(f"\nNenhuma regressão acima de {args.threshold:.0%}.")
+
+    if args.save:
+        harness.save_baseline(args.save, meta, results)
+        print(f"Baseline salva em {args.save}.")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
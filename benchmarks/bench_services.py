@@ -0,0 +1,811 @@
+# benchmarks/bench_services.py
+"""
+Casos de benchmark para as funções públicas de bot/services/*.
+Cada caso faz o setup necessário e devolve o callable que será cronometrado.
+"""
+
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import count
+
+import numpy as np
+
+from benchmarks.harness import benchmark
+from bot.db.models import User
+from bot.handlers import keyboards
+from bot.services import (
+    user_service, subject_service, activity_service,
+    absence_service, grade_service, course_service,
+    import_service, notification_service, calendar_service,
+    export_service, stats_service, grade_stats_service,
+    attendance_service, timetable_service,
+)
+
+# Funções que não fazem sentido em um microbenchmark (I/O externo).
+EXCLUDED = {
+    "email_service.send_bug_report_email": "envia e-mail via SMTP",
+}
+
+IMPORT_ROW = {
+    "nome": "Banco de Dados", "professor": "Prof. Jovelino", "dia_semana": "Sexta",
+    "sala": "B102", "horario_inicio": "19:00", "horario_fim": "22:40", "semestre": 5,
+}
+
+
+# =============================================================================
+# user_service
+# =============================================================================
+
+@benchmark("user_service.get_or_create_user")
+def bench_get_or_create_user(fx):
+    db = fx.session()
+
+    def run():
+        # Sem o cache da sessão: mede a consulta ao banco, como antes do cache existir
+        db.info.pop("users_by_telegram_id", None)
+        return user_service.get_or_create_user(db, fx.sample_user_id, "Aluno", None)
+    return run
+
+
+@benchmark("user_service.get_or_create_user_cached")
+def bench_get_or_create_user_cached(fx):
+    db = fx.session()
+    user_service.get_or_create_user(db, fx.sample_user_id, "Aluno", None)
+    return lambda: user_service.get_or_create_user(db, fx.sample_user_id, "Aluno", None)
+
+
+@benchmark("user_service.get_all_active_users")
+def bench_get_all_active_users(fx):
+    db = fx.session()
+    return lambda: user_service.get_all_active_users(db)
+
+
+@benchmark("user_service.get_user_by_telegram_id")
+def bench_get_user_by_telegram_id(fx):
+    db = fx.session()
+    return lambda: user_service.get_user_by_telegram_id(db, fx.user_ids[-1])
+
+
+@benchmark("user_service.delete_user_by_id")
+def bench_delete_user_by_id(fx):
+    db = fx.session()
+    ids = count(9_000_000)
+    targets = []
+    for _ in range(fx.calls):
+        user, _ = user_service.get_or_create_user(db, next(ids), "Descartável", None)
+        targets.append(user.user_id)
+    return lambda: user_service.delete_user_by_id(db, targets.pop())
+
+
+@benchmark("user_service.get_upcoming_activities")
+def bench_user_get_upcoming_activities(fx):
+    db = fx.session()
+    return lambda: user_service.get_upcoming_activities(db, days_ahead=1)
+
+
+@benchmark("user_service.mark_user_blocked")
+def bench_mark_user_blocked(fx):
+    db = fx.session()
+    # O usuário já fica bloqueado na primeira chamada; as demais medem o caso sem alteração
+    return lambda: user_service.mark_user_blocked(db, fx.user_ids[-1])
+
+
+@benchmark("user_service.reactivate_user")
+def bench_reactivate_user(fx):
+    db = fx.session()
+    # Caso mais comum: o usuário já está ativo e nada é escrito
+    return lambda: user_service.reactivate_user(db, fx.sample_user_id)
+
+
+@benchmark("user_service.get_reminder_days")
+def bench_get_reminder_days(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: user_service.get_reminder_days(user)
+
+
+@benchmark("user_service.update_reminder_preferences")
+def bench_update_reminder_preferences(fx):
+    db = fx.session()
+    return lambda: user_service.update_reminder_preferences(db, fx.sample_user_id, time(9, 0), [1, 3])
+
+
+@benchmark("user_service.get_users_to_remind")
+def bench_get_users_to_remind(fx):
+    db = fx.session()
+    return lambda: user_service.get_users_to_remind(db, time(9, 0), time(9, 0))
+
+
+@benchmark("user_service.get_activities_due_for_users")
+def bench_get_activities_due_for_users(fx):
+    db = fx.session()
+    today = date.today()
+    return lambda: user_service.get_activities_due_for_users(db, fx.user_ids, today, today + timedelta(days=7))
+
+
+@benchmark("user_service.mark_user_seen")
+def bench_mark_user_seen(fx):
+    db = fx.session()
+    # Já visto hoje: o caso comum, em que o UPDATE não altera nada
+    return lambda: user_service.mark_user_seen(db, fx.sample_user_id)
+
+
+@benchmark("user_service.set_user_course")
+def bench_set_user_course(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: user_service.set_user_course(db, user, "Análise e Desenvolvimento de Sistemas")
+
+
+# =============================================================================
+# subject_service
+# =============================================================================
+
+@benchmark("subject_service.create_subject")
+def bench_create_subject(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: subject_service.create_subject(
+        db, user, "Nova", "Prof.", "Segunda", "Sala 1", time(19, 0), time(20, 40), 1
+    )
+
+
+@benchmark("subject_service.get_subjects_by_user")
+def bench_get_subjects_by_user(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: subject_service.get_subjects_by_user(db, user)
+
+
+@benchmark("keyboards.subject_picker_cold")
+def bench_subject_picker_cold(fx):
+    db = fx.session()
+    user = fx.user(db)
+
+    def run():
+        keyboards.pickers.clear()
+        return keyboards.subject_picker(db, user, "abs.subj")
+    return run
+
+
+@benchmark("keyboards.subject_picker_cached")
+def bench_subject_picker_cached(fx):
+    db = fx.session()
+    user = fx.user(db)
+    keyboards.subject_picker(db, user, "abs.subj")
+    return lambda: keyboards.subject_picker(db, user, "abs.subj")
+
+
+@benchmark("subject_service.get_subjects_by_day_of_week")
+def bench_get_subjects_by_day_of_week(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: subject_service.get_subjects_by_day_of_week(db, user, "Segunda")
+
+
+@benchmark("subject_service.get_subject_by_id")
+def bench_get_subject_by_id(fx):
+    db = fx.session()
+    subject_id = fx.subject(db).id
+    return lambda: subject_service.get_subject_by_id(db, subject_id)
+
+
+@benchmark("subject_service.update_subject")
+def bench_update_subject(fx):
+    db = fx.session()
+    subject_id = fx.subject(db).id
+    return lambda: subject_service.update_subject(db, subject_id, {"room": "Lab. 14"})
+
+
+@benchmark("subject_service.delete_subject_by_id")
+def bench_delete_subject_by_id(fx):
+    db = fx.session()
+    user = fx.user(db)
+    targets = [
+        subject_service.create_subject(db, user, "Descartável", None, "Sábado", None, None, None, None).id
+        for _ in range(fx.calls)
+    ]
+    return lambda: subject_service.delete_subject_by_id(db, targets.pop())
+
+
+@benchmark("subject_service.bulk_create_subjects")
+def bench_bulk_create_subjects(fx):
+    db = fx.session()
+    user = fx.user(db)
+    rows = [dict(IMPORT_ROW, nome=f"Importada {i}") for i in range(50)]
+    return lambda: subject_service.bulk_create_subjects(db, user, rows)
+
+
+@benchmark("subject_service.bulk_create_from_course_subjects")
+def bench_bulk_create_from_course_subjects(fx):
+    db = fx.session()
+    user = fx.user(db)
+    catalog = course_service.get_subjects_by_ids(db, fx.course_subject_ids[:10])
+    return lambda: subject_service.bulk_create_from_course_subjects(db, user, catalog)
+
+
+# =============================================================================
+# activity_service
+# =============================================================================
+
+@benchmark("activity_service.create_activity")
+def bench_create_activity(fx):
+    db = fx.session()
+    user, subject = fx.user(db), fx.subject(db)
+    return lambda: activity_service.create_activity(db, user, subject, "Nova", date.today(), None, "trabalho")
+
+
+@benchmark("activity_service.get_activities_by_user")
+def bench_get_activities_by_user(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: activity_service.get_activities_by_user(db, user)
+
+
+@benchmark("activity_service.get_activities_page")
+def bench_get_activities_page(fx):
+    db = fx.session()
+    user = fx.user(db)
+    # Uma página do meio: o cursor vem da primeira
+    cursor = activity_service.get_activities_page(db, user).last
+    return lambda: activity_service.get_activities_page(db, user, cursor)
+
+
+@benchmark("activity_service.get_activities_by_user_and_type")
+def bench_get_activities_by_user_and_type(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: activity_service.get_activities_by_user_and_type(db, user, "prova")
+
+
+@benchmark("activity_service.get_activity_by_id")
+def bench_get_activity_by_id(fx):
+    db = fx.session()
+    activity_id = activity_service.get_activities_by_user(db, fx.user(db))[0].id
+    return lambda: activity_service.get_activity_by_id(db, activity_id)
+
+
+@benchmark("activity_service.update_activity")
+def bench_update_activity(fx):
+    db = fx.session()
+    activity_id = activity_service.get_activities_by_user(db, fx.user(db))[0].id
+    return lambda: activity_service.update_activity(db, activity_id, {"notes": "Revisar"})
+
+
+@benchmark("activity_service.delete_activity_by_id")
+def bench_delete_activity_by_id(fx):
+    db = fx.session()
+    user, subject = fx.user(db), fx.subject(db)
+    targets = [
+        activity_service.create_activity(db, user, subject, "Descartável", date.today(), None, "prova").id
+        for _ in range(fx.calls)
+    ]
+    return lambda: activity_service.delete_activity_by_id(db, targets.pop())
+
+
+@benchmark("activity_service.get_activities_by_date")
+def bench_get_activities_by_date(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: activity_service.get_activities_by_date(db, user, date.today())
+
+
+@benchmark("activity_service.get_activities_by_date_range")
+def bench_get_activities_by_date_range(fx):
+    db = fx.session()
+    user = fx.user(db)
+    today = date.today()
+    return lambda: activity_service.get_activities_by_date_range(db, user, today, today + timedelta(days=6))
+
+
+@benchmark("activity_service.get_activities_by_subject")
+def bench_get_activities_by_subject(fx):
+    db = fx.session()
+    subject = fx.subject(db)
+    return lambda: activity_service.get_activities_by_subject(db, subject)
+
+
+# =============================================================================
+# absence_service
+# =============================================================================
+
+@benchmark("absence_service.add_absence")
+def bench_add_absence(fx):
+    db = fx.session()
+    user, subject = fx.user(db), fx.subject(db)
+    return lambda: absence_service.add_absence(db, user, subject, date.today(), 1, None)
+
+
+@benchmark("absence_service.get_absences_by_subject")
+def bench_get_absences_by_subject(fx):
+    db = fx.session()
+    subject = fx.subject(db)
+    return lambda: absence_service.get_absences_by_subject(db, subject)
+
+
+@benchmark("absence_service.get_absences_page")
+def bench_get_absences_page(fx):
+    db = fx.session()
+    subject = fx.subject(db)
+    return lambda: absence_service.get_absences_page(db, subject)
+
+
+@benchmark("absence_service.get_absence_by_id")
+def bench_get_absence_by_id(fx):
+    db = fx.session()
+    absence_id = absence_service.get_absences_by_subject(db, fx.subject(db))[0].id
+    return lambda: absence_service.get_absence_by_id(db, absence_id)
+
+
+@benchmark("absence_service.update_absence_quantity")
+def bench_update_absence_quantity(fx):
+    db = fx.session()
+    absence_id = absence_service.get_absences_by_subject(db, fx.subject(db))[0].id
+    return lambda: absence_service.update_absence_quantity(db, absence_id, 2)
+
+
+@benchmark("absence_service.delete_absence_by_id")
+def bench_delete_absence_by_id(fx):
+    db = fx.session()
+    user, subject = fx.user(db), fx.subject(db)
+    targets = [
+        absence_service.add_absence(db, user, subject, date.today(), 1, None).id
+        for _ in range(fx.calls)
+    ]
+    return lambda: absence_service.delete_absence_by_id(db, targets.pop())
+
+
+# =============================================================================
+# grade_service
+# =============================================================================
+
+@benchmark("grade_service.add_grade")
+def bench_add_grade(fx):
+    db = fx.session()
+    user, subject = fx.user(db), fx.subject(db)
+    return lambda: grade_service.add_grade(db, user, subject, "P3", Decimal("7.50"))
+
+
+@benchmark("grade_service.get_grades_by_subject")
+def bench_get_grades_by_subject(fx):
+    db = fx.session()
+    subject = fx.subject(db)
+    return lambda: grade_service.get_grades_by_subject(db, subject)
+
+
+@benchmark("grade_service.get_grades_by_user")
+def bench_get_grades_by_user(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: grade_service.get_grades_by_user(db, user)
+
+
+@benchmark("grade_service.get_grade_by_id")
+def bench_get_grade_by_id(fx):
+    db = fx.session()
+    grade_id = grade_service.get_grades_by_user(db, fx.user(db))[0].id
+    return lambda: grade_service.get_grade_by_id(db, grade_id)
+
+
+@benchmark("grade_service.update_grade")
+def bench_update_grade(fx):
+    db = fx.session()
+    grade_id = grade_service.get_grades_by_user(db, fx.user(db))[0].id
+    return lambda: grade_service.update_grade(db, grade_id, "P1", Decimal("9.00"))
+
+
+@benchmark("grade_service.delete_grade_by_id")
+def bench_delete_grade_by_id(fx):
+    db = fx.session()
+    user, subject = fx.user(db), fx.subject(db)
+    targets = [
+        grade_service.add_grade(db, user, subject, "Descartável", Decimal("5.00")).id
+        for _ in range(fx.calls)
+    ]
+    return lambda: grade_service.delete_grade_by_id(db, targets.pop())
+
+
+# =============================================================================
+# grade_stats_service
+# =============================================================================
+
+@benchmark("grade_stats_service.get_user_standings_cold")
+def bench_get_user_standings_cold(fx):
+    db = fx.session()
+    user = fx.user(db)
+
+    def run():
+        grade_stats_service._cohorts.clear()
+        return grade_stats_service.get_user_standings(db, user)
+    return run
+
+
+@benchmark("grade_stats_service.get_user_standings")
+def bench_get_user_standings(fx):
+    db = fx.session()
+    user = fx.user(db)
+    grade_stats_service.get_user_standings(db, user)
+    return lambda: grade_stats_service.get_user_standings(db, user)
+
+
+@benchmark("grade_stats_service.get_subject_standing")
+def bench_get_subject_standing(fx):
+    db = fx.session()
+    subject = fx.subject(db)
+    grade_stats_service.get_subject_standing(db, subject)
+    return lambda: grade_stats_service.get_subject_standing(db, subject)
+
+
+@benchmark("grade_stats_service.get_course_summary")
+def bench_get_course_summary(fx):
+    db = fx.session()
+    # Todos os usuários do fixture no mesmo curso: a turma é o banco inteiro
+    db.query(User).update({User.course: fx.course})
+    db.commit()
+    return lambda: grade_stats_service.get_course_summary(db, fx.course)
+
+
+@benchmark("grade_stats_service.percentile_ranks")
+def bench_percentile_ranks(fx):
+    rng = np.random.default_rng(0)
+    cohort = np.sort(rng.uniform(0, 10, 50_000))
+    scores = rng.uniform(0, 10, 10)
+    return lambda: grade_stats_service.percentile_ranks(cohort, scores)
+
+
+# =============================================================================
+# attendance_service
+# =============================================================================
+
+@benchmark("attendance_service.current_semester")
+def bench_current_semester(fx):
+    return lambda: attendance_service.current_semester()
+
+
+@benchmark("attendance_service.class_days")
+def bench_class_days(fx):
+    semester = attendance_service.current_semester()
+    return lambda: attendance_service.class_days(semester)
+
+
+@benchmark("attendance_service.lessons_per_class")
+def bench_lessons_per_class(fx):
+    return lambda: attendance_service.lessons_per_class(time(19, 0), time(22, 30))
+
+
+@benchmark("attendance_service.limit_columns")
+def bench_limit_columns(fx):
+    semester = attendance_service.current_semester()
+    return lambda: attendance_service.limit_columns("Segunda", time(19, 0), time(20, 40), semester)
+
+
+@benchmark("attendance_service.apply_limits")
+def bench_apply_limits(fx):
+    db = fx.session()
+    subject = fx.subject(db)
+    return lambda: attendance_service.apply_limits(subject)
+
+
+@benchmark("attendance_service.ensure_limits")
+def bench_ensure_limits(fx):
+    db = fx.session()
+    subject = attendance_service.apply_limits(fx.subject(db))
+    return lambda: attendance_service.ensure_limits(subject)
+
+
+@benchmark("attendance_service.refresh_limits")
+def bench_refresh_limits(fx):
+    db = fx.session()
+    # Um calendário diferente a cada rodada: todas as matérias precisam ser recalculadas
+    starts = count()
+
+    def run():
+        start = date(2000, 1, 1) + timedelta(days=next(starts))
+        return attendance_service.refresh_limits(db, attendance_service.Semester(start, start + timedelta(days=120)))
+    return run
+
+
+@benchmark("attendance_service.warning_level")
+def bench_warning_level(fx):
+    return lambda: attendance_service.warning_level(-3)
+
+
+@benchmark("attendance_service.mark_warned")
+def bench_mark_warned(fx):
+    db = fx.session()
+    levels = {subject.id: 2 for subject in fx.user(db).subjects}
+    return lambda: attendance_service.mark_warned(db, levels)
+
+
+@benchmark("attendance_service.get_subjects_near_limit")
+def bench_get_subjects_near_limit(fx):
+    db = fx.session()
+    attendance_service.refresh_limits(db)
+    return lambda: attendance_service.get_subjects_near_limit(db, remaining=2)
+
+
+# =============================================================================
+# timetable_service
+# =============================================================================
+
+def _group_timetables(fx, db) -> list:
+    # Grupo de estudo com todos os usuários do fixture (até 50)
+    users = db.query(User).filter(User.user_id.in_(fx.user_ids[:50])).all()
+    return [timetable_service.get_timetable(db, user) for user in users]
+
+
+@benchmark("timetable_service.load_timetable")
+def bench_load_timetable(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: timetable_service.load_timetable(db, user)
+
+
+@benchmark("timetable_service.get_timetable")
+def bench_get_timetable(fx):
+    db = fx.session()
+    user = fx.user(db)
+    timetable_service.get_timetable(db, user)
+    return lambda: timetable_service.get_timetable(db, user)
+
+
+@benchmark("timetable_service.Timetable.next_class")
+def bench_timetable_next_class(fx):
+    db = fx.session()
+    timetable = timetable_service.get_timetable(db, fx.user(db))
+    now = datetime(2026, 3, 6, 21, 0)
+    return lambda: timetable.next_class(now)
+
+
+@benchmark("timetable_service.Timetable.is_free")
+def bench_timetable_is_free(fx):
+    db = fx.session()
+    timetable = timetable_service.get_timetable(db, fx.user(db))
+    return lambda: timetable.is_free(4, time(19, 30))
+
+
+@benchmark("timetable_service.free_slots")
+def bench_free_slots(fx):
+    db = fx.session()
+    busy = timetable_service.get_timetable(db, fx.user(db)).busy_mask(0)
+    return lambda: timetable_service.free_slots(busy)
+
+
+@benchmark("timetable_service.common_free_slots")
+def bench_common_free_slots(fx):
+    db = fx.session()
+    group = _group_timetables(fx, db)
+    return lambda: timetable_service.common_free_slots(group, 0, min_minutes=30)
+
+
+# =============================================================================
+# course_service
+# =============================================================================
+
+@benchmark("course_service.get_available_courses")
+def bench_get_available_courses(fx):
+    db = fx.session()
+    return lambda: course_service.get_available_courses(db)
+
+
+@benchmark("course_service.get_ideal_grade_subjects")
+def bench_get_ideal_grade_subjects(fx):
+    db = fx.session()
+    return lambda: course_service.get_ideal_grade_subjects(db, fx.course, fx.shift, 1)
+
+
+@benchmark("course_service.get_all_subjects_for_course")
+def bench_get_all_subjects_for_course(fx):
+    db = fx.session()
+    return lambda: course_service.get_all_subjects_for_course(db, fx.course, fx.shift)
+
+
+@benchmark("course_service.get_subjects_by_ids")
+def bench_get_subjects_by_ids(fx):
+    db = fx.session()
+    return lambda: course_service.get_subjects_by_ids(db, fx.course_subject_ids)
+
+
+@benchmark("course_service.check_schedule_conflict")
+def bench_check_schedule_conflict(fx):
+    db = fx.session()
+    catalog = course_service.get_all_subjects_for_course(db, fx.course, fx.shift)
+    # Uma matéria por dia da semana: o pior caso, em que nenhum conflito é encontrado
+    by_day = {s.day_of_week: s for s in catalog}
+    selection = list(by_day.values())
+    return lambda: course_service.check_schedule_conflict(selection)
+
+
+# =============================================================================
+# import_service
+# =============================================================================
+
+@benchmark("import_service.iter_json_rows")
+def bench_iter_json_rows(fx):
+    payload = json.dumps([IMPORT_ROW] * 500)
+    return lambda: sum(1 for _ in import_service.iter_json_rows(io.StringIO(payload)))
+
+
+@benchmark("import_service.iter_csv_rows")
+def bench_iter_csv_rows(fx):
+    header = ",".join(IMPORT_ROW)
+    line = ",".join(str(value) for value in IMPORT_ROW.values())
+    payload = "\n".join([header] + [line] * 500)
+    return lambda: sum(1 for _ in import_service.iter_csv_rows(io.StringIO(payload)))
+
+
+@benchmark("import_service.parse_time")
+def bench_parse_time(fx):
+    return lambda: import_service.parse_time("19:00")
+
+
+@benchmark("import_service.validate_subject_row")
+def bench_validate_subject_row(fx):
+    return lambda: import_service.validate_subject_row(IMPORT_ROW)
+
+
+# =============================================================================
+# notification_service
+# =============================================================================
+
+def _notifications(fx, n: int, prefix: str) -> list:
+    return [
+        {"user_id": fx.user_ids[i % len(fx.user_ids)], "text": "Lembrete", "dedup_key": f"{prefix}:{i}"}
+        for i in range(n)
+    ]
+
+
+@benchmark("notification_service.enqueue_notifications")
+def bench_enqueue_notifications(fx):
+    db = fx.session()
+    batches = count()
+    return lambda: notification_service.enqueue_notifications(db, _notifications(fx, 100, f"bench-enqueue-{next(batches)}"))
+
+
+@benchmark("notification_service.claim_due_notifications")
+def bench_claim_due_notifications(fx):
+    db = fx.session()
+    notification_service.enqueue_notifications(db, _notifications(fx, 100 * fx.calls, "bench-claim"))
+    return lambda: notification_service.claim_due_notifications(db, 100)
+
+
+@benchmark("notification_service.mark_notifications_sent")
+def bench_mark_notifications_sent(fx):
+    db = fx.session()
+    notification_service.enqueue_notifications(db, _notifications(fx, 100, "bench-sent"))
+    ids = [n["id"] for n in notification_service.claim_due_notifications(db, 100)]
+    return lambda: notification_service.mark_notifications_sent(db, ids)
+
+
+@benchmark("notification_service.mark_notification_failed")
+def bench_mark_notification_failed(fx):
+    db = fx.session()
+    notification_service.enqueue_notifications(db, _notifications(fx, 1, "bench-failed"))
+    notification_id = notification_service.claim_due_notifications(db, 1)[0]["id"]
+    return lambda: notification_service.mark_notification_failed(db, notification_id, "erro", 60.0, 10**9)
+
+
+@benchmark("notification_service.purge_old_notifications")
+def bench_purge_old_notifications(fx):
+    db = fx.session()
+    return lambda: notification_service.purge_old_notifications(db, 0)
+
+
+# =============================================================================
+# calendar_service
+# =============================================================================
+
+@benchmark("calendar_service.get_user_calendar_cold")
+def bench_get_user_calendar_cold(fx):
+    db = fx.session()
+    user = fx.user(db)
+
+    def run():
+        calendar_service._feeds.clear()
+        return calendar_service.get_user_calendar(db, user)
+    return run
+
+
+@benchmark("calendar_service.get_user_calendar")
+def bench_get_user_calendar(fx):
+    db = fx.session()
+    user = fx.user(db)
+    calendar_service.get_user_calendar(db, user)
+    return lambda: calendar_service.get_user_calendar(db, user)
+
+
+@benchmark("calendar_service.render_ics")
+def bench_render_ics(fx):
+    db = fx.session()
+    user = fx.user(db)
+    subjects = subject_service.get_subjects_by_user(db, user)
+    activities = activity_service.get_activities_by_user(db, user)
+    for activity in activities:
+        activity.subject  # carrega antes de cronometrar
+    semester = attendance_service.current_semester()
+    return lambda: calendar_service.render_ics(subjects, activities, semester)
+
+
+@benchmark("calendar_service.get_calendar_token")
+def bench_get_calendar_token(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: calendar_service.get_calendar_token(db, user)
+
+
+@benchmark("calendar_service.get_user_by_calendar_token")
+def bench_get_user_by_calendar_token(fx):
+    db = fx.session()
+    token = calendar_service.get_calendar_token(db, fx.user(db))
+    return lambda: calendar_service.get_user_by_calendar_token(db, token)
+
+
+# =============================================================================
+# export_service
+# =============================================================================
+
+@benchmark("export_service.write_user_export")
+def bench_write_user_export(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: export_service.write_user_export(db, user, io.BytesIO())
+
+
+@benchmark("export_service.iter_subject_rows")
+def bench_iter_subject_rows(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: sum(1 for _ in export_service.iter_subject_rows(db, user))
+
+
+@benchmark("export_service.iter_activity_rows")
+def bench_iter_activity_rows(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: sum(1 for _ in export_service.iter_activity_rows(db, user))
+
+
+@benchmark("export_service.iter_absence_rows")
+def bench_iter_absence_rows(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: sum(1 for _ in export_service.iter_absence_rows(db, user))
+
+
+@benchmark("export_service.iter_grade_rows")
+def bench_iter_grade_rows(fx):
+    db = fx.session()
+    user = fx.user(db)
+    return lambda: sum(1 for _ in export_service.iter_grade_rows(db, user))
+
+
+# =============================================================================
+# stats_service
+# =============================================================================
+
+@benchmark("stats_service.compute_stats")
+def bench_compute_stats(fx):
+    db = fx.session()
+    return lambda: stats_service.compute_stats(db)
+
+
+@benchmark("stats_service.save_stats")
+def bench_save_stats(fx):
+    db = fx.session()
+    stats = stats_service.compute_stats(db)
+    return lambda: stats_service.save_stats(db, stats)
+
+
+@benchmark("stats_service.get_stats")
+def bench_get_stats(fx):
+    db = fx.session()
+    stats_service.refresh_stats(db)
+    return lambda: stats_service.get_stats(db)
+
+
+@benchmark("stats_service.refresh_stats")
+def bench_refresh_stats(fx):
+    db = fx.session()
+    return lambda: stats_service.refresh_stats(db)
@@ -0,0 +1,68 @@
+# benchmarks/bench_views.py
+"""
+Casos de benchmark para a montagem das mensagens (bot/views.py).
+Os objetos são montados em memória: aqui só interessa o custo de renderizar.
+"""
+
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from benchmarks.harness import benchmark
+from bot import views
+from bot.db.models import Activity, Grade, Subject
+
+CALENDAR_SIZE = 200
+
+
+def _subjects(n: int) -> list:
+    return [
+        Subject(
+            id=i, name=f"Matéria <{i}> & cia", professor="Prof. Jovelino", room=f"B{100 + i}",
+            day_of_week=views.WEEKDAYS[i % len(views.WEEKDAYS)], start_time=time(19, 0),
+            end_time=time(22, 40), semestre=3, total_absences=i % 4,
+        )
+        for i in range(n)
+    ]
+
+
+def _activities(n: int, subjects: list) -> list:
+    start = date(2025, 3, 1)
+    return [
+        Activity(
+            id=i, name=f"Entrega {i}", activity_type="trabalho" if i % 2 else "prova",
+            due_date=start + timedelta(days=i % 120), notes="Levar calculadora" if i % 3 == 0 else None,
+            subject=subjects[i % len(subjects)],
+        )
+        for i in range(n)
+    ]
+
+
+@benchmark("views.render_activity_list_200")
+def bench_render_activity_list(fx):
+    activities = _activities(CALENDAR_SIZE, _subjects(12))
+    return lambda: views.render_activity_list(activities)
+
+
+@benchmark("views.render_subject_list")
+def bench_render_subject_list(fx):
+    subjects = _subjects(30)
+    grades = {
+        s.id: [Grade(name=f"P{n}", value=Decimal("7.50")) for n in (1, 2)]
+        for s in subjects
+    }
+    return lambda: views.render_subject_list(subjects, grades)
+
+
+@benchmark("views.render_subject_report")
+def bench_render_subject_report(fx):
+    subject = _subjects(1)[0]
+    activities = _activities(40, [subject])
+    grades = [Grade(name=f"P{n}", value=Decimal("8.25")) for n in range(6)]
+    return lambda: views.render_subject_report(subject, activities, grades)
+
+
+@benchmark("views.split_message")
+def bench_split_message(fx):
+    # Um calendário grande demais para uma mensagem só
+    message = views.render_activity_list(_activities(CALENDAR_SIZE, _subjects(12)))
+    return lambda: views.split_message(message)
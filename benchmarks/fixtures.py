@@ -0,0 +1,122 @@
+# benchmarks/fixtures.py
+"""
+Popula um banco descartável com N usuários × M matérias (e atividades, faltas
+e notas por matéria) para os benchmarks da camada de serviços.
+"""
+
+import json
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import List
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from bot.db.models import User, Subject, Activity, Absence, Grade, CourseSubject
+
+WEEKDAYS = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"]
+SLOTS = [(time(19, 0), time(20, 40)), (time(20, 50), time(22, 30)), (time(7, 40), time(9, 20))]
+BASE_USER_ID = 10_000_000
+
+
+@dataclass
+class Fixture:
+    """Dados semeados e parâmetros compartilhados pelos casos de benchmark."""
+    session: sessionmaker
+    calls: int
+    user_ids: List[int]
+    course: str
+    shift: str
+    course_subject_ids: List[int] = field(default_factory=list)
+
+    @property
+    def sample_user_id(self) -> int:
+        return self.user_ids[0]
+
+    def user(self, db: Session) -> User:
+        return db.query(User).filter(User.user_id == self.sample_user_id).first()
+
+    def subject(self, db: Session) -> Subject:
+        return db.query(Subject).filter(Subject.user_id == self.sample_user_id).order_by(Subject.id).first()
+
+
+def seed_catalog(db: Session, path: str = "data/courses.json") -> None:
+    """Carrega o catálogo de cursos a partir do mesmo JSON usado pelo seed_db."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    for course in data.get("courses", []):
+        for shift in course.get("shifts", []):
+            for subject_data in shift.get("subjects", []):
+                db.add(CourseSubject(
+                    course=course["name"],
+                    shift=shift["name"],
+                    semester=subject_data["semester"],
+                    subject_name=subject_data["subject_name"],
+                    professor_name=subject_data.get("professor_name"),
+                    day_of_week=subject_data["day_of_week"],
+                    start_time=datetime.strptime(subject_data["start_time"], "%H:%M").time(),
+                    end_time=datetime.strptime(subject_data["end_time"], "%H:%M").time(),
+                    room=subject_data.get("room"),
+                ))
+    db.commit()
+
+
+def seed(session_factory: sessionmaker, users: int, subjects: int, activities: int,
+         absences: int, grades: int, calls: int) -> Fixture:
+    """
+    Cria 'users' usuários com 'subjects' matérias cada; cada matéria recebe
+    'activities' atividades, 'absences' faltas e 'grades' notas.
+    """
+    rng = random.Random(42)
+    today = date.today()
+
+    with session_factory() as db:
+        seed_catalog(db)
+
+        user_ids = [BASE_USER_ID + i for i in range(users)]
+        for user_id in user_ids:
+            user = User(user_id=user_id, first_name=f"Aluno {user_id}", username=None)
+            db.add(user)
+            for s in range(subjects):
+                start, end = SLOTS[s % len(SLOTS)]
+                subject = Subject(
+                    name=f"Matéria {s}", professor=f"Prof. {s}", day_of_week=WEEKDAYS[s % len(WEEKDAYS)],
+                    room=f"Sala {s}", start_time=start, end_time=end, semestre=1 + s % 6, owner=user,
+                )
+                db.add(subject)
+                for a in range(activities):
+                    db.add(Activity(
+                        activity_type="trabalho" if a % 2 else "prova", name=f"Atividade {a}",
+                        due_date=today + timedelta(days=rng.randint(-30, 60)), notes=None,
+                        owner=user, subject=subject,
+                    ))
+                total = 0
+                for _ in range(absences):
+                    quantity = rng.randint(1, 2)
+                    total += quantity
+                    db.add(Absence(
+                        absence_date=today - timedelta(days=rng.randint(0, 90)), quantity=quantity,
+                        notes=None, owner=user, subject=subject,
+                    ))
+                subject.total_absences = total
+                for g in range(grades):
+                    db.add(Grade(
+                        name=f"P{g + 1}", value=Decimal(rng.randint(0, 100)) / 10,
+                        owner=user, subject=subject,
+                    ))
+            db.commit()
+
+        first_catalog = db.query(CourseSubject).order_by(CourseSubject.id).first()
+        course_subject_ids = [
+            row[0] for row in db.query(CourseSubject.id).filter_by(
+                course=first_catalog.course, shift=first_catalog.shift
+            ).order_by(CourseSubject.id).all()
+        ]
+
+    return Fixture(
+        session=session_factory, calls=calls, user_ids=user_ids,
+        course=first_catalog.course, shift=first_catalog.shift,
+        course_subject_ids=course_subject_ids,
+    )
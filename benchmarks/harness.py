@@ -0,0 +1,70 @@
+# benchmarks/harness.py
+"""
+Infraestrutura mínima de microbenchmarks: registro de casos, medição de tempo
+e comparação com uma baseline salva em JSON.
+"""
+
+import json
+import statistics
+import time
+from typing import Callable, Dict, List
+
+# Registro global: nome do caso -> função de setup.
+# A função de setup recebe a fixture e devolve o callable que será cronometrado.
+CASES: Dict[str, Callable] = {}
+
+
+def benchmark(name: str | None = None):
+    """Decorador que registra um caso de benchmark."""
+    def decorator(func):
+        CASES[name or func.__name__] = func
+        return func
+    return decorator
+
+
+def run_case(setup: Callable, fixture, rounds: int, warmup: int) -> dict:
+    """Executa um caso e retorna as estatísticas em milissegundos."""
+    target = setup(fixture)
+    for _ in range(warmup):
+        target()
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        target()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "rounds": rounds,
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+    }
+
+
+def save_baseline(path: str, meta: dict, results: dict) -> None:
+    """Grava os resultados atuais como baseline."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> List[tuple]:
+    """
+    Compara a mediana de cada caso com a baseline.
+    Retorna uma lista de (nome, baseline_ms, atual_ms, razão) para os casos
+    que ficaram mais de 'threshold' (ex: 0.2 = 20%) mais lentos.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous.get("median_ms"):
+            continue
+        ratio = current["median_ms"] / previous["median_ms"]
+        if ratio > 1 + threshold:
+            regressions.append((name, previous["median_ms"], current["median_ms"], ratio))
+    return sorted(regressions, key=lambda r: r[3], reverse=True)
@@ -0,0 +1,75 @@
+# benchmarks/memory_growth.py
+"""
+Verifica que o user_data de fluxos abandonados não fica retido na memória.
+
+Simula muitos usuários que saíram no meio de um fluxo (com screenshot de bug,
+listas de matérias etc. no user_data), roda a limpeza e confere com tracemalloc
+que a memória volta ao patamar inicial.
+
+Uso: python -m benchmarks.memory_growth [--users 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from telegram.ext import ApplicationBuilder  # noqa: E402
+
+from bot.jobs import evict_stale_user_data  # noqa: E402
+
+SCREENSHOT_SIZE = 256 * 1024
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Teste de crescimento de memória do user_data.")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--ttl", type=float, default=900)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Fração da memória alocada que pode sobrar.")
+    args = parser.parse_args()
+
+    application = ApplicationBuilder().token("1:benchmark").build()
+    last_seen = {}
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    now = time.monotonic()
+    for user_id in range(args.users):
+        application.user_data[user_id].update({
+            "bug_screenshot": bytearray(SCREENSHOT_SIZE),
+            "all_subject_ids": list(range(60)),
+            "subject_name": "Cálculo I",
+        })
+        last_seen[user_id] = now - args.ttl - 1
+
+    # Um usuário ativo, que não pode ser afetado pela limpeza
+    application.user_data[-1]["subject_name"] = "Ativo"
+    last_seen[-1] = now
+
+    populated, _ = tracemalloc.get_traced_memory()
+    evicted, reclaimed = evict_stale_user_data(application, last_seen, args.ttl, now=now)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    grown = populated - baseline
+    leftover = after - baseline
+    print(f"Alocado pelos fluxos abandonados: {grown / 1024 / 1024:.1f} MiB")
+    print(f"Usuários removidos: {evicted} (~{reclaimed / 1024 / 1024:.1f} MiB estimados)")
+    print(f"Memória restante após a limpeza: {leftover / 1024:.1f} KiB")
+
+    ok = (
+        evicted == args.users
+        and application.user_data.get(-1) == {"subject_name": "Ativo"}
+        and leftover <= grown * args.tolerance
+    )
+    print("OK" if ok else "FALHOU: a memória não foi liberada como esperado.")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# benchmarks/replica_routing.py
+"""
+Verifica o roteamento de leituras para a réplica usando dois bancos SQLite locais
+no lugar do principal e da réplica.
+
+A "réplica" recebe uma cópia dos dados e depois fica propositalmente atrasada:
+o que for gravado só no principal mostra para onde cada leitura foi.
+
+Uso: python -m benchmarks.replica_routing [--window 0.5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+WINDOW_DEFAULT = 0.5
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Teste do roteamento principal/réplica.")
+    parser.add_argument("--window", type=float, default=WINDOW_DEFAULT, help="Janela de read-your-writes (s).")
+    args = parser.parse_args()
+
+    # As variáveis precisam existir antes de importar bot.* (os engines são criados no import)
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir.name, 'primary.db')}"
+    os.environ["DATABASE_REPLICA_URL"] = f"sqlite:///{os.path.join(tmp_dir.name, 'replica.db')}"
+    os.environ["REPLICA_READ_YOUR_WRITES_SECONDS"] = str(args.window)
+    os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+
+    from sqlalchemy.orm import Session
+
+    from bot.db.base import Base, ReadSessionLocal, engine, replica_engine
+    from bot.db.models import Subject, User
+    from bot.db.unit_of_work import UnitOfWork
+    from bot.services import subject_service, user_service
+
+    writer_id, reader_id, newcomer_id = 1, 2, 3
+
+    def seed(bind, names):
+        with Session(bind=bind) as db:
+            for user_id in (writer_id, reader_id):
+                db.add(User(user_id=user_id, first_name=f"Usuário {user_id}"))
+                for name in names:
+                    db.add(Subject(user_id=user_id, name=name, day_of_week="Segunda"))
+            db.commit()
+
+    def subject_names(db, user_id):
+        user = user_service.get_user_by_telegram_id(db, user_id)
+        return sorted(s.name for s in subject_service.get_subjects_by_user(db, user)) if user else []
+
+    for bind in (engine, replica_engine):
+        Base.metadata.create_all(bind=bind)
+    seed(engine, ["Cálculo", "Só no principal"])
+    seed(replica_engine, ["Cálculo"])
+
+    checks = []
+
+    def check(description, ok):
+        checks.append(ok)
+        print(f"{'ok' if ok else 'FALHOU'} - {description}")
+
+    # 1. Sem escritas recentes, a leitura vai para a réplica
+    unit = UnitOfWork(user_id=reader_id)
+    check("leitura sem escrita recente usa a réplica", subject_names(unit.read_session, reader_id) == ["Cálculo"])
+    unit.finish()
+
+    # 2. Depois de gravar, o usuário lê do principal durante a janela
+    unit = UnitOfWork(user_id=writer_id)
+    writer = user_service.get_user_by_telegram_id(unit.session, writer_id)
+    subject_service.create_subject(unit.session, writer, "Física", None, "Terça", None, None, None, None)
+    unit.finish()
+
+    unit = UnitOfWork(user_id=writer_id)
+    check(
+        "quem acabou de gravar lê do principal",
+        subject_names(unit.read_session, writer_id) == ["Cálculo", "Física", "Só no principal"],
+    )
+    unit.finish()
+
+    unit = UnitOfWork(user_id=reader_id)
+    check("os demais usuários continuam na réplica", subject_names(unit.read_session, reader_id) == ["Cálculo"])
+    unit.finish()
+
+    # 3. Passada a janela, o usuário volta para a réplica
+    time.sleep(args.window + 0.1)
+    unit = UnitOfWork(user_id=writer_id)
+    check("depois da janela a leitura volta para a réplica", subject_names(unit.read_session, writer_id) == ["Cálculo"])
+    unit.finish()
+
+    # 4. Uma escrita pela sessão de leitura vai para o principal, e as leituras seguintes também
+    with ReadSessionLocal() as db:
+        user_service.get_or_create_user(db, newcomer_id, "Novo", None)
+        in_primary = user_service.get_user_by_telegram_id(db, newcomer_id) is not None
+    with Session(bind=replica_engine) as db:
+        in_replica = user_service.get_user_by_telegram_id(db, newcomer_id) is not None
+    check("escrita pela sessão de leitura vai para o principal", in_primary and not in_replica)
+
+    engine.dispose()
+    replica_engine.dispose()
+    tmp_dir.cleanup()
+
+    ok = all(checks)
+    print("OK" if ok else "FALHOU: o roteamento não se comportou como esperado.")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
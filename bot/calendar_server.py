@@ -0,0 +1,104 @@
+# bot/calendar_server.py
+"""
+Servidor HTTP opcional com o link de assinatura do calendário:
+
+    GET /calendario/<chave>.ics
+
+Roda numa thread à parte (http.server da biblioteca padrão) e só é ligado quando
+CALENDAR_HTTP_PORT está definido. Os apps de calendário consultam o link de tempos em
+tempos; se o If-None-Match deles já tem a versão atual, a resposta é um 304 sem corpo,
+e o arquivo vem do cache do calendar_service enquanto os dados não mudam.
+"""
+
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from bot.core.settings import CALENDAR_MAX_AGE
+from bot.db.base import ReadSessionLocal
+from bot.services import calendar_service
+
+logger = logging.getLogger(__name__)
+
+PATH_PREFIX = "/calendario/"
+SUFFIX = ".ics"
+# Chave do servidor no bot_data
+CALENDAR_SERVER_KEY = "calendar_server"
+
+
+def feed_url(base_url: str, token: str) -> str:
+    return f"{base_url}{PATH_PREFIX}{token}{SUFFIX}"
+
+
+class CalendarRequestHandler(BaseHTTPRequestHandler):
+    server_version = "Jovis"
+
+    def do_GET(self) -> None:
+        self._serve(send_body=True)
+
+    def do_HEAD(self) -> None:
+        self._serve(send_body=False)
+
+    def _serve(self, send_body: bool) -> None:
+        path = urlsplit(self.path).path
+        if not (path.startswith(PATH_PREFIX) and path.endswith(SUFFIX)):
+            return self._send_empty(HTTPStatus.NOT_FOUND)
+
+        token = path[len(PATH_PREFIX):-len(SUFFIX)]
+        db = ReadSessionLocal()
+        try:
+            user = calendar_service.get_user_by_calendar_token(db, token)
+            feed = calendar_service.get_user_calendar(db, user) if user is not None else None
+        except Exception:
+            logger.exception("Erro ao montar o calendário.")
+            return self._send_empty(HTTPStatus.INTERNAL_SERVER_ERROR)
+        finally:
+            db.close()
+
+        if feed is None:
+            return self._send_empty(HTTPStatus.NOT_FOUND)
+        if feed.matches(self.headers.get("If-None-Match")):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._send_cache_headers(feed)
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/calendar; charset=utf-8")
+        self.send_header("Content-Length", str(len(feed.body)))
+        self._send_cache_headers(feed)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(feed.body)
+
+    def _send_cache_headers(self, feed: calendar_service.CalendarFeed) -> None:
+        self.send_header("ETag", feed.etag)
+        self.send_header("Cache-Control", f"private, max-age={CALENDAR_MAX_AGE}")
+
+    def _send_empty(self, status: HTTPStatus) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_request(self, code="-", size="-") -> None:
+        # O caminho leva a chave do usuário: não vai para o log
+        logger.debug(f"{self.command} {PATH_PREFIX}... -> {code}")
+
+    def log_message(self, format, *args) -> None:
+        logger.warning(format % args)
+
+
+def start_calendar_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Sobe o servidor numa thread daemon; pare com stop_calendar_server."""
+    server = ThreadingHTTPServer((host, port), CalendarRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="calendar-http", daemon=True).start()
+    logger.info(f"Servidor do calendário ouvindo em {host}:{server.server_address[1]}.")
+    return server
+
+
+def stop_calendar_server(server: ThreadingHTTPServer) -> None:
+    server.shutdown()
+    server.server_close()
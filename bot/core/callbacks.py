@@ -0,0 +1,173 @@
+# bot/core/callbacks.py
+"""
+Roteador central dos botões (callback_data).
+
+Todo callback_data tem o formato "<versão>|<ação>|<arg>|<arg>...", por exemplo
+"1|subj.sel|42". Os botões são criados com router.data() e lidos com router.parse(),
+sem split('_') espalhado pelos handlers:
+
+    InlineKeyboardButton(s.name, callback_data=router.data("subj.sel", s.id))
+    subject_id = router.parse(query.data).int_arg()
+
+- Cliques fora de uma conversa são despachados por router.dispatch com uma busca
+  num dicionário (ação -> handler), registrada com @router.route("ação").
+- Dentro de um ConversationHandler, use pattern=router.pattern("ação", ...).
+- Quando o estado não cabe nos 64 bytes do Telegram, router.stash() guarda o payload
+  no servidor (com validade) e o botão leva só uma chave curta. Cada instância tem o
+  seu armazenamento; um payload expirado ou desconhecido vira o aviso de botão expirado.
+- Mudar CALLBACK_VERSION invalida (com o mesmo aviso) os botões já enviados.
+"""
+
+import logging
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from bot.core import dialogs
+from bot.core.settings import CALLBACK_PAYLOAD_TTL
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_VERSION = "1"
+# Limite do Telegram para o callback_data
+MAX_CALLBACK_BYTES = 64
+_SEP = "|"
+# Prefixo do argumento que aponta para um payload guardado no servidor
+_STASH = "~"
+
+Handler = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class Callback:
+    action: str
+    args: tuple[str, ...] = ()
+    # Payload guardado com router.stash() (None nos botões comuns)
+    payload: Any = None
+
+    def int_arg(self, index: int = 0) -> int:
+        return int(self.args[index])
+
+
+class PayloadStore:
+    """Payloads dos botões guardados em memória, cada um com a sua validade."""
+
+    # A partir de quantos payloads vale a pena descartar os expirados
+    PRUNE_AT = 10_000
+
+    def __init__(self, ttl: float = CALLBACK_PAYLOAD_TTL, max_items: int = 4 * PRUNE_AT):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items: dict[str, tuple[float, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, payload: Any) -> str:
+        if len(self._items) >= self.PRUNE_AT:
+            self._prune()
+        token = secrets.token_urlsafe(6)
+        self._items[token] = (time.monotonic() + self.ttl, payload)
+        return token
+
+    def get(self, token: str) -> tuple[bool, Any]:
+        """(True, payload) se a chave existe e ainda vale; (False, None) caso contrário."""
+        entry = self._items.get(token)
+        if entry is None:
+            return False, None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            del self._items[token]
+            return False, None
+        return True, payload
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        self._items = {k: v for k, v in self._items.items() if v[0] >= now}
+        # Ainda cheio: descarta os mais antigos (o dict mantém a ordem de inserção)
+        excess = len(self._items) - self.max_items
+        if excess > 0:
+            for token in list(self._items)[:excess]:
+                del self._items[token]
+
+
+class CallbackRouter:
+    def __init__(self, store: PayloadStore | None = None):
+        self.store = store if store is not None else PayloadStore()
+        self._routes: dict[str, Handler] = {}
+
+    # -------------------------------------------------------------------------
+    # Montagem e leitura do callback_data
+    # -------------------------------------------------------------------------
+
+    def data(self, action: str, *args) -> str:
+        """callback_data de um botão. Levanta ValueError se não couber no limite do Telegram."""
+        parts = [CALLBACK_VERSION, action]
+        for arg in args:
+            text = str(arg)
+            if _SEP in text or text.startswith(_STASH):
+                raise ValueError(f"Argumento inválido para o callback {action}: {text!r}")
+            parts.append(text)
+        data = _SEP.join(parts)
+        if len(data.encode()) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"callback_data com mais de {MAX_CALLBACK_BYTES} bytes: {data!r}")
+        return data
+
+    def stash(self, action: str, payload: Any) -> str:
+        """callback_data cujo estado (qualquer objeto) fica guardado no servidor."""
+        return _SEP.join((CALLBACK_VERSION, action, _STASH + self.store.put(payload)))
+
+    def parse(self, data: object) -> Callback | None:
+        """Lê um callback_data; None se for de outra versão, malformado ou se o payload expirou."""
+        if not isinstance(data, str):
+            return None
+        version, _, rest = data.partition(_SEP)
+        if version != CALLBACK_VERSION or not rest:
+            return None
+        action, *args = rest.split(_SEP)
+        if len(args) == 1 and args[0].startswith(_STASH):
+            found, payload = self.store.get(args[0][1:])
+            return Callback(action, payload=payload) if found else None
+        return Callback(action, tuple(args))
+
+    def pattern(self, *actions: str) -> Callable[[object], bool]:
+        """Filtro para CallbackQueryHandler(pattern=...) que aceita só estas ações."""
+        accepted = frozenset(actions)
+
+        def matches(data: object) -> bool:
+            callback = self.parse(data)
+            return callback is not None and callback.action in accepted
+
+        return matches
+
+    # -------------------------------------------------------------------------
+    # Despacho
+    # -------------------------------------------------------------------------
+
+    def route(self, action: str) -> Callable[[Handler], Handler]:
+        """Decorador que registra o handler de uma ação fora das conversas."""
+        def decorator(handler: Handler) -> Handler:
+            if action in self._routes:
+                raise ValueError(f"Ação de callback registrada duas vezes: {action}")
+            self._routes[action] = handler
+            return handler
+        return decorator
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Any:
+        """Handler dos cliques que nenhuma conversa tratou."""
+        query = update.callback_query
+        callback = self.parse(query.data)
+        handler = self._routes.get(callback.action) if callback else None
+        if handler is None:
+            # Botão antigo (outra versão ou payload expirado) ou de uma conversa já encerrada
+            logger.debug(f"Callback sem handler: {query.data!r}")
+            await query.answer(dialogs.CALLBACK_EXPIRED, show_alert=True)
+            return None
+        return await handler(update, context)
+
+
+router = CallbackRouter()
@@ -0,0 +1,74 @@
+# bot/core/cluster.py
+
+import asyncio
+import functools
+import logging
+
+from telegram.ext import ContextTypes
+
+from bot.core.settings import INSTANCE_COUNT, INSTANCE_INDEX
+
+logger = logging.getLogger(__name__)
+
+# Chave do LeaderElector dentro do application.bot_data
+ELECTOR_KEY = "leader_elector"
+
+
+def user_partition(user_id: int, count: int = INSTANCE_COUNT) -> int:
+    """
+    Partição (0 .. count-1) de um usuário. Usa um hash multiplicativo em vez de
+    'user_id % count' direto, para espalhar bem IDs que chegam em sequência.
+    """
+    return ((user_id * 2654435761) & 0xFFFFFFFF) % count
+
+
+def owns_user(user_id: int, count: int = INSTANCE_COUNT, index: int = INSTANCE_INDEX) -> bool:
+    """Indica se esta instância é a responsável pelo usuário."""
+    return count <= 1 or user_partition(user_id, count) == index
+
+
+class LeaderElector:
+    """Guarda o estado de liderança desta instância, renovado periodicamente."""
+
+    def __init__(self, lock):
+        self._lock = lock
+        self.is_leader = False
+
+    async def heartbeat(self) -> bool:
+        """Tenta assumir (ou manter) a liderança. As chamadas ao banco rodam fora do loop."""
+        try:
+            leader = await asyncio.to_thread(self._lock.try_acquire)
+        except Exception as e:
+            logger.error(f"Falha ao verificar a liderança: {e}")
+            leader = False
+        if leader != self.is_leader:
+            logger.info("Esta instância agora é a líder." if leader else "Esta instância deixou de ser a líder.")
+        self.is_leader = leader
+        return leader
+
+    async def resign(self) -> None:
+        await asyncio.to_thread(self._lock.release)
+        self.is_leader = False
+
+
+def cluster_job(partitioned: bool = False):
+    """
+    Decorator para tarefas agendadas quando há mais de uma instância rodando.
+
+    - partitioned=False: a tarefa só roda na instância líder.
+    - partitioned=True: com INSTANCE_COUNT > 1 a tarefa roda em todas as instâncias,
+      e cada uma processa apenas os seus usuários (veja owns_user). Com uma única
+      instância, volta a depender da liderança.
+    """
+    def decorator(job):
+        @functools.wraps(job)
+        async def wrapper(context: ContextTypes.DEFAULT_TYPE):
+            if not (partitioned and INSTANCE_COUNT > 1):
+                elector = context.bot_data.get(ELECTOR_KEY)
+                if elector is not None and not elector.is_leader:
+                    logger.debug(f"Tarefa '{job.__name__}' ignorada: esta instância não é a líder.")
+                    return
+            return await job(context)
+        return wrapper
+    return decorator
+
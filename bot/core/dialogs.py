@@ -2,6 +2,8 @@
 """
 Central de mensagens do bot: utilize constantes definidas abaixo e formate com .format() quando necessário.
 A formatação padrão é HTML (<b> para negrito, <code> para monoespaçado).
+Para mensagens com dados do usuário, prefira as versões compiladas em bot/core/templates.py,
+que já escapam o HTML.
 """
 
 # =============================================================================
@@ -18,6 +20,10 @@ WELCOME_BACK = "Olá de volta, {first_name}! 👋\n\nO que temos pra hoje?"
 OPERATION_CANCELED = "Operação cancelada."
 BACK_TO_MAIN_MENU_PROMPT = "« Voltar ao Menu Principal"
 SEPARATOR = "—" * 20 + "\n"
+PAGE_PREVIOUS = "⬅️ Anterior"
+PAGE_NEXT = "Próxima ➡️"
+CALLBACK_EXPIRED = "Este botão expirou. Envie o comando de novo para ver as opções atualizadas."
+UNEXPECTED_ERROR = "⚠️ Ops, algo deu errado e seu pedido pode não ter sido salvo. Confira e tente de novo em instantes."
 
 MENU_SUBJECTS = "📚 <b>Matérias</b>\n\nO que deseja fazer?"
 MENU_ACTIVITIES = "🗓️ <b>Trabalhos e Provas</b>\n\nO que deseja fazer?"
@@ -40,6 +46,15 @@ AGENDA_WEEK_HEADER = "🗓️ <b>Agenda para os próximos 7 dias (de {start} a {
 NO_ACTIVITIES_WEEK = "Nenhuma atividade agendada para esta semana. Que tranquilidade!"
 WEEK_ACTIVITY_LINE = " • <b>{date_str}:</b> {icon} {name} ({subject_name})\n"
 
+# --- Próxima Aula (/proxima) ---
+NEXT_CLASS_NO_SUBJECTS = "Você não tem aulas na grade. Use /addmateria ou /fatec para cadastrar suas matérias."
+NEXT_CLASS_NOW = "🟢 <b>Agora:</b> {name} até <code>{end}</code> (Sala: {room})\n\n"
+NEXT_CLASS = "⏭️ <b>Próxima aula:</b> {name}\n   {when}, <code>{start}</code>–<code>{end}</code> (Sala: {room})\n"
+NEXT_CLASS_WAIT = "   Começa em {wait}.\n"
+NEXT_CLASS_TODAY = "Hoje"
+NEXT_CLASS_TOMORROW = "Amanhã"
+NEXT_CLASS_DAY = "{weekday}, {date}"
+
 
 # Ajuda
 HELP_TEXT = (
@@ -68,17 +83,22 @@ HELP_TEXT = (
     "• /faltei - Registra uma ou mais faltas.\n"
     "• /gerenciarfaltas - Edita ou exclui registros de faltas.\n"
     "• /addnota - Lança uma nova nota.\n"
-    "• /gerenciarnotas - Edita ou exclui notas.\n\n"
+    "• /gerenciarnotas - Edita ou exclui notas.\n"
+    "• /medias - Mostra suas médias, quanto precisa tirar para passar e sua posição na turma.\n\n"
 
     "⚡ <b>Resumos Rápidos</b>\n"
     "• /hoje - Mostra um resumo das aulas e atividades do dia.\n"
+    "• /proxima - Mostra a aula em andamento e a próxima aula.\n"
     "• /semana - Lista as atividades dos próximos 7 dias.\n\n"
     
     "⚙️ <b>Comandos Gerais</b>\n"
     "• /start - Mostra o menu principal.\n"
     "• /help - Mostra esta mensagem de ajuda.\n"
+    "• /lembretes - Escolhe o horário e a antecedência dos lembretes de prazos.\n"
     "• /bug - Reportar um problema para o desenvolvedor.\n"
     "• /import - (Avançado) Cadastra matérias em massa a partir de um arquivo JSON.\n"
+    "• /exportar - Envia suas aulas e atividades para o app de calendário do celular.\n"
+    "• /exportar dados - Baixa todos os seus dados em um arquivo ZIP.\n"
     "• /deletardados - Apaga todos os seus dados do bot.\n"
     "• /privacidade - Mostra a política de privacidade.\n"
     "• /cancelar - <b>(Importante!)</b> Interrompe qualquer operação."
@@ -87,6 +107,7 @@ HELP_TEXT = (
 # =============================================================================
 # ERROS DE VALIDAÇÃO
 # =============================================================================
+FLOOD_SLOW_DOWN = "Calma! 😅 Você está enviando comandos rápido demais. Espere alguns segundos e tente de novo."
 ERROR_INVALID_TIME = "Formato de hora inválido. 😓 Tente novamente: <b>HH:MM</b>."
 ERROR_INVALID_DATE = "Formato de data inválido. 😓 Tente novamente: <b>DD/MM/AAAA</b>."
 ERROR_INVALID_SEMESTER = "Por favor, envie apenas o número do semestre."
@@ -116,6 +137,7 @@ SUBJECT_LIST_ITEM = (
 
 
 SUBJECT_LIST_GRADES_LINE = "       <i>Notas:</i> {grades}\n"
+SUBJECT_LIST_GRADE = "<b>{name}</b>: {value}"
 SUBJECT_LIST_ABSENCES_LINE = "       <i>Faltas:</i> {absences}\n"
 SUBJECT_LIST_SEPARATOR = "—" * 20 + "\n"
 SUBJECT_LIST_GRADES_PREFIX = "      <b>Notas:</b> {grades}\n"
@@ -154,6 +176,12 @@ ACTIVITY_CREATE_ASK_NOTES = "Data anotada! Você quer adicionar alguma observaç
 ACTIVITY_CREATE_SUCCESS = "✅ <b>{activity_type}</b> '{activity_name}' adicionado(a) com sucesso!"
 ACTIVITY_LIST_HEADER = "🗓️ <b>Seu Calendário de Entregas e Provas:</b>\n\n"
 ACTIVITY_LIST_NO_ACTIVITIES = "Você não tem nenhuma atividade na sua agenda. Use /addtrabalho ou /addprova para começar."
+ACTIVITY_LIST_ITEM = (
+    "{icon} <b>{name}</b> ({activity_type})\n"
+    "   • <b>Matéria:</b> {subject_name}\n"
+    "   • <b>Data:</b> {due_date}\n"
+)
+ACTIVITY_LIST_NOTES_LINE = "   • <b>Obs:</b> {notes}\n"
 # ... (Adicionar aqui os textos de gerenciamento quando implementado)
 
 
@@ -172,6 +200,10 @@ ABSENCE_MANAGE_PROMPT = "Escolha uma matéria para ver o histórico de faltas:"
 ABSENCE_MANAGE_NO_SUBJECTS = "Você não tem matérias para gerenciar faltas."
 ABSENCE_MANAGE_NO_RECORDS = "Nenhum registro de falta encontrado para <b>{subject_name}</b>."
 ABSENCE_MANAGE_HEADER = "Histórico de faltas para <b>{subject_name}</b> (Total: {total}):\n"
+ABSENCE_HISTORY_HEADER = "Histórico de faltas para <b>{subject_name}</b>:\n\n"
+ABSENCE_HISTORY_ITEM = "<b>{number}</b> - {date} - {quantity} Falta(s)\n"
+ABSENCE_HISTORY_NOTES_LINE = "Obs: {notes}\n"
+ABSENCE_HISTORY_CHOOSE = "\nPor favor, envie o <b>número</b> do registro que deseja gerenciar."
 ABSENCE_MANAGE_ACTION_PROMPT = "O que deseja fazer com este registro de falta?"
 ABSENCE_MANAGE_ASK_NEW_QUANTITY = "Qual a nova quantidade para este registro de falta?"
 ABSENCE_MANAGE_DELETE_CONFIRM = "Tem certeza que deseja excluir este registro?"
@@ -180,6 +212,24 @@ ABSENCE_MANAGE_UPDATE_SUCCESS = "Quantidade de faltas atualizada com sucesso!"
 
 ABSENCE_REPORT_HEADER = "📊 <b>Relatório de Faltas:</b>\n\n"
 ABSENCE_REPORT_ITEM = "▪️ <b>{subject_name}:</b> {total_absences} falta(s)\n"
+ABSENCE_REPORT_ITEM_LIMIT = "▪️ <b>{subject_name}:</b> {total_absences} de {absence_limit} falta(s) permitidas, restam {left}\n"
+ABSENCE_REPORT_ITEM_WARNING = "⚠️ <b>{subject_name}:</b> {total_absences} de {absence_limit} falta(s) permitidas, restam só <b>{left}</b>\n"
+ABSENCE_REPORT_ITEM_OVER = "❌ <b>{subject_name}:</b> {total_absences} falta(s), passou do limite de {absence_limit}\n"
+ABSENCE_REPORT_FOOTER = "\n<i>Limites para {min_percent}% de presença nas aulas de {start} a {end}.</i>"
+
+# Aviso automático de faltas
+ATTENDANCE_WARNING = (
+    "⚠️ <b>Atenção às faltas em {subject_name}</b>\n"
+    "Você já tem {total_absences} de {absence_limit} faltas permitidas: restam só <b>{left}</b>."
+)
+ATTENDANCE_WARNING_LAST = (
+    "⚠️ <b>Limite de faltas em {subject_name}</b>\n"
+    "Você chegou às {absence_limit} faltas permitidas. Mais uma e a reprovação por falta é certa!"
+)
+ATTENDANCE_WARNING_OVER = (
+    "❌ <b>Faltas em {subject_name}</b>\n"
+    "Você tem {total_absences} faltas e o limite é {absence_limit}. Converse com o professor ou a coordenação."
+)
 ABSENCE_REPORT_NO_SUBJECTS = "Você não tem matérias cadastradas para ver um relatório de faltas."
 
 # =============================================================================
@@ -208,6 +258,29 @@ GRADE_DELETE_SUCCESS = "Nota excluída com sucesso."
 GRADE_CREATE_INVALID_VALUE = ERROR_INVALID_GRADE
 GRADE_EDIT_INVALID_VALUE   = ERROR_INVALID_GRADE
 
+# --- Médias (/medias e /relatorio) ---
+AVERAGES_HEADER = "📐 <b>Suas Médias</b>\n<i>Média para aprovação: {passing}</i>\n\n"
+AVERAGES_NO_SUBJECTS = "Você não tem matérias cadastradas para calcular médias. Use /addmateria ou /fatec."
+AVERAGES_SUBJECT = "▪️ <b>{subject_name}</b>\n"
+AVERAGES_NO_GRADES = "   - Nenhuma nota lançada.\n"
+AVERAGES_CURRENT = "   Média atual: <b>{weighted}</b> ({grades_count} nota(s))\n"
+AVERAGES_FINAL_PASSED = "   Média final: <b>{final}</b> ✅ Aprovado(a)\n"
+AVERAGES_FINAL_FAILED = "   Média final: <b>{final}</b> ❌ Abaixo da média\n"
+AVERAGES_NEEDED = "   Precisa de <b>{needed}</b> em {missing} para passar\n"
+AVERAGES_SAFE = "   Média garantida, mesmo com 0 em {missing} 🎉\n"
+AVERAGES_UNREACHABLE = "   Mesmo com {grade_max} em {missing} não chega à média 😥\n"
+AVERAGES_PERCENTILE = "   Na turma: à frente de {percentile}% dos {cohort_size} alunos\n"
+AVERAGES_REPORT_HEADER = "📐 <b>Média:</b>\n"
+
+AVERAGES_COURSE_HEADER = "📐 <b>Notas do curso {course}</b>\n<i>Média ponderada de cada aluno; aprovação a partir de {passing}</i>\n\n"
+AVERAGES_COURSE_ITEM = (
+    "▪️ <b>{subject_name}</b> ({students} aluno(s))\n"
+    "   Média {mean} · mediana {median} (de {p25} a {p75}) · {pass_rate}% na média\n"
+)
+AVERAGES_COURSE_EMPTY = "Nenhuma nota lançada por alunos do curso <b>{course}</b>."
+AVERAGES_COURSE_NOT_FOUND = "Curso não encontrado. Use <code>/medias &lt;curso&gt;</code> com um destes:\n{courses}"
+AVERAGES_COURSE_ITEM_NAME = "• {course}\n"
+
 # =============================================================================
 # IMPORTAÇÃO (/import)
 # =============================================================================
@@ -216,9 +289,11 @@ IMPORT_START_PROMPT = (
     "Por favor, envie um arquivo `materias.json` contendo uma lista de suas matérias.\n\n"
     "<b>O formato do arquivo deve ser exatamente este:</b>\n"
     "{json_example}\n\n"
+    "Também aceito um `materias.csv` com as mesmas colunas na primeira linha.\n\n"
     "Envie o arquivo agora ou use /cancelar para sair."
 )
-IMPORT_INVALID_FILE_EXTENSION = "Por favor, envie um arquivo com a extensão `.json`."
+IMPORT_INVALID_FILE_EXTENSION = "Por favor, envie um arquivo com a extensão `.json` ou `.csv`."
+IMPORT_FILE_TOO_LARGE = "O arquivo é grande demais (máximo de {max_kb} KB). Divida-o em partes menores e envie novamente."
 IMPORT_PROCESSING_FILE = "Recebi seu arquivo! Processando..."
 IMPORT_JSON_ERROR = "Erro ao ler o arquivo: {error}\nPor favor, verifique o formato e envie novamente."
 IMPORT_JSON_NOT_A_LIST = "O JSON deve ser uma lista de matérias."
@@ -228,6 +303,7 @@ IMPORT_FAILURE = (
     "Por favor, corrija os seguintes problemas no seu arquivo e envie novamente:\n"
     "{error_list}"
 )
+IMPORT_MORE_ERRORS = "- ... e mais {count} erro(s)."
 
 
 
@@ -288,6 +364,7 @@ ADMIN_BROADCAST_CONFIRM = (
 )
 ADMIN_BROADCAST_SENDING = "Iniciando a transmissão... A mensagem está sendo enviada em segundo plano. Você receberá um relatório ao final."
 ADMIN_BROADCAST_CANCELED = "Transmissão cancelada."
+ADMIN_BROADCAST_EXPIRED = "A mensagem desta transmissão não está mais disponível. Envie /broadcast para começar de novo."
 ADMIN_BROADCAST_REPORT = (
     "✅ <b>Relatório de Transmissão Concluído</b> ✅\n\n"
     "• <b>Sucessos:</b> {success_count}\n"
@@ -299,6 +376,29 @@ ADMIN_SEND_FAILURE_NOT_FOUND = "❌ Falha: Usuário com ID {user_id} não encont
 ADMIN_SEND_FAILURE_BLOCKED = "❌ Falha: Não foi possível enviar a mensagem. O usuário {user_name} (ID: {user_id}) provavelmente bloqueou o bot."
 ADMIN_SEND_FAILURE_GENERAL = "❌ Falha: Ocorreu um erro inesperado ao tentar enviar a mensagem para o usuário {user_id}."
 
+# --- Estatísticas (/stats) ---
+ADMIN_STATS_USERS = (
+    "📈 <b>Estatísticas do Bot</b>\n"
+    "<i>Calculadas em {computed_at}</i>\n\n"
+    "👥 <b>Usuários</b>\n"
+    "• Total: {total} ({active} ativos)\n"
+    "• Hoje (DAU): {dau}\n"
+    "• Últimos 7 dias (WAU): {wau}\n"
+    "• Últimos 30 dias (MAU): {mau}\n\n"
+)
+ADMIN_STATS_COURSES_HEADER = "🎓 <b>Usuários por curso</b>\n"
+ADMIN_STATS_COURSE_ITEM = "• {course}: {count}\n"
+ADMIN_STATS_NO_COURSE = "Sem curso (/fatec não usado)"
+ADMIN_STATS_TOTALS = (
+    "\n🗂️ <b>Totais</b>\n"
+    "• Matérias: {subjects}\n"
+    "• Trabalhos e provas: {activities}\n"
+    "• Faltas: {absences} (em {absence_records} registros)\n"
+    "• Notas: {grades}\n\n"
+)
+ADMIN_STATS_ABSENCES_HEADER = "✖️ <b>Matérias por total de faltas</b>\n"
+ADMIN_STATS_ABSENCES_ITEM = "• {bucket} falta(s): {count}\n"
+
 
 # =============================================================================
 # LEMBRETES (REMINDERS)
@@ -307,7 +407,24 @@ ADMIN_SEND_FAILURE_GENERAL = "❌ Falha: Ocorreu um erro inesperado ao tentar en
 # --- Lembretes Automáticos de Prazos ---
 REMINDER_AUTOMATIC_HEADER = "Ei! Tenho alguns lembretes importantes para você:\n\n"
 REMINDER_AUTOMATIC_TOMORROW = "🔔 <b>Atenção, vence AMANHÃ:</b> {activity_type} '<b>{activity_name}</b>' (Matéria: {subject_name})"
-REMINDER_AUTOMATIC_3_DAYS = "🔔 <b>Lembrete para daqui a 3 dias:</b> {activity_type} '<b>{activity_name}</b>' (Matéria: {subject_name})"
+REMINDER_AUTOMATIC_TODAY = "🔔 <b>Atenção, vence HOJE:</b> {activity_type} '<b>{activity_name}</b>' (Matéria: {subject_name})"
+REMINDER_AUTOMATIC_N_DAYS = "🔔 <b>Lembrete para daqui a {days} dias:</b> {activity_type} '<b>{activity_name}</b>' (Matéria: {subject_name})"
+
+# --- Preferências dos Lembretes (/lembretes) ---
+REMINDER_PREFS_CURRENT = (
+    "⏰ <b>Seus lembretes de prazos</b>\n\n"
+    "Horário: <b>{reminder_time}</b>\n"
+    "Antecedência: <b>{reminder_days}</b> dia(s)\n\n"
+    "Para mudar, envie por exemplo:\n"
+    "<code>/lembretes 08:30</code> (só o horário)\n"
+    "<code>/lembretes 08:30 1,3,7</code> (horário e dias de antecedência)"
+)
+REMINDER_PREFS_INVALID = (
+    "Não entendi. 😓 Use <code>/lembretes HH:MM</code> ou <code>/lembretes HH:MM 1,3,7</code> "
+    "(de 0 a {max_days} dias, até {max_count} valores)."
+)
+REMINDER_PREFS_SAVED = "✅ Pronto! Você receberá os lembretes às <b>{reminder_time}</b>, com <b>{reminder_days}</b> dia(s) de antecedência."
+REMINDER_PREFS_NO_USER = "Você ainda não tem cadastro. Use /start primeiro."
 
 # --- Lembretes Personalizados (/lembrar) ---
 REMINDER_CUSTOM_ASK_MESSAGE = "Ok, vamos criar um lembrete. Primeiro, me diga: <b>o que</b> você quer que eu te lembre?"
@@ -316,4 +433,20 @@ REMINDER_CUSTOM_ERROR_TIME = "Desculpe, não consegui entender essa data/hora. T
 REMINDER_CUSTOM_SUCCESS = "✅ Certo! Agendei um lembrete para '<b>{reminder_message}</b>' em {reminder_datetime}."
 REMINDER_CUSTOM_NOTIFICATION = "🔔 <b>Lembrete:</b> {reminder_message}"
 
-
+# --- Exportação (/exportar) ---
+EXPORT_CALENDAR_CAPTION = "📅 Suas aulas, trabalhos e provas. Abra o arquivo para importar no app de calendário."
+EXPORT_CALENDAR_LINK = (
+    "🔗 Para o calendário se atualizar sozinho, assine este link no app (Google Agenda: "
+    "<i>Outras agendas → Do URL</i>; iPhone: <i>Ajustes → Calendário → Contas → Adicionar Calendário Assinado</i>):\n\n"
+    "<code>{url}</code>\n\n"
+    "Ele é pessoal: quem tiver o link vê sua agenda. Para gerar outro e invalidar este, use <code>/exportar novolink</code>."
+)
+EXPORT_USAGE = (
+    "Use /exportar para receber seu calendário (.ics), <code>/exportar novolink</code> para trocar o link "
+    "de assinatura ou <code>/exportar dados</code> para baixar todos os seus dados."
+)
+EXPORT_DATA_CAPTION = (
+    "📦 Seus dados: {materias} matéria(s), {atividades} atividade(s), {faltas} registro(s) de falta e {notas} nota(s).\n"
+    "O materias.json pode ser enviado de volta com /import."
+)
+EXPORT_DATA_NO_USER = "Você ainda não tem dados por aqui. Use /start primeiro."
@@ -0,0 +1,13 @@
+# bot/core/errors.py
+
+from telegram.error import BadRequest, Forbidden
+
+
+def is_unreachable_chat(error: Exception) -> bool:
+    """
+    Indica se o erro do Telegram significa que o chat não recebe mais mensagens
+    (usuário bloqueou o bot, apagou a conta ou o chat não existe).
+    """
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and "chat not found" in str(error).lower()
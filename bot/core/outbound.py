@@ -0,0 +1,211 @@
+# bot/core/outbound.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from bot.core.ratelimit import TokenBucket
+from bot.core.settings import (
+    OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_CHAT_RATE,
+    OUTBOUND_CHAT_BURST,
+    OUTBOUND_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Classes de prioridade (menor = mais urgente). Use como rate_limit_args nas chamadas do bot,
+# ex: context.bot.send_message(..., rate_limit_args=PRIORITY_BROADCAST)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REMINDER = 1
+PRIORITY_BROADCAST = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_REMINDER: "reminder",
+    PRIORITY_BROADCAST: "broadcast",
+}
+
+# Grupos têm um limite bem menor que chats privados (cerca de 20 mensagens por minuto)
+GROUP_CHAT_RATE = 20 / 60
+# A partir de quantos baldes por chat vale a pena descartar os que estão parados
+CHAT_BUCKETS_PRUNE_AT = 10_000
+
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """
+    Fila central de todas as chamadas à API do Telegram.
+
+    - Limite global (OUTBOUND_GLOBAL_RATE/s) e por chat (OUTBOUND_CHAT_RATE/s, com rajadas).
+    - Quando o limite global aperta, as chamadas saem por prioridade:
+      respostas interativas > lembretes > broadcast. Sem rate_limit_args, a
+      chamada é tratada como interativa.
+    - Um RetryAfter pausa todos os envios pelo tempo pedido e a chamada é refeita
+      (até OUTBOUND_MAX_RETRIES vezes).
+    - metrics() devolve a profundidade da fila e os contadores por prioridade.
+    - before_send, se informado, é chamado antes de cada chamada, na tarefa de quem
+      chamou (main.py o usa para confirmar a transação da atualização antes da resposta).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = OUTBOUND_CHAT_RATE,
+        chat_burst: int = OUTBOUND_CHAT_BURST,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+        before_send: Callable[[], None] | None = None,
+    ):
+        self._before_send = before_send
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._max_retries = max_retries
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wake: asyncio.Event | None = None
+        self._pump_task: asyncio.Task | None = None
+        self._paused_until = 0.0
+        self._stats = {
+            priority: {"sent": 0, "retry_after": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in PRIORITY_NAMES
+        }
+
+    async def initialize(self) -> None:
+        self._ensure_pump()
+
+    async def shutdown(self) -> None:
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+            self._pump_task = None
+
+    def _ensure_pump(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            self._wake = asyncio.Event()
+            self._pump_task = asyncio.create_task(self._pump())
+
+    # -------------------------------------------------------------------------
+    # Limites
+    # -------------------------------------------------------------------------
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= CHAT_BUCKETS_PRUNE_AT:
+                now = time.monotonic()
+                self._chat_buckets = {cid: b for cid, b in self._chat_buckets.items() if not b.is_full(now)}
+            rate = GROUP_CHAT_RATE if chat_id < 0 else self._chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, self._chat_burst)
+        while (delay := bucket.try_take()) > 0:
+            await asyncio.sleep(delay)
+
+    async def _wait_for_global_slot(self, priority: int) -> None:
+        self._ensure_pump()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._wake.set()
+        await future
+
+    async def _pump(self) -> None:
+        """Libera as chamadas em espera, em ordem de prioridade, respeitando o limite global."""
+        while True:
+            # Descarta quem desistiu de esperar (tarefa cancelada)
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            delay = self._global.try_take(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+
+    # -------------------------------------------------------------------------
+    # BaseRateLimiter
+    # -------------------------------------------------------------------------
+
+    async def process_request(
+        self,
+        callback,
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ):
+        priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+        stats = self._stats.setdefault(priority, {"sent": 0, "retry_after": 0, "wait_total": 0.0, "wait_max": 0.0})
+        chat_id = data.get("chat_id")
+        if self._before_send is not None:
+            self._before_send()
+
+        for attempt in range(self._max_retries + 1):
+            started = time.monotonic()
+            if isinstance(chat_id, int):
+                await self._wait_for_chat(chat_id)
+            await self._wait_for_global_slot(priority)
+            waited = time.monotonic() - started
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                stats["retry_after"] += 1
+                delay = _seconds(e.retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logger.warning(f"Flood control do Telegram em {endpoint}: pausando os envios por {delay:.0f}s.")
+                if attempt == self._max_retries:
+                    raise
+                continue
+            stats["sent"] += 1
+            return result
+
+    # -------------------------------------------------------------------------
+    # Métricas
+    # -------------------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        """Profundidade da fila e contadores (enviadas, RetryAfter, espera média/máxima) por prioridade."""
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+
+        per_priority = {}
+        for priority, stats in self._stats.items():
+            sent = stats["sent"]
+            per_priority[PRIORITY_NAMES.get(priority, str(priority))] = {
+                "sent": sent,
+                "retry_after": stats["retry_after"],
+                "avg_wait_ms": (stats["wait_total"] / sent * 1000) if sent else 0.0,
+                "max_wait_ms": stats["wait_max"] * 1000,
+            }
+        return {
+            "queue_depth": depth,
+            "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            "tracked_chats": len(self._chat_buckets),
+            "priorities": per_priority,
+        }
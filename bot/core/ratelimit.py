@@ -0,0 +1,129 @@
+# bot/core/ratelimit.py
+
+import time
+
+# Chave do FloodControl dentro do application.bot_data
+FLOOD_CONTROL_KEY = "flood_control"
+
+
+class TokenBucket:
+    """
+    Balde de fichas: permite rajadas de até 'capacity' ações e, depois disso,
+    'rate' ações por segundo.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float | None = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now: float | None = None) -> float:
+        """
+        Tenta consumir uma ficha. Retorna 0 se conseguiu; senão, quantos segundos
+        faltam para a próxima ficha ficar disponível (nada é consumido).
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float | None = None) -> bool:
+        """Balde cheio = sem uso recente; pode ser descartado sem perder informação."""
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= self.capacity
+
+
+class _UserFloodState:
+    __slots__ = ("bucket", "last_callback", "last_callback_at", "warned")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.last_callback = None
+        self.last_callback_at = 0.0
+        self.warned = False
+
+
+class FloodControl:
+    """
+    Limite de atualizações por usuário, aplicado antes de qualquer handler.
+
+    - Cada usuário tem um balde de fichas ('rate' atualizações/s, rajadas de 'burst').
+    - Cliques repetidos no mesmo botão dentro de 'coalesce_window' segundos são
+      agrupados: a mensagem já mostra a resposta do primeiro clique, então nada é recalculado.
+    """
+
+    ALLOWED = "allowed"
+    COALESCED = "coalesced"
+    REJECTED = "rejected"
+
+    # A partir de quantos usuários rastreados vale a pena descartar os que estão parados
+    PRUNE_AT = 10_000
+
+    def __init__(self, rate: float, burst: int, coalesce_window: float):
+        self._rate = rate
+        self._burst = burst
+        self._coalesce_window = coalesce_window
+        self._users: dict[int, _UserFloodState] = {}
+        self._counters = {self.ALLOWED: 0, self.COALESCED: 0, self.REJECTED: 0}
+        self._rejected_by_user: dict[int, int] = {}
+
+    def check(self, user_id: int, callback_data: str | None = None, now: float | None = None) -> str:
+        """Decide o que fazer com uma atualização: ALLOWED, COALESCED ou REJECTED."""
+        now = time.monotonic() if now is None else now
+        state = self._users.get(user_id)
+        if state is None:
+            if len(self._users) >= self.PRUNE_AT:
+                self._prune(now)
+            state = self._users[user_id] = _UserFloodState(TokenBucket(self._rate, self._burst, now))
+
+        if (
+            callback_data is not None
+            and callback_data == state.last_callback
+            and now - state.last_callback_at < self._coalesce_window
+        ):
+            outcome = self.COALESCED
+        elif state.bucket.try_take(now) > 0:
+            outcome = self.REJECTED
+            self._rejected_by_user[user_id] = self._rejected_by_user.get(user_id, 0) + 1
+        else:
+            outcome = self.ALLOWED
+            state.warned = False
+            if callback_data is not None:
+                state.last_callback = callback_data
+                state.last_callback_at = now
+
+        self._counters[outcome] += 1
+        return outcome
+
+    def should_warn(self, user_id: int) -> bool:
+        """True só na primeira rejeição de cada sequência, para avisar o usuário uma única vez."""
+        state = self._users.get(user_id)
+        if state is None or state.warned:
+            return False
+        state.warned = True
+        return True
+
+    def _prune(self, now: float) -> None:
+        self._users = {
+            uid: state for uid, state in self._users.items()
+            if not state.bucket.is_full(now) or now - state.last_callback_at < self._coalesce_window
+        }
+
+    def metrics(self, reset: bool = False) -> dict:
+        """Contadores de atualizações aceitas, agrupadas e rejeitadas, e os usuários mais rejeitados."""
+        top = sorted(self._rejected_by_user.items(), key=lambda item: item[1], reverse=True)[:5]
+        metrics = {**self._counters, "tracked_users": len(self._users), "top_rejected": top}
+        if reset:
+            self._counters = dict.fromkeys(self._counters, 0)
+            self._rejected_by_user.clear()
+        return metrics
@@ -1,4 +1,5 @@
 import os
+from datetime import date
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -41,6 +42,136 @@ if not DATABASE_URL:
         f"{required_vars['DB_HOST']}:{required_vars['DB_PORT']}/{required_vars['DB_NAME']}"
     )
 
+# --- Pool de Conexões ---
+# "session" (padrão) ou "transaction" para rodar atrás do pgbouncer em pool por transação
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "session").lower()
+if DB_POOL_MODE not in ("session", "transaction"):
+    raise ValueError("DB_POOL_MODE deve ser 'session' ou 'transaction'.")
+# Sem pool local (NullPool): útil quando o pgbouncer já faz o pool
+DB_NULL_POOL = os.getenv("DB_NULL_POOL", "false").lower() in ("1", "true", "yes")
+# Conexões mantidas abertas, conexões extras em picos e espera máxima (s) por uma conexão livre
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Conexões mais velhas que isto (em segundos) são reabertas, em vez de testadas a cada checkout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 30 * 60))
+# Testa a conexão (SELECT 1) a cada checkout: custa uma ida ao banco por uso
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Tempo máximo (em ms) de cada comando no servidor; 0 desliga
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+# Conexão direta ao PostgreSQL (sem pgbouncer) para o lock de liderança, que é de sessão
+DB_DIRECT_URL = os.getenv("DB_DIRECT_URL")
+
+# --- Réplica de Leitura ---
+# Listagens e relatórios leem da réplica (se configurada); escritas sempre vão para o principal
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Por quantos segundos depois de gravar algo o usuário continua lendo do principal
+# (a réplica pode estar atrasada e ele não veria a própria alteração)
+REPLICA_READ_YOUR_WRITES_SECONDS = float(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", 10))
+
+
+# --- Persistência das Conversas ---
+# Intervalo (em segundos) entre as gravações em lote do estado das conversas e do user_data
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", 30))
+
+# Tempo máximo (em segundos) que uma conversa pode ficar parada antes de ser encerrada.
+# O mesmo valor é usado para descartar o user_data de quem abandonou um fluxo no meio.
+CONVERSATION_TIMEOUT = int(os.getenv("CONVERSATION_TIMEOUT", 15 * 60))
+# De quanto em quanto tempo (em segundos) a limpeza do user_data abandonado é executada
+USER_DATA_SWEEP_INTERVAL = int(os.getenv("USER_DATA_SWEEP_INTERVAL", 5 * 60))
+
+# --- Fila de Notificações (notification_outbox) ---
+# De quanto em quanto tempo (em segundos) o despachante procura notificações pendentes
+NOTIFICATION_DISPATCH_INTERVAL = int(os.getenv("NOTIFICATION_DISPATCH_INTERVAL", 10))
+# Quantas notificações cada rodada do despachante reserva e quantas envia ao mesmo tempo
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", 200))
+NOTIFICATION_SEND_CONCURRENCY = int(os.getenv("NOTIFICATION_SEND_CONCURRENCY", 20))
+# Tentativas antes de desistir de uma notificação
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 5))
+# Notificações enviadas ficam guardadas por este número de dias (para evitar reenvios)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 7))
+
+# --- Envios para o Telegram (fila central com prioridades, veja bot/core/outbound.py) ---
+# Limite global de chamadas por segundo e, por chat, chamadas por segundo e tamanho da rajada
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 30))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", 3))
+# Quantas vezes uma chamada é refeita depois de um RetryAfter do Telegram
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+
+# --- Controle de Flood por Usuário ---
+# Atualizações por segundo (e rajada máxima) aceitas de cada usuário
+FLOOD_RATE = float(os.getenv("FLOOD_RATE", 1))
+FLOOD_BURST = int(os.getenv("FLOOD_BURST", 5))
+# Cliques repetidos no mesmo botão dentro desta janela (em segundos) são agrupados
+FLOOD_COALESCE_WINDOW = float(os.getenv("FLOOD_COALESCE_WINDOW", 2))
+
+# Tamanho máximo (em bytes) do arquivo aceito pelo /import
+IMPORT_MAX_FILE_SIZE = int(os.getenv("IMPORT_MAX_FILE_SIZE", 1024 * 1024))
+
+# --- Listagens ---
+# Itens por página no /calendario e no histórico do /gerenciarfaltas
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", 10))
+
+# --- Botões ---
+# Validade (em segundos) dos payloads de botões guardados no servidor (veja bot/core/callbacks.py)
+CALLBACK_PAYLOAD_TTL = int(os.getenv("CALLBACK_PAYLOAD_TTL", 60 * 60))
+
+# --- Calendário (.ics) ---
+# Porta do servidor HTTP com o link de assinatura do calendário (veja bot/calendar_server.py); 0 desliga
+CALENDAR_HTTP_PORT = int(os.getenv("CALENDAR_HTTP_PORT", 0))
+CALENDAR_HTTP_HOST = os.getenv("CALENDAR_HTTP_HOST", "0.0.0.0")
+# Endereço público desse servidor, usado no link mostrado pelo /exportar (ex: https://jovis.exemplo.com)
+CALENDAR_PUBLIC_URL = os.getenv("CALENDAR_PUBLIC_URL", "").rstrip("/")
+# Por quantos segundos o app de calendário pode reusar o arquivo sem perguntar de novo
+CALENDAR_MAX_AGE = int(os.getenv("CALENDAR_MAX_AGE", 15 * 60))
+
+
+# --- Notas (/medias) ---
+# Média mínima para aprovação e nota máxima de uma avaliação
+GRADE_PASSING_AVERAGE = float(os.getenv("GRADE_PASSING_AVERAGE", 6))
+GRADE_MAX = float(os.getenv("GRADE_MAX", 10))
+# Avaliações esperadas em cada matéria e seus pesos na média final (ex: "P1=1,P2=2")
+GRADE_WEIGHTS_STR = os.getenv("GRADE_WEIGHTS", "P1=1,P2=1")
+GRADE_WEIGHTS = {
+    name.strip().upper(): float(weight)
+    for name, weight in (item.split("=") for item in GRADE_WEIGHTS_STR.split(",") if item.strip())
+}
+
+
+# --- Frequência (/faltas) ---
+# Período letivo (AAAA-MM-DD). Sem valor, usa 01/02 a 30/06 ou 01/08 a 15/12, conforme a data atual
+SEMESTER_START = date.fromisoformat(os.getenv("SEMESTER_START")) if os.getenv("SEMESTER_START") else None
+SEMESTER_END = date.fromisoformat(os.getenv("SEMESTER_END")) if os.getenv("SEMESTER_END") else None
+if (SEMESTER_START is None) != (SEMESTER_END is None):
+    raise ValueError("Defina SEMESTER_START e SEMESTER_END juntos.")
+# Feriados e outros dias sem aula no período (AAAA-MM-DD, separados por vírgula)
+SEMESTER_HOLIDAYS = [date.fromisoformat(d.strip()) for d in os.getenv("SEMESTER_HOLIDAYS", "").split(",") if d.strip()]
+# Frequência mínima (%) para aprovação e duração (em minutos) de uma aula: 19:00–20:40 são 2 aulas
+ATTENDANCE_MIN_PERCENT = float(os.getenv("ATTENDANCE_MIN_PERCENT", 75))
+CLASS_LENGTH_MINUTES = int(os.getenv("CLASS_LENGTH_MINUTES", 50))
+# O aviso de faltas é enviado quando restam esta quantidade de faltas (ou menos) em uma matéria
+ATTENDANCE_WARN_REMAINING = int(os.getenv("ATTENDANCE_WARN_REMAINING", 2))
+
+
+# --- Estatísticas dos Admins (/stats) ---
+# De quanto em quanto tempo (em segundos) as estatísticas agregadas são recalculadas
+STATS_REFRESH_INTERVAL = int(os.getenv("STATS_REFRESH_INTERVAL", 10 * 60))
+
+
+# --- Várias Instâncias (Escala Horizontal) ---
+# Quantidade de instâncias rodando e a posição (0, 1, ...) desta instância.
+# Lembretes são divididos entre as instâncias pelo user_id; as demais tarefas
+# agendadas rodam só na instância eleita líder.
+INSTANCE_COUNT = int(os.getenv("INSTANCE_COUNT", 1))
+INSTANCE_INDEX = int(os.getenv("INSTANCE_INDEX", 0))
+if not 0 <= INSTANCE_INDEX < INSTANCE_COUNT:
+    raise ValueError("INSTANCE_INDEX deve estar entre 0 e INSTANCE_COUNT - 1.")
+# Chave do advisory lock do PostgreSQL usado na eleição de líder
+LEADER_LOCK_KEY = int(os.getenv("LEADER_LOCK_KEY", 726_548_001))
+# De quanto em quanto tempo (em segundos) a instância tenta assumir/confirmar a liderança
+LEADER_HEARTBEAT_INTERVAL = int(os.getenv("LEADER_HEARTBEAT_INTERVAL", 15))
+
 
 #--- Configuração de Admin ---
 # Carrega a string de IDs e a transforma em uma lista de números inteiros
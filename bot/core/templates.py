@@ -0,0 +1,86 @@
+# bot/core/templates.py
+"""
+Templates pré-compilados a partir das constantes de bot/core/dialogs.py.
+
+Cada constante vira, uma única vez (no import), uma função que monta o texto com
+uma f-string, sem reinterpretar o formato a cada chamada:
+
+    from bot.core.templates import tpl
+    tpl.SUBJECT_LIST_DAY_HEADER(day="SEGUNDA")
+
+Valores do tipo str são escapados para HTML na mesma passada (nomes digitados pelo
+usuário não quebram a formatação). Texto que já é HTML deve ser marcado com Safe().
+Para listas, junte as partes numa lista e faça "".join(partes) no final.
+"""
+
+import string
+from html import escape
+from types import ModuleType
+from typing import Callable
+
+from bot.core import dialogs
+
+
+class Safe(str):
+    """Texto que já está em HTML e não deve ser escapado de novo."""
+
+    __slots__ = ()
+
+
+def escape_value(value):
+    """Escapa str comuns para HTML; Safe, números, datas etc. passam direto."""
+    # A maioria dos nomes não tem nada a escapar: três buscas custam menos que três replace()
+    if value.__class__ is str and ("&" in value or "<" in value or ">" in value):
+        return escape(value, quote=False)
+    return value
+
+
+_formatter = string.Formatter()
+
+
+def compile_template(source: str, name: str = "template") -> Callable[..., str]:
+    """
+    Compila um texto no formato do str.format em uma função que aceita os campos
+    como argumentos nomeados. Diferente do .format, um argumento a mais é erro.
+    """
+    pieces = []
+    fields = []
+    for literal, field, spec, conversion in _formatter.parse(source):
+        if literal:
+            pieces.append(repr(literal))
+        if field is None:
+            continue
+        root = field.split(".", 1)[0]
+        if not root.isidentifier() or not field.replace(".", "_").isidentifier():
+            raise ValueError(f"Campo não suportado em {name}: {{{field}}}")
+        if "{" in (spec or ""):
+            raise ValueError(f"Formato aninhado não suportado em {name}: {{{field}:{spec}}}")
+        if root not in fields:
+            fields.append(root)
+        expression = f"_e({field})"
+        if conversion:
+            expression += f"!{conversion}"
+        if spec:
+            expression += f":{spec}"
+        pieces.append("f" + repr("{" + expression + "}"))
+
+    body = " ".join(pieces) or "''"
+    params = ", ".join(["*", *fields]) if fields else ""
+    namespace = {"_e": escape_value}
+    exec(f"def {name}({params}):\n    return {body}\n", namespace)
+    render = namespace[name]
+    render.source = source
+    render.fields = tuple(fields)
+    return render
+
+
+class Templates:
+    """Todas as constantes de texto de um módulo, compiladas."""
+
+    def __init__(self, module: ModuleType):
+        for attr, value in vars(module).items():
+            if attr.isupper() and isinstance(value, str):
+                setattr(self, attr, compile_template(value, attr))
+
+
+tpl = Templates(dialogs)
@@ -1,16 +1,129 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.dml import UpdateBase
+
+from bot.core.settings import (
+    DATABASE_URL,
+    DATABASE_REPLICA_URL,
+    REPLICA_READ_YOUR_WRITES_SECONDS,
+    DB_POOL_MODE,
+    DB_NULL_POOL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_DIRECT_URL,
+)
+from bot.db.pool import engine_options
+
+
+def _create_engine(url: str):
+    return create_engine(
+        url,
+        **engine_options(
+            url,
+            mode=DB_POOL_MODE,
+            use_null_pool=DB_NULL_POOL,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pre_ping=DB_POOL_PRE_PING,
+            statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+        ),
+    )
 
-from bot.core.settings import DATABASE_URL
 
 # O 'engine' é o ponto de entrada para o banco de dados.
-# Ele gerencia as conexões. O pool_pre_ping=True verifica as conexões antes de usá-las.
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Ele gerencia as conexões; o pool é configurado em bot/core/settings.py (veja bot/db/pool.py).
+engine = _create_engine(DATABASE_URL)
+
+# Réplica só de leitura (opcional). Sem ela, tudo vai para o 'engine'.
+replica_engine = _create_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+
+# Engine para o que depende de estado de sessão no servidor (o advisory lock da liderança).
+# Atrás do pgbouncer em modo transação isso precisa de uma conexão direta ao PostgreSQL.
+if DB_DIRECT_URL:
+    direct_engine = create_engine(DB_DIRECT_URL, poolclass=NullPool)
+else:
+    direct_engine = engine
+
+
+class RoutingSession(Session):
+    """
+    Sessão que lê da réplica e escreve no principal.
+
+    Depois da primeira escrita (flush, INSERT/UPDATE/DELETE ou SELECT ... FOR UPDATE),
+    a sessão passa a ler também do principal, para enxergar o que acabou de gravar.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            self._flushing
+            or isinstance(clause, UpdateBase)
+            or getattr(clause, "_for_update_arg", None) is not None
+        ):
+            self.info["wrote"] = True
+        if self.info.get("wrote") or replica_engine is None:
+            return engine
+        return replica_engine
+
+
+class ReadYourWrites:
+    """
+    Lembra quando cada usuário gravou algo pela última vez. Enquanto a janela não
+    passar, as leituras dele vão para o principal, não para a réplica (que pode estar atrasada).
+    O registro é por processo: com várias instâncias, a janela deve cobrir o atraso da réplica.
+    """
+
+    # A partir de quantos usuários rastreados vale a pena descartar os expirados
+    PRUNE_AT = 10_000
+
+    def __init__(self, window: float):
+        self._window = window
+        self._last_write: dict[int, float] = {}
+
+    def note_write(self, user_id: int, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        if len(self._last_write) >= self.PRUNE_AT:
+            self._last_write = {uid: t for uid, t in self._last_write.items() if now - t < self._window}
+        self._last_write[user_id] = now
+
+    def wrote_recently(self, user_id: int, now: float | None = None) -> bool:
+        last = self._last_write.get(user_id)
+        if last is None:
+            return False
+        return (time.monotonic() if now is None else now) - last < self._window
+
+
+read_your_writes = ReadYourWrites(REPLICA_READ_YOUR_WRITES_SECONDS)
 
 # A 'SessionLocal' é uma fábrica de sessões. Cada instância dela será uma "conversa"
 # com o banco de dados.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: os objetos continuam utilizáveis depois do commit sem um novo
+# SELECT (a chave primária dos INSERTs já volta via RETURNING), então não é preciso db.refresh().
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Sessões para listagens e relatórios: leem da réplica quando ela existe
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush_as_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_dml_as_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
 
 # A 'Base' é uma classe base da qual todos os nossos modelos de tabela (como Usuario)
 # irão herdar.
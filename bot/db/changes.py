@@ -0,0 +1,64 @@
+# bot/db/changes.py
+"""
+Contador de alterações dos dados de cada usuário (users.data_version).
+
+Todo flush que cria, altera ou apaga uma matéria ou atividade incrementa o contador
+do dono, na mesma transação. Os caches por usuário (teclados de matérias, calendário
+.ics) guardam a versão com que foram montados e só valem enquanto ela não mudar,
+inclusive entre instâncias e depois de um restart.
+
+INSERTs em massa (db.execute(insert(Subject), ...)) não passam pelo flush: quem os
+faz chama mark_changed(db, user).
+"""
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from bot.db.base import ReadSessionLocal, SessionLocal
+from bot.db.models import Activity, Subject, User
+
+# Modelos cujas alterações mudam a versão do dono
+WATCHED = (Subject, Activity)
+# Chave em session.info com os usuários cuja versão mudou nesta transação
+_CHANGED_KEY = "data_changed_users"
+
+
+def mark_changed(db: Session, user: User) -> None:
+    """Incrementa a versão do usuário (gravada no próximo flush)."""
+    # Um usuário ainda não inserido começa do zero; não há cache dele para invalidar
+    if not inspect(user).pending:
+        user.data_version = User.data_version + 1
+    db.info.setdefault(_CHANGED_KEY, set()).add(user.user_id)
+
+
+def changed_in(db: Session) -> set[int]:
+    """
+    Usuários cuja versão foi incrementada nesta sessão. Enquanto a transação não
+    termina a alteração pode ser desfeita: não guarde em cache o que foi lido deles.
+    """
+    return db.info.get(_CHANGED_KEY, set())
+
+
+def _owner(session: Session, obj) -> User | None:
+    if obj.owner is not None:
+        return obj.owner
+    # Objeto novo criado só com user_id: o relacionamento ainda não foi carregado
+    return session.query(User).filter(User.user_id == obj.user_id).one_or_none()
+
+
+def _bump_versions(session: Session, flush_context, instances) -> None:
+    dirty = session.dirty
+    owners: dict[int, User] = {}
+    for obj in (*session.new, *dirty, *session.deleted):
+        if not isinstance(obj, WATCHED) or obj in dirty and not session.is_modified(obj):
+            continue
+        owner = _owner(session, obj)
+        # Usuário sendo apagado junto (cascata): não há o que versionar
+        if owner is not None and owner not in session.deleted:
+            owners[owner.user_id] = owner
+    for owner in owners.values():
+        mark_changed(session, owner)
+
+
+for _maker in (SessionLocal, ReadSessionLocal):
+    event.listen(_maker, "before_flush", _bump_versions)
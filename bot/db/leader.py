@@ -0,0 +1,98 @@
+# bot/db/leader.py
+
+import logging
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+
+class AdvisoryLeaderLock:
+    """
+    Liderança baseada em advisory lock do PostgreSQL.
+
+    O lock é de sessão: fica preso à conexão que o obteve, então essa conexão é
+    mantida aberta enquanto a instância for líder. Se a conexão cair, o PostgreSQL
+    libera o lock sozinho e outra instância pode assumir.
+    """
+
+    def __init__(self, engine: Engine, key: int):
+        self._engine = engine
+        self._key = key
+        self._conn: Connection | None = None
+
+    def try_acquire(self) -> bool:
+        """Tenta obter (ou confirmar) a liderança. Nunca bloqueia."""
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                return True
+            except DBAPIError as e:
+                logger.warning(f"Conexão do lock de liderança perdida: {e}")
+                self._discard()
+
+        # AUTOCOMMIT para não deixar uma transação aberta enquanto seguramos o lock
+        conn = self._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self._key}).scalar()
+        except Exception:
+            conn.close()
+            raise
+        if acquired:
+            self._conn = conn
+            return True
+        conn.close()
+        return False
+
+    def release(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            # A conexão volta para o pool: o lock precisa ser liberado explicitamente
+            self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self._key})
+            self._conn.close()
+        except DBAPIError:
+            self._discard()
+        self._conn = None
+
+    def _discard(self) -> None:
+        """Descarta a conexão (sem devolvê-la ao pool), o que também solta o lock."""
+        try:
+            self._conn.invalidate()
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+class LocalLeaderLock:
+    """
+    Substituto do advisory lock para bancos sem esse recurso (SQLite em desenvolvimento
+    e nos testes). Coordena apenas instâncias dentro do mesmo processo.
+    """
+
+    _holders: dict[int, "LocalLeaderLock"] = {}
+    _mutex = threading.Lock()
+
+    def __init__(self, key: int):
+        self._key = key
+
+    def try_acquire(self) -> bool:
+        with self._mutex:
+            holder = self._holders.setdefault(self._key, self)
+            return holder is self
+
+    def release(self) -> None:
+        with self._mutex:
+            if self._holders.get(self._key) is self:
+                del self._holders[self._key]
+
+
+def create_leader_lock(engine: Engine, key: int) -> AdvisoryLeaderLock | LocalLeaderLock:
+    """Escolhe o tipo de lock de acordo com o banco configurado."""
+    if engine.dialect.name == "postgresql":
+        return AdvisoryLeaderLock(engine, key)
+    return LocalLeaderLock(key)
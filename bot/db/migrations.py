@@ -0,0 +1,321 @@
+# bot/db/migrations.py
+"""
+Migrações versionadas do esquema.
+
+Na inicialização, ensure_schema() faz uma única consulta à tabela schema_version.
+Se o banco já está na última versão, nada mais é feito (sem reflexão das tabelas).
+Caso contrário:
+- banco vazio: cria tudo a partir dos modelos e marca a última versão;
+- banco antigo (criado pelo create_all, sem schema_version): marca a versão base
+  e aplica as migrações seguintes.
+
+As migrações são idempotentes (IF NOT EXISTS / checagem de colunas), então uma
+migração interrompida pode ser simplesmente executada de novo. Índices em tabelas
+existentes são criados com CREATE INDEX CONCURRENTLY, fora da transação, para não
+travar as escritas enquanto são construídos.
+"""
+
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from bot.db import models  # noqa: F401 (registra as tabelas no Base.metadata)
+from bot.db.base import Base
+
+logger = logging.getLogger(__name__)
+
+# Chave do advisory lock que impede duas instâncias de migrarem ao mesmo tempo
+MIGRATION_LOCK_KEY = 726_548_002
+# Quanto um ALTER TABLE espera por um lock antes de desistir (em vez de enfileirar
+# e travar todas as consultas que chegarem depois dele)
+LOCK_TIMEOUT = "5s"
+# Versão que corresponde ao esquema original, criado pelo antigo create_all
+BASELINE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[["MigrationContext"], None]
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Decorador que registra uma migração. As versões devem ser crescentes."""
+    def decorator(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migração {version} fora de ordem.")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+
+class MigrationContext:
+    """Operações disponíveis para uma migração, já adaptadas ao banco em uso."""
+
+    def __init__(self, engine: Engine, connection: Connection):
+        self.engine = engine
+        self.connection = connection
+        self.dialect = engine.dialect.name
+        self._indexes: list[tuple] = []
+
+    @property
+    def serial(self) -> str:
+        """Tipo da chave primária autoincrementada."""
+        return "SERIAL" if self.dialect == "postgresql" else "INTEGER"
+
+    def execute(self, sql: str, **params) -> None:
+        self.connection.execute(text(sql), params)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return any(c["name"] == column for c in inspect(self.connection).get_columns(table))
+
+    def add_column(self, table: str, column: str, ddl: str) -> None:
+        """
+        Adiciona uma coluna, se ainda não existir. No PostgreSQL 11+, uma coluna com
+        DEFAULT constante não reescreve a tabela: a operação é instantânea.
+        """
+        if not self.has_column(table, column):
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def create_index(self, name: str, table: str, columns: str, where: str | None = None, unique: bool = False) -> None:
+        """Agenda a criação de um índice; ele é construído depois do COMMIT da migração."""
+        self._indexes.append((name, table, columns, where, unique))
+
+    def build_indexes(self) -> None:
+        for name, table, columns, where, unique in self._indexes:
+            _build_index(self.engine, name, table, columns, where, unique)
+        self._indexes.clear()
+
+
+def _build_index(engine: Engine, name: str, table: str, columns: str, where: str | None, unique: bool) -> None:
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    suffix = f" WHERE {where}" if where else ""
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns}){suffix}"))
+        return
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Uma construção concorrente interrompida deixa um índice inválido para trás
+        valid = conn.execute(
+            text(
+                "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name"
+            ),
+            {"name": name},
+        ).scalar()
+        if valid is False:
+            logger.warning(f"Índice {name} inválido (construção interrompida); recriando.")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns}){suffix}"))
+
+
+# =============================================================================
+# Migrações
+# =============================================================================
+
+@migration(1, "esquema inicial (usuários, matérias, atividades, faltas, notas e catálogo)")
+def _initial_schema(ctx: MigrationContext) -> None:
+    # Bancos antigos já têm estas tabelas; bancos novos são criados a partir dos modelos
+    pass
+
+
+@migration(2, "persistência das conversas e do user_data")
+def _persistence_tables(ctx: MigrationContext) -> None:
+    ctx.execute(
+        "CREATE TABLE IF NOT EXISTS conversation_states ("
+        " name VARCHAR NOT NULL, key VARCHAR NOT NULL, state INTEGER NOT NULL,"
+        " updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+        " PRIMARY KEY (name, key))"
+    )
+    ctx.execute(
+        "CREATE TABLE IF NOT EXISTS user_data ("
+        " user_id BIGINT NOT NULL PRIMARY KEY, data TEXT NOT NULL,"
+        " updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+@migration(3, "fila de notificações (notification_outbox)")
+def _notification_outbox(ctx: MigrationContext) -> None:
+    ctx.execute(
+        "CREATE TABLE IF NOT EXISTS notification_outbox ("
+        f" id {ctx.serial} NOT NULL PRIMARY KEY, user_id BIGINT NOT NULL, text TEXT NOT NULL,"
+        " parse_mode VARCHAR, dedup_key VARCHAR UNIQUE, send_after TIMESTAMP NOT NULL,"
+        " status VARCHAR NOT NULL, attempts INTEGER NOT NULL, locked_until TIMESTAMP,"
+        " last_error TEXT, created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, sent_at TIMESTAMP)"
+    )
+    ctx.create_index("ix_notification_outbox_user_id", "notification_outbox", "user_id")
+    ctx.create_index("ix_notification_outbox_pending", "notification_outbox", "send_after", where="status = 'pending'")
+
+
+@migration(4, "usuários ativos/bloqueados")
+def _user_activity_flags(ctx: MigrationContext) -> None:
+    ctx.add_column("users", "is_active", "BOOLEAN NOT NULL DEFAULT TRUE")
+    ctx.add_column("users", "blocked_at", "TIMESTAMP")
+    ctx.create_index("ix_users_active", "users", "user_id", where="is_active = true")
+
+
+@migration(5, "horário e antecedência dos lembretes por usuário")
+def _reminder_preferences(ctx: MigrationContext) -> None:
+    ctx.add_column("users", "reminder_time", "TIME NOT NULL DEFAULT '09:00:00'")
+    ctx.add_column("users", "reminder_days", "VARCHAR NOT NULL DEFAULT '1,3'")
+    ctx.create_index("ix_users_reminder_time", "users", "reminder_time", where="is_active = true")
+
+
+@migration(6, "índices nas chaves estrangeiras das tabelas do usuário")
+def _foreign_key_indexes(ctx: MigrationContext) -> None:
+    for table, column in [
+        ("subjects", "user_id"),
+        ("activities", "user_id"),
+        ("activities", "subject_id"),
+        ("absences", "user_id"),
+        ("absences", "subject_id"),
+        ("grades", "user_id"),
+        ("grades", "subject_id"),
+    ]:
+        ctx.create_index(f"ix_{table}_{column}", table, column)
+
+
+@migration(7, "índices da paginação por chave do calendário e do histórico de faltas")
+def _keyset_pagination_indexes(ctx: MigrationContext) -> None:
+    ctx.create_index("ix_activities_user_due", "activities", "user_id, due_date, id")
+    ctx.create_index("ix_absences_subject_date", "absences", "subject_id, absence_date, id")
+
+
+
+@migration(8, "versão dos dados do usuário e chave do calendário (.ics)")
+def _calendar_feed(ctx: MigrationContext) -> None:
+    ctx.add_column("users", "data_version", "INTEGER NOT NULL DEFAULT 0")
+    ctx.add_column("users", "calendar_token", "VARCHAR")
+    ctx.create_index("ix_users_calendar_token", "users", "calendar_token", unique=True)
+
+
+@migration(9, "último uso e curso dos usuários; relatórios agregados (stats_snapshots)")
+def _admin_stats(ctx: MigrationContext) -> None:
+    ctx.add_column("users", "last_seen_on", "DATE")
+    ctx.add_column("users", "course", "VARCHAR")
+    ctx.create_index("ix_users_last_seen_on", "users", "last_seen_on")
+    ctx.execute(
+        "CREATE TABLE IF NOT EXISTS stats_snapshots ("
+        " name VARCHAR NOT NULL PRIMARY KEY, data TEXT NOT NULL, computed_at TIMESTAMP NOT NULL)"
+    )
+
+
+@migration(10, "índice do nome das matérias (turmas do /medias)")
+def _subject_name_index(ctx: MigrationContext) -> None:
+    ctx.create_index("ix_subjects_name", "subjects", "name")
+
+
+@migration(11, "aulas no semestre e limite de faltas das matérias")
+def _attendance_limits(ctx: MigrationContext) -> None:
+    ctx.add_column("subjects", "class_count", "INTEGER")
+    ctx.add_column("subjects", "absence_limit", "INTEGER")
+    ctx.add_column("subjects", "attendance_term", "VARCHAR")
+    ctx.create_index("ix_subjects_attendance_term", "subjects", "attendance_term")
+
+
+@migration(12, "último nível do aviso de faltas de cada matéria")
+def _absence_warned_level(ctx: MigrationContext) -> None:
+    ctx.add_column("subjects", "absence_warned_level", "INTEGER")
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# =============================================================================
+# Execução
+# =============================================================================
+
+def current_version(engine: Engine) -> int | None:
+    """Versão do esquema no banco, ou None se a tabela schema_version ainda não existe."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except DBAPIError:
+        return None
+
+
+def _stamp(conn: Connection, version: int, description: str) -> None:
+    conn.execute(
+        text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+        {"version": version, "description": description},
+    )
+
+
+def _create_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER NOT NULL PRIMARY KEY, description VARCHAR NOT NULL,"
+        " applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    """Só uma instância migra por vez; as outras esperam e depois encontram o banco atualizado."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def _apply(engine: Engine, migration: Migration) -> None:
+    logger.info(f"Aplicando migração {migration.version}: {migration.description}...")
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        ctx = MigrationContext(engine, conn)
+        migration.upgrade(ctx)
+    # Os índices são construídos fora da transação; só então a versão é registrada
+    ctx.build_indexes()
+    with engine.begin() as conn:
+        _stamp(conn, migration.version, migration.description)
+
+
+def ensure_schema(engine: Engine) -> int:
+    """Deixa o banco na última versão do esquema e retorna essa versão."""
+    version = current_version(engine)
+    if version == LATEST_VERSION:
+        return version
+
+    with _migration_lock(engine):
+        # Outra instância pode ter migrado enquanto esperávamos o lock
+        version = current_version(engine)
+        if version is None:
+            if not inspect(engine).has_table("users"):
+                logger.info("Banco vazio: criando as tabelas a partir dos modelos.")
+                Base.metadata.create_all(bind=engine)
+                with engine.begin() as conn:
+                    _create_version_table(conn)
+                    _stamp(conn, LATEST_VERSION, "esquema criado a partir dos modelos")
+                return LATEST_VERSION
+            with engine.begin() as conn:
+                _create_version_table(conn)
+                _stamp(conn, BASELINE_VERSION, MIGRATIONS[0].description)
+            version = BASELINE_VERSION
+
+        if version > LATEST_VERSION:
+            logger.warning(
+                f"O banco está na versão {version}, mais nova que a deste código ({LATEST_VERSION})."
+            )
+            return version
+
+        for pending in MIGRATIONS:
+            if pending.version > version:
+                _apply(engine, pending)
+    return LATEST_VERSION
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, Date, Numeric, Time
+from sqlalchemy import Column, Integer, String, BigInteger, Boolean, ForeignKey, Date, Numeric, Time, Text, DateTime, Index, func, true
 from sqlalchemy.orm import relationship
+from datetime import time
 from .base import Base
 
 class User(Base):
@@ -12,6 +13,22 @@ class User(Base):
     user_id = Column(BigInteger, unique=True, nullable=False, index=True) 
     first_name = Column(String, nullable=False)
     username = Column(String, nullable=True)
+    # False quando o usuário bloqueia o bot (ou o chat deixa de existir); volta a True
+    # na próxima mensagem dele. Envios em massa consideram só os ativos.
+    is_active = Column(Boolean, nullable=False, default=True, server_default=true())
+    blocked_at = Column(DateTime, nullable=True)
+    # Horário em que o lembrete diário de prazos é enviado e com quantos dias de
+    # antecedência (lista separada por vírgulas, ex: "1,3")
+    reminder_time = Column(Time, nullable=False, default=time(9, 0), server_default="09:00:00")
+    reminder_days = Column(String, nullable=False, default="1,3", server_default="1,3")
+    # Incrementado a cada alteração nas matérias e atividades (veja bot/db/changes.py)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Chave secreta do link de assinatura do calendário (.ics); None até o primeiro /exportar
+    calendar_token = Column(String, nullable=True)
+    # Dia do último uso do bot (no máximo uma escrita por dia; base do DAU/WAU do /stats)
+    last_seen_on = Column(Date, nullable=True)
+    # Curso escolhido no /fatec (None para quem cadastrou as matérias à mão)
+    course = Column(String, nullable=True)
     
     # Relações
     subjects = relationship("Subject", back_populates="owner", cascade="all, delete-orphan")
@@ -19,6 +36,15 @@ class User(Base):
     absences = relationship("Absence", back_populates="owner", cascade="all, delete-orphan")
     grades = relationship("Grade", back_populates="owner", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Índice parcial: os envios em massa percorrem só os usuários ativos
+        Index("ix_users_active", "user_id", postgresql_where=is_active == true(), sqlite_where=is_active == true()),
+        # Cada minuto do agendador de lembretes busca só os usuários daquele horário
+        Index("ix_users_reminder_time", "reminder_time", postgresql_where=is_active == true(), sqlite_where=is_active == true()),
+        Index("ix_users_calendar_token", "calendar_token", unique=True),
+        Index("ix_users_last_seen_on", "last_seen_on"),
+    )
+
 class Subject(Base):
     __tablename__ = "subjects"
 
@@ -31,13 +57,32 @@ class Subject(Base):
     end_time = Column(Time, nullable=True)
     semestre = Column(Integer, nullable=True)  # GARANTA QUE ESTA LINHA ESTÁ AQUI
     total_absences = Column(Integer, default=0, nullable=False)
-    user_id = Column(BigInteger, ForeignKey("users.user_id"))
+    user_id = Column(BigInteger, ForeignKey("users.user_id"), index=True)
+    # Aulas no semestre e faltas permitidas, calculadas do horário (veja attendance_service)
+    class_count = Column(Integer, nullable=True)
+    absence_limit = Column(Integer, nullable=True)
+    # Calendário usado no cálculo acima; se o semestre muda, os limites são recalculados
+    attendance_term = Column(String, nullable=True)
+    # Menor saldo de faltas já avisado (-1: passou do limite); volta a None quando o limite é recalculado
+    absence_warned_level = Column(Integer, nullable=True)
 
     owner = relationship("User", back_populates="subjects")
     activities = relationship("Activity", back_populates="subject", cascade="all, delete-orphan")
     absences = relationship("Absence", back_populates="subject", cascade="all, delete-orphan")
     grades = relationship("Grade", back_populates="subject", cascade="all, delete-orphan")
-    
+
+    __table_args__ = (
+        # Turma de uma matéria do catálogo: as matérias de mesmo nome (veja grade_stats_service)
+        Index("ix_subjects_name", "name"),
+        Index("ix_subjects_attendance_term", "attendance_term"),
+    )
+
+    @property
+    def absences_left(self) -> int | None:
+        """Faltas que ainda podem ser dadas (negativo se passou do limite; None sem horário)."""
+        if self.absence_limit is None:
+            return None
+        return self.absence_limit - (self.total_absences or 0)
     
     
 class Activity(Base):
@@ -51,25 +96,35 @@ class Activity(Base):
     name = Column(String, nullable=False)
     due_date = Column(Date, nullable=False)
     notes = Column(String, nullable=True)
-    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
-    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False, index=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False, index=True)
 
     # Relações
     owner = relationship("User", back_populates="activities")
     subject = relationship("Subject", back_populates="activities")
 
+    __table_args__ = (
+        # Paginação do /calendario por (due_date, id)
+        Index("ix_activities_user_due", "user_id", "due_date", "id"),
+    )
+
 class Absence(Base):
     __tablename__ = "absences"
     id = Column(Integer, primary_key=True, index=True)
     absence_date = Column(Date, nullable=False)
     quantity = Column(Integer, default=1, nullable=False)
     notes = Column(String, nullable=True)
-    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
-    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False, index=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False, index=True)
 
     owner = relationship("User", back_populates="absences")
     subject = relationship("Subject", back_populates="absences")
 
+    __table_args__ = (
+        # Paginação do histórico de faltas por (absence_date, id)
+        Index("ix_absences_subject_date", "subject_id", "absence_date", "id"),
+    )
+
 class Grade(Base):
     """
     Modelo que representa uma nota (P1, P2, Trabalho, etc.).
@@ -81,8 +136,8 @@ class Grade(Base):
     value = Column(Numeric(4, 2), nullable=False) # Ex: 8.50, 10.00
 
     # Chaves estrangeiras
-    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
-    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False, index=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False, index=True)
 
     # Relações
     owner = relationship("User", back_populates="grades")
@@ -104,4 +159,72 @@ class CourseSubject(Base):
     day_of_week = Column(String, nullable=False)
     start_time = Column(Time, nullable=False)
     end_time = Column(Time, nullable=False)
-    room = Column(String, nullable=True)
\ No newline at end of file
+    room = Column(String, nullable=True)
+
+
+class ConversationState(Base):
+    """
+    Estado persistido de um ConversationHandler para uma chave (chat, usuário).
+    """
+    __tablename__ = "conversation_states"
+
+    name = Column(String, primary_key=True)  # Nome do ConversationHandler
+    key = Column(String, primary_key=True)   # Chave da conversa serializada (ex: "123,123")
+    state = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class UserData(Base):
+    """
+    Conteúdo de context.user_data de um usuário, serializado em JSON compacto.
+    """
+    __tablename__ = "user_data"
+
+    user_id = Column(BigInteger, primary_key=True)
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class NotificationOutbox(Base):
+    """
+    Fila de notificações a enviar (lembretes automáticos, /lembrar, etc.).
+    As tarefas só gravam aqui; o envio é feito pelo despachante em bot/jobs.py.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, nullable=False, index=True)
+    text = Column(Text, nullable=False)
+    parse_mode = Column(String, nullable=True)
+    # Identifica a notificação para que ela não seja enfileirada duas vezes (ex: "deadlines:123:2025-03-10")
+    dedup_key = Column(String, nullable=True, unique=True)
+    send_after = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # Enquanto estiver no futuro, a linha pertence a um despachante que está enviando
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Índice parcial: só as linhas ainda pendentes são consultadas pelo despachante
+        Index(
+            "ix_notification_outbox_pending",
+            "send_after",
+            postgresql_where=status == "pending",
+            sqlite_where=status == "pending",
+        ),
+    )
+
+
+class StatsSnapshot(Base):
+    """
+    Resultado de um relatório agregado (ex: o /stats), recalculado por uma tarefa
+    periódica. Funciona como uma visão materializada: ler é uma busca pela chave.
+    """
+    __tablename__ = "stats_snapshots"
+
+    name = Column(String, primary_key=True)
+    data = Column(Text, nullable=False)  # JSON
+    computed_at = Column(DateTime, nullable=False)
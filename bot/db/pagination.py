@@ -0,0 +1,84 @@
+# bot/db/pagination.py
+"""
+Paginação por chave (keyset).
+
+Em vez de OFFSET, cada página começa logo depois da última linha da anterior: só a
+página pedida é lida do banco e o custo não cresce com o número da página. O cursor
+é a tupla com os valores das colunas de ordenação da linha de borda, por exemplo
+(due_date, id); a última coluna deve ser única para desempatar.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Sequence
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+Cursor = tuple
+
+
+@dataclass(frozen=True)
+class Page:
+    items: list
+    has_prev: bool
+    has_next: bool
+    # Cursores da primeira e da última linha (None se a página estiver vazia)
+    first: Cursor | None
+    last: Cursor | None
+
+
+def keyset_page(
+    query: Query,
+    columns: Sequence,
+    cursor: Cursor | None = None,
+    limit: int = 10,
+    backward: bool = False,
+    descending: bool = False,
+) -> Page:
+    """
+    Uma página de `query`, ordenada por `columns` (todas asc ou todas desc).
+
+    Sem cursor, devolve a primeira página. Com cursor, devolve as linhas depois dele
+    ou, com backward=True, as linhas antes dele (sempre na ordem natural da listagem).
+    """
+    # Na ordem natural asc, "depois" é maior; em desc, é menor. Voltar inverte tudo.
+    greater = descending == backward
+    if cursor is not None:
+        key, bound = tuple_(*columns), tuple_(*cursor)
+        query = query.filter(key > bound if greater else key < bound)
+    query = query.order_by(*(c.asc() if greater else c.desc() for c in columns))
+
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    del rows[limit:]
+    if backward:
+        rows.reverse()
+
+    def cursor_of(row) -> Cursor:
+        return tuple(getattr(row, c.key) for c in columns)
+
+    return Page(
+        items=rows,
+        has_prev=more if backward else cursor is not None,
+        has_next=True if backward else more,
+        first=cursor_of(rows[0]) if rows else None,
+        last=cursor_of(rows[-1]) if rows else None,
+    )
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Cursor em texto curto, para caber no callback_data (limite de 64 bytes)."""
+    return "_".join(v.isoformat() if isinstance(v, date) else str(v) for v in cursor)
+
+
+def decode_cursor(text: str, types: Sequence[type]) -> Cursor:
+    """Inverso de encode_cursor; `types` diz o tipo de cada posição (date, int, ...)."""
+    values = text.split("_")
+    if len(values) != len(types):
+        raise ValueError(f"Cursor inválido: {text!r}")
+    return tuple(_parse(value, kind) for value, kind in zip(values, types))
+
+
+def _parse(value: str, kind: type) -> Any:
+    return kind.fromisoformat(value) if issubclass(kind, date) else kind(value)
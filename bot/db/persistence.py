@@ -0,0 +1,262 @@
+# bot/db/persistence.py
+
+import asyncio
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import telegram
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from telegram import TelegramObject
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.core.settings import PERSISTENCE_FLUSH_INTERVAL
+from bot.db.base import SessionLocal
+from bot.db.models import ConversationState, UserData
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_value(value):
+    """Converte os tipos usados no user_data para algo que o JSON entenda."""
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__d__": value.isoformat()}
+    if isinstance(value, time):
+        return {"__t__": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"__dec__": str(value)}
+    if isinstance(value, TelegramObject):
+        return {"__tg__": type(value).__name__, "v": value.to_dict()}
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def _encode_key(key: tuple) -> str:
+    return ",".join(str(part) for part in key)
+
+
+def _decode_key(key: str) -> tuple:
+    return tuple(int(part) for part in key.split(","))
+
+
+class SQLAlchemyPersistence(BasePersistence):
+    """
+    Persiste o estado dos ConversationHandlers e o context.user_data no banco.
+
+    - Só grava o que mudou: o user_data serializado é comparado com a última versão gravada.
+    - As gravações são feitas em lote, no intervalo definido por PERSISTENCE_FLUSH_INTERVAL.
+    - O user_data de cada usuário é carregado sob demanda, na primeira atualização dele.
+    """
+
+    def __init__(self, session_factory=SessionLocal, update_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(chat_data=False, bot_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._session_factory = session_factory
+        self._loaded_users: set[int] = set()
+        # Hash da última versão gravada de cada user_data (para não regravar o que não mudou)
+        self._written_user_data: dict[int, int] = {}
+        # Alterações aguardando gravação. None significa "apagar".
+        self._pending_user_data: dict[int, str | None] = {}
+        self._pending_conversations: dict[tuple[str, str], int | None] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+
+    # -------------------------------------------------------------------------
+    # Serialização
+    # -------------------------------------------------------------------------
+
+    def _serialize(self, data: dict) -> str:
+        """Gera um JSON compacto, ignorando valores que não podem ser persistidos."""
+        parts = []
+        for key, value in data.items():
+            try:
+                encoded = json.dumps(value, default=_encode_value, separators=(",", ":"), ensure_ascii=False)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Valor '{key}' do user_data não será persistido: {e}")
+                continue
+            parts.append(f"{json.dumps(str(key), ensure_ascii=False)}:{encoded}")
+        return "{" + ",".join(parts) + "}"
+
+    def _decode_object(self, obj: dict):
+        if "__dt__" in obj:
+            return datetime.fromisoformat(obj["__dt__"])
+        if "__d__" in obj:
+            return date.fromisoformat(obj["__d__"])
+        if "__t__" in obj:
+            return time.fromisoformat(obj["__t__"])
+        if "__dec__" in obj:
+            return Decimal(obj["__dec__"])
+        if "__tg__" in obj:
+            return getattr(telegram, obj["__tg__"]).de_json(obj["v"], self.bot)
+        return obj
+
+    def _deserialize(self, blob: str) -> dict:
+        return json.loads(blob, object_hook=self._decode_object)
+
+    # -------------------------------------------------------------------------
+    # Leitura
+    # -------------------------------------------------------------------------
+
+    async def get_user_data(self) -> dict:
+        # Nada é carregado na inicialização; veja refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """Carrega o user_data salvo na primeira atualização recebida do usuário."""
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+
+        blob = await asyncio.to_thread(self._load_user_data, user_id)
+        if blob is None:
+            return
+        self._written_user_data[user_id] = hash(blob)
+        for key, value in self._deserialize(blob).items():
+            # O que já foi gravado nesta execução tem prioridade sobre o que estava no banco
+            user_data.setdefault(key, value)
+
+    def _load_user_data(self, user_id: int) -> str | None:
+        with self._session_factory() as db:
+            return db.execute(select(UserData.data).where(UserData.user_id == user_id)).scalar_one_or_none()
+
+    async def get_conversations(self, name: str) -> dict:
+        def load():
+            with self._session_factory() as db:
+                rows = db.execute(
+                    select(ConversationState.key, ConversationState.state).where(ConversationState.name == name)
+                ).all()
+            return {_decode_key(key): state for key, state in rows}
+
+        return await asyncio.to_thread(load)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # -------------------------------------------------------------------------
+    # Escrita (acumulada e gravada em lote)
+    # -------------------------------------------------------------------------
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        blob = self._serialize(data)
+        if blob == "{}":
+            # user_data vazio não ocupa espaço no banco: apaga a linha, se existir
+            blob = None
+        if self._written_user_data.get(user_id) == (hash(blob) if blob is not None else None):
+            self._pending_user_data.pop(user_id, None)
+            return
+        self._pending_user_data[user_id] = blob
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_user_data[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        self._pending_conversations[(name, _encode_key(key))] = new_state
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    def _schedule_flush(self) -> None:
+        """
+        Agenda uma única gravação para todas as alterações recebidas na mesma rodada
+        de Application.update_persistence (que chama os update_* concorrentemente).
+        """
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        await asyncio.sleep(0)
+        try:
+            await self._write_pending()
+        except Exception as e:
+            logger.error(f"Erro ao gravar a persistência (nova tentativa na próxima rodada): {e}")
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write_pending()
+
+    async def _write_pending(self) -> None:
+        async with self._flush_lock:
+            user_data, self._pending_user_data = self._pending_user_data, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            if not user_data and not conversations:
+                return
+            try:
+                await asyncio.to_thread(self._write_batch, user_data, conversations)
+            except Exception:
+                # Devolve as alterações para a fila; a próxima rodada tenta de novo
+                for user_id, blob in user_data.items():
+                    self._pending_user_data.setdefault(user_id, blob)
+                for key, state in conversations.items():
+                    self._pending_conversations.setdefault(key, state)
+                raise
+
+            for user_id, blob in user_data.items():
+                if blob is None:
+                    self._written_user_data.pop(user_id, None)
+                else:
+                    self._written_user_data[user_id] = hash(blob)
+
+    def _write_batch(self, user_data: dict, conversations: dict) -> None:
+        """Grava todas as alterações pendentes em uma única transação."""
+        with self._session_factory() as db:
+            insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+            upserts = [{"user_id": uid, "data": blob} for uid, blob in user_data.items() if blob is not None]
+            drops = [uid for uid, blob in user_data.items() if blob is None]
+            if upserts:
+                stmt = insert(UserData).values(upserts)
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=[UserData.user_id],
+                    set_={"data": stmt.excluded.data, "updated_at": func.now()},
+                ))
+            if drops:
+                db.execute(delete(UserData).where(UserData.user_id.in_(drops)))
+
+            states = [
+                {"name": name, "key": key, "state": state}
+                for (name, key), state in conversations.items() if state is not None
+            ]
+            if states:
+                stmt = insert(ConversationState).values(states)
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=[ConversationState.name, ConversationState.key],
+                    set_={"state": stmt.excluded.state, "updated_at": func.now()},
+                ))
+            for name, key in (k for k, state in conversations.items() if state is None):
+                db.execute(delete(ConversationState).where(
+                    ConversationState.name == name, ConversationState.key == key
+                ))
+
+            db.commit()
+        logger.debug(f"Persistência gravada: {len(user_data)} user_data, {len(conversations)} conversa(s).")
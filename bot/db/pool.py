@@ -0,0 +1,135 @@
+# bot/db/pool.py
+
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class PoolStats:
+    """Contadores de checkout do pool: quantas conexões foram pedidas e quanto se esperou por elas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self, reset: bool = False) -> dict:
+        with self._lock:
+            snapshot = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": (self.wait_total / self.checkouts * 1000) if self.checkouts else 0.0,
+                "max_wait_ms": self.wait_max * 1000,
+            }
+            if reset:
+                self.reset()
+        return snapshot
+
+
+class _TimedCheckoutMixin:
+    """Mede o tempo de cada checkout (espera por uma conexão livre ou abertura de uma nova)."""
+
+    def __init__(self, *args, **kwargs):
+        # Contadores por pool: o principal e a réplica (e um pool recriado) não se misturam
+        self.stats = PoolStats()
+        super().__init__(*args, **kwargs)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            # Só o pool esgotado conta como timeout; erro ao conectar não é espera por conexão
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckoutMixin, NullPool):
+    pass
+
+
+def engine_options(
+    url: str,
+    mode: str,
+    use_null_pool: bool,
+    pool_size: int,
+    max_overflow: int,
+    pool_timeout: float,
+    pool_recycle: int,
+    pre_ping: bool,
+    statement_timeout_ms: int,
+) -> dict:
+    """
+    Monta os argumentos do create_engine a partir das configurações do pool.
+
+    mode="transaction" é para rodar atrás do pgbouncer em pool por transação: nada de
+    estado de sessão no servidor (prepared statements, parâmetros de inicialização).
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        # SQLite (desenvolvimento e benchmarks) fica com o pool padrão do SQLAlchemy
+        return {"pool_pre_ping": pre_ping}
+
+    options = {"pool_pre_ping": pre_ping}
+    if use_null_pool:
+        # O pgbouncer já faz o pool: cada checkout abre uma conexão (barata) com ele
+        options["poolclass"] = InstrumentedNullPool
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_use_lifo=True,
+        )
+
+    connect_args = {}
+    if mode == "transaction":
+        # psycopg 3 prepara comandos repetidos no servidor; com o pgbouncer a próxima
+        # transação pode cair em outra conexão, onde o prepared statement não existe.
+        # (psycopg2 nunca usa prepared statements no servidor.)
+        if parsed.get_driver_name() == "psycopg":
+            connect_args["prepare_threshold"] = None
+        # O pgbouncer recusa o parâmetro 'options' na conexão: o statement_timeout deve
+        # ser configurado no papel do banco (ALTER ROLE ... SET statement_timeout).
+    elif statement_timeout_ms > 0:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def pool_metrics(engine, reset: bool = False) -> dict:
+    """Estado atual do pool do engine e os contadores de checkout desde o último reset."""
+    pool = engine.pool
+    metrics = {"pool": type(pool).__name__}
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        metrics.update(stats.snapshot(reset=reset))
+    if isinstance(pool, QueuePool):
+        metrics.update(size=pool.size(), checked_out=pool.checkedout(), overflow=max(pool.overflow(), 0))
+    return metrics
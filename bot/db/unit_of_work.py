@@ -0,0 +1,189 @@
+# bot/db/unit_of_work.py
+
+import logging
+from contextvars import ContextVar
+
+from sqlalchemy.orm import Session
+from telegram import Update
+from telegram.ext import Application, CallbackContext, ExtBot
+
+from bot.db.base import ReadSessionLocal, SessionLocal, engine, read_your_writes, replica_engine
+
+logger = logging.getLogger(__name__)
+
+
+class UnitOfWork:
+    """
+    Uma única sessão (e transação) do banco para todo o processamento de uma atualização.
+
+    A conexão só é aberta no primeiro acesso a 'session'. Os db.commit() feitos pelos
+    serviços durante a atualização apenas descarregam as alterações (flush); o COMMIT
+    de verdade acontece antes de cada envio ao Telegram (veja commit) e no fim. Se algum
+    handler falhar, o que ainda não foi confirmado é desfeito.
+
+    'read_session' é a sessão das listagens e relatórios: lê da réplica, a menos que
+    o usuário tenha gravado algo há pouco (ou nesta mesma atualização).
+    """
+
+    def __init__(self, bind=engine, user_id: int | None = None):
+        self._bind = bind
+        self._connection = None
+        self._session: Session | None = None
+        self._read_session: Session | None = None
+        self.user_id = user_id
+        self.failed = False
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            self._connection = self._bind.connect()
+            self._connection.begin()
+            # 'rollback_only': commit() da sessão não encerra a transação externa
+            self._session = SessionLocal(bind=self._connection, join_transaction_mode="rollback_only")
+        return self._session
+
+    @property
+    def read_session(self) -> Session:
+        if replica_engine is None or self._session is not None and self._session.info.get("wrote"):
+            return self.session
+        if self.user_id is not None and read_your_writes.wrote_recently(self.user_id):
+            return self.session
+        if self._read_session is None:
+            self._read_session = ReadSessionLocal()
+        return self._read_session
+
+    def commit(self) -> None:
+        """
+        Confirma o que a atualização já gravou e segue em uma nova transação na mesma
+        conexão. Chamado antes de cada chamada à API (commit_current): a resposta
+        ("Falta registrada") só sai depois do COMMIT, e a transação, com as linhas que
+        travou, não fica aberta enquanto se espera a rede. Se o COMMIT falhar, o erro
+        sobe no handler, antes da resposta, e chega ao error handler.
+        """
+        if self.failed:
+            return
+        try:
+            if self._read_session is not None:
+                self._read_session.commit()
+            if self._session is None:
+                return
+            self._session.flush()
+            if self._connection.in_transaction():
+                self._connection.commit()
+        except Exception:
+            self.failed = True
+            if self._connection is not None:
+                self._connection.rollback()
+            raise
+        if self._session.info.get("wrote") and self.user_id is not None:
+            read_your_writes.note_write(self.user_id)
+        # A sessão continua a mesma e passa a usar a nova transação
+        self._connection.begin()
+
+    def finish(self) -> None:
+        wrote = False
+        try:
+            if self._read_session is not None:
+                wrote = self._read_session.info.get("wrote", False)
+                try:
+                    if self.failed:
+                        self._read_session.rollback()
+                    else:
+                        self._read_session.commit()
+                finally:
+                    self._read_session.close()
+                    self._read_session = None
+        finally:
+            if self._session is not None:
+                wrote = wrote or self._session.info.get("wrote", False)
+                self._finish_session()
+        if wrote and not self.failed and self.user_id is not None:
+            read_your_writes.note_write(self.user_id)
+
+    def _finish_session(self) -> None:
+        try:
+            if self.failed:
+                self._connection.rollback()
+            else:
+                self._session.flush()
+                # Um serviço pode ter feito rollback no meio; confirma a transação que estiver aberta
+                if self._connection.in_transaction():
+                    self._connection.commit()
+        except Exception:
+            self._connection.rollback()
+            raise
+        finally:
+            self._session.close()
+            self._connection.close()
+            self._session = None
+            self._connection = None
+
+
+_current: ContextVar[UnitOfWork | None] = ContextVar("unit_of_work", default=None)
+
+
+def commit_current() -> None:
+    """Confirma a transação da atualização em processamento, se houver (veja UnitOfWork.commit)."""
+    unit = _current.get()
+    if unit is not None:
+        unit.commit()
+
+
+def current_session() -> Session:
+    """Sessão da atualização em processamento. Só existe dentro de um handler."""
+    unit = _current.get()
+    if unit is None:
+        raise RuntimeError("Nenhuma atualização em processamento: use SessionLocal() fora dos handlers.")
+    return unit.session
+
+
+def current_read_session() -> Session:
+    """Sessão de leitura da atualização em processamento (réplica, quando possível)."""
+    unit = _current.get()
+    if unit is None:
+        raise RuntimeError("Nenhuma atualização em processamento: use ReadSessionLocal() fora dos handlers.")
+    return unit.read_session
+
+
+class BotContext(CallbackContext[ExtBot, dict, dict, dict]):
+    """
+    CallbackContext com acesso à sessão da atualização atual via context.db.
+    Handlers que só leem (listagens, relatórios) usam context.read_db.
+    """
+
+    @property
+    def db(self) -> Session:
+        return current_session()
+
+    @property
+    def read_db(self) -> Session:
+        return current_read_session()
+
+
+class UnitOfWorkApplication(Application):
+    """Application que envolve o processamento de cada atualização em um UnitOfWork."""
+
+    async def process_update(self, update: object) -> None:
+        user = update.effective_user if isinstance(update, Update) else None
+        unit = UnitOfWork(user_id=user.id if user else None)
+        token = _current.set(unit)
+        try:
+            await super().process_update(update)
+        except Exception:
+            unit.failed = True
+            raise
+        finally:
+            _current.reset(token)
+            try:
+                unit.finish()
+            except Exception as e:
+                # O usuário pode já ter recebido a resposta: o error handler avisa que falhou
+                logger.error(f"Erro ao confirmar a transação da atualização: {e}")
+                await self.process_error(update=update, error=e)
+
+    async def process_error(self, update, error, job=None, coroutine=None) -> bool:
+        # Um handler falhou: nada do que ele gravou deve ser confirmado
+        unit = _current.get()
+        if unit is not None and job is None:
+            unit.failed = True
+        return await super().process_error(update=update, error=error, job=job, coroutine=coroutine)
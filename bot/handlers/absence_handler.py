@@ -10,9 +10,15 @@ from telegram.ext import (
     CallbackQueryHandler,
 )
 
-from bot.db.base import SessionLocal
-from bot.services import user_service, subject_service, absence_service
+from bot.services import user_service, subject_service, absence_service, attendance_service
 from bot.core import dialogs
+from bot.core.callbacks import router
+from bot.handlers import keyboards
+from bot import views
+from bot.core.settings import CONVERSATION_TIMEOUT
+from bot.db.pagination import decode_cursor, encode_cursor
+from bot.handlers.replies import send_html
+from bot.handlers.users import reader_for
 
 logger = logging.getLogger(__name__)
 
@@ -35,11 +41,11 @@ async def new_absence_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    reply_markup = keyboards.subject_picker(db, user, "abs.subj")
 
-    if not subjects:
+    if reply_markup is None:
         text = dialogs.ABSENCE_CREATE_NO_SUBJECTS
         if query:
             await query.message.reply_text(text)
@@ -47,9 +53,6 @@ async def new_absence_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text(text)
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(s.name, callback_data=f"absence_subject_{s.id}")] for s in subjects]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     text = dialogs.ABSENCE_CREATE_ASK_SUBJECT
     if query:
         await query.message.reply_text(text, reply_markup=reply_markup)
@@ -63,10 +66,10 @@ async def received_absence_subject(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
 
-    subject_id = int(query.data.split('_')[-1])
+    subject_id = router.parse(query.data).int_arg()
     context.user_data['absence_subject_id'] = subject_id
     
-    keyboard = [[InlineKeyboardButton("A aula foi hoje", callback_data="absence_date_today")]]
+    keyboard = [[InlineKeyboardButton("A aula foi hoje", callback_data=router.data("abs.today"))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await query.edit_message_text(
@@ -122,20 +125,20 @@ async def received_absence_notes(update: Update, context: ContextTypes.DEFAULT_T
     data = context.user_data
     telegram_user = update.effective_user
     
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subject = subject_service.get_subject_by_id(db, data['absence_subject_id'])
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    subject = subject_service.get_subject_by_id(db, data['absence_subject_id'])
         
-        absence_service.add_absence(db, user, subject, data['absence_date'], data['absence_quantity'], notes)
+    absence_service.add_absence(db, user, subject, data['absence_date'], data['absence_quantity'], notes)
         
-        await update.message.reply_text(
-            dialogs.ABSENCE_CREATE_SUCCESS.format(
-                quantity=data['absence_quantity'],
-                subject_name=subject.name,
-                total_absences=subject.total_absences
-            ), 
-            parse_mode='Markdown'
-        )
+    await update.message.reply_text(
+        dialogs.ABSENCE_CREATE_SUCCESS.format(
+            quantity=data['absence_quantity'],
+            subject_name=subject.name,
+            total_absences=subject.total_absences
+        ), 
+        parse_mode='Markdown'
+    )
 
     context.user_data.clear()
     return ConversationHandler.END
@@ -154,6 +157,7 @@ async def absence_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # Seção 2: Relatório e Gerenciamento de Faltas
 # =============================================================================
 
+@router.route("abs.report")
 async def report_absences(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Gera um relatório com o total de faltas para cada matéria."""
     query = update.callback_query
@@ -163,9 +167,8 @@ async def report_absences(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     else:
         telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db, user = reader_for(context, telegram_user)
+    subjects = subject_service.get_subjects_by_user(db, user)
 
     if not subjects:
         message = dialogs.ABSENCE_REPORT_NO_SUBJECTS
@@ -173,14 +176,7 @@ async def report_absences(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         else: await update.message.reply_text(text=message)
         return
 
-    message = dialogs.ABSENCE_REPORT_HEADER
-    for subject in subjects:
-        message += dialogs.ABSENCE_REPORT_ITEM.format(subject_name=subject.name, total_absences=subject.total_absences)
-
-    if query:
-        await query.edit_message_text(message, parse_mode='HTML')
-    else:
-        await update.message.reply_html(message)
+    await send_html(update, views.render_absence_report(subjects, attendance_service.current_semester()))
 
 
 async def manage_absences_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -192,18 +188,16 @@ async def manage_absences_start(update: Update, context: ContextTypes.DEFAULT_TY
     else:
         telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    reply_markup = keyboards.subject_picker(db, user, "abs.hist", label=keyboards.subject_with_absences)
 
-    if not subjects:
+    if reply_markup is None:
         text = dialogs.ABSENCE_MANAGE_NO_SUBJECTS
         if query: await query.edit_message_text(text=text)
         else: await update.message.reply_text(text)
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(f"{s.name} ({s.total_absences} faltas)", callback_data=f"mng_abs_subj_{s.id}")] for s in subjects]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     text = dialogs.ABSENCE_MANAGE_PROMPT
     
     if query: await query.edit_message_text(text, reply_markup=reply_markup)
@@ -212,50 +206,60 @@ async def manage_absences_start(update: Update, context: ContextTypes.DEFAULT_TY
     return SELECT_SUBJECT_TO_MANAGE
 
 async def show_numbered_absences(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Mostra a lista numerada de faltas e pede para o usuário escolher um número."""
+    """
+    Mostra uma página da lista numerada de faltas e pede para o usuário escolher um número.
+    Os botões Anterior/Próxima ("abs.hist" com matéria, direção, número e cursor) trazem
+    as páginas vizinhas; a numeração continua de uma página para a outra.
+    """
     query = update.callback_query
     await query.answer()
-    subject_id = int(query.data.split('_')[-1])
-
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subject_id)
-        absences = absence_service.get_absences_by_subject(db, subject)
-
-    if not absences:
+    callback = router.parse(query.data)
+    subject_id = callback.int_arg()
+    cursor, backward, number = None, False, 1
+    if len(callback.args) > 1:
+        direction, number, raw_cursor = callback.args[1:]
+        number = int(number)
+        cursor = decode_cursor(raw_cursor, absence_service.ABSENCE_CURSOR)
+        backward = direction == "p"
+
+    db = context.db
+    subject = subject_service.get_subject_by_id(db, subject_id)
+    page = absence_service.get_absences_page(db, subject, cursor, backward)
+    if not page.items and cursor is not None:
+        page, backward, number = absence_service.get_absences_page(db, subject), False, 1
+
+    if not page.items:
         await query.edit_message_text(dialogs.ABSENCE_MANAGE_NO_RECORDS.format(subject_name=subject.name), parse_mode='HTML')
         return ConversationHandler.END
 
-    message = f"Histórico de faltas para <b>{subject.name}</b>:\n\n"
-    absence_ids = []
-    for i, absence in enumerate(absences, 1):
-        absence_ids.append(absence.id)
-        date_str = absence.absence_date.strftime('%d/%m/%Y')
-        message += f"<b>{i}</b> - {date_str} - {absence.quantity} Falta(s)\n"
-        if absence.notes:
-            message += f"Obs: {absence.notes}\n"
-        message += dialogs.SEPARATOR
-
-    message += "\nPor favor, envie o <b>número</b> do registro que deseja gerenciar."
-    
-    # Salva a lista de IDs para referência futura
-    context.user_data['absence_ids_map'] = absence_ids
-    
-    await query.edit_message_text(message, parse_mode='HTML')
+    # Voltando, o botão traz o número do primeiro item da página atual
+    first_number = max(1, number - len(page.items)) if backward else number
+    message = views.render_absence_history(subject, page.items, first_number)
+    keyboard = views.page_keyboard(
+        router.data("abs.hist", subject.id, "p", first_number, encode_cursor(page.first)) if page.has_prev else None,
+        router.data("abs.hist", subject.id, "n", first_number + len(page.items), encode_cursor(page.last)) if page.has_next else None,
+    )
+
+    # Salva os IDs da página para referência futura
+    context.user_data['absence_ids_map'] = [absence.id for absence in page.items]
+    context.user_data['absence_first_number'] = first_number
+
+    await send_html(update, message, keyboard)
     return AWAITING_RECORD_CHOICE
 
 async def received_record_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Recebe o número do registro e pergunta a ação (editar ou excluir)."""
     try:
-        choice = int(update.message.text)
         absence_ids_map = context.user_data['absence_ids_map']
-        if not (1 <= choice <= len(absence_ids_map)):
+        index = int(update.message.text) - context.user_data.get('absence_first_number', 1)
+        if not (0 <= index < len(absence_ids_map)):
             raise ValueError
     except (ValueError, TypeError):
         await update.message.reply_text("Número inválido. Por favor, envie um número da lista acima.")
         return AWAITING_RECORD_CHOICE
 
     # Converte a escolha do usuário (ex: 1) para o ID real do banco (ex: 17)
-    selected_absence_id = absence_ids_map[choice - 1]
+    selected_absence_id = absence_ids_map[index]
     context.user_data['absence_id_to_manage'] = selected_absence_id
 
     text = "O que você deseja fazer?\n\n<b>1</b> - Editar a quantidade\n<b>2</b> - Excluir o registro"
@@ -286,8 +290,8 @@ async def received_new_quantity(update: Update, context: ContextTypes.DEFAULT_TY
         return AWAITING_NEW_QUANTITY
 
     absence_id = context.user_data['absence_id_to_manage']
-    with SessionLocal() as db:
-        absence_service.update_absence_quantity(db, absence_id, new_quantity)
+    db = context.db
+    absence_service.update_absence_quantity(db, absence_id, new_quantity)
     
     await update.message.reply_text(dialogs.ABSENCE_MANAGE_UPDATE_SUCCESS)
     context.user_data.clear()
@@ -297,8 +301,8 @@ async def confirm_text_delete(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Recebe a confirmação de exclusão por texto e finaliza."""
     if update.message.text.upper() == 'SIM':
         absence_id = context.user_data['absence_id_to_manage']
-        with SessionLocal() as db:
-            absence_service.delete_absence_by_id(db, absence_id)
+        db = context.db
+        absence_service.delete_absence_by_id(db, absence_id)
         await update.message.reply_text(dialogs.ABSENCE_MANAGE_DELETE_SUCCESS)
         context.user_data.clear()
         return ConversationHandler.END
@@ -315,14 +319,17 @@ async def confirm_text_delete(update: Update, context: ContextTypes.DEFAULT_TYPE
 def setup_absence_handler() -> ConversationHandler:
     """Cria e configura o ConversationHandler para /faltei."""
     return ConversationHandler(
+        name="add_absence",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("faltei", new_absence_start),
-            CallbackQueryHandler(new_absence_start, pattern="^start_new_absence$")
+            CallbackQueryHandler(new_absence_start, pattern=router.pattern("abs.new"))
         ],
         states={
-            SELECT_SUBJECT_FOR_ABSENCE: [CallbackQueryHandler(received_absence_subject, pattern="^absence_subject_")],
+            SELECT_SUBJECT_FOR_ABSENCE: [CallbackQueryHandler(received_absence_subject, pattern=router.pattern("abs.subj"))],
             GET_ABSENCE_DATE: [
-                CallbackQueryHandler(received_absence_date, pattern="^absence_date_today$"),
+                CallbackQueryHandler(received_absence_date, pattern=router.pattern("abs.today")),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, received_absence_date)
             ],
             GET_ABSENCE_QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_absence_quantity)],
@@ -335,13 +342,19 @@ def setup_absence_handler() -> ConversationHandler:
 def setup_absence_management_handler() -> ConversationHandler:
     """Cria o ConversationHandler para /gerenciarfaltas com base em texto."""
     return ConversationHandler(
+        name="manage_absences",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("gerenciarfaltas", manage_absences_start),
             # Removido o entry_point de botão, pois o comando agora é explícito
         ],
         states={
-            SELECT_SUBJECT_TO_MANAGE: [CallbackQueryHandler(show_numbered_absences, pattern="^mng_abs_subj_")],
-            AWAITING_RECORD_CHOICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_record_choice)],
+            SELECT_SUBJECT_TO_MANAGE: [CallbackQueryHandler(show_numbered_absences, pattern=router.pattern("abs.hist"))],
+            AWAITING_RECORD_CHOICE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, received_record_choice),
+                CallbackQueryHandler(show_numbered_absences, pattern=router.pattern("abs.hist")),
+            ],
             AWAITING_ACTION_CHOICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_action_choice)],
             AWAITING_NEW_QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_new_quantity)],
             CONFIRM_DELETE: [MessageHandler(filters.TEXT & ~filters.COMMAND, confirm_text_delete)],
@@ -10,9 +10,15 @@ from telegram.ext import (
     CallbackQueryHandler,
 )
 
-from bot.db.base import SessionLocal
 from bot.services import user_service, subject_service, activity_service
 from bot.core import dialogs
+from bot.core.callbacks import router
+from bot.handlers import keyboards
+from bot import views
+from bot.core.settings import CONVERSATION_TIMEOUT
+from bot.db.pagination import decode_cursor, encode_cursor
+from bot.handlers.replies import send_html
+from bot.handlers.users import reader_for
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +39,7 @@ async def new_activity_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     if query:
         await query.answer()
-        data = query.data
-        activity_type = "trabalho" if "trabalho" in data else "prova"
+        activity_type = router.parse(query.data).args[0]
     else:
         command = update.message.text.split(' ')[0][1:]
         activity_type = "trabalho" if command == "addtrabalho" else "prova"
@@ -52,27 +57,25 @@ async def new_activity_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def received_activity_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data["activity_name"] = update.message.text
     telegram_user = update.effective_user
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    reply_markup = keyboards.subject_picker(db, user, "act.subj")
 
-    if not subjects:
+    if reply_markup is None:
         await update.message.reply_text(dialogs.ACTIVITY_CREATE_NO_SUBJECTS)
         context.user_data.clear()
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(s.name, callback_data=f"link_subject_{s.id}")] for s in subjects]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(dialogs.ACTIVITY_CREATE_ASK_SUBJECT, reply_markup=reply_markup)
     return A_SUBJECT
 
 async def received_activity_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    subject_id = int(query.data.split('_')[2])
+    subject_id = router.parse(query.data).int_arg()
     context.user_data["subject_id"] = subject_id
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subject_id)
+    db = context.db
+    subject = subject_service.get_subject_by_id(db, subject_id)
     await query.edit_message_text(
         dialogs.ACTIVITY_CREATE_CONFIRM_SUBJECT_ASK_DATE.format(subject_name=subject.name),
         parse_mode="HTML"
@@ -97,13 +100,13 @@ async def received_activity_notes(update: Update, context: ContextTypes.DEFAULT_
 
     data = context.user_data
     telegram_user = update.effective_user
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subject = subject_service.get_subject_by_id(db, data["subject_id"])
-        activity_service.create_activity(
-            db=db, user=user, subject=subject, name=data["activity_name"],
-            due_date=data["due_date"], notes=notes, activity_type=data["activity_type"],
-        )
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    subject = subject_service.get_subject_by_id(db, data["subject_id"])
+    activity_service.create_activity(
+        db=db, user=user, subject=subject, name=data["activity_name"],
+        due_date=data["due_date"], notes=notes, activity_type=data["activity_type"],
+    )
     await update.message.reply_text(
         dialogs.ACTIVITY_CREATE_SUCCESS.format(activity_type=data["activity_type"].capitalize(), activity_name=data["activity_name"])
     )
@@ -121,15 +124,17 @@ async def activity_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 def setup_activity_handler() -> ConversationHandler:
     """Cria o ConversationHandler para /addtrabalho e /addprova."""
     return ConversationHandler(
+        name="add_activity",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("addtrabalho", new_activity_start),
             CommandHandler("addprova", new_activity_start),
-            CallbackQueryHandler(new_activity_start, pattern="^start_new_activity_trabalho$"),
-            CallbackQueryHandler(new_activity_start, pattern="^start_new_activity_prova$")
+            CallbackQueryHandler(new_activity_start, pattern=router.pattern("act.new"))
         ],
         states={
             A_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_activity_name)],
-            A_SUBJECT: [CallbackQueryHandler(received_activity_subject, pattern="^link_subject_")],
+            A_SUBJECT: [CallbackQueryHandler(received_activity_subject, pattern=router.pattern("act.subj"))],
             A_DUEDATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_activity_due_date)],
             A_NOTES: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_activity_notes)],
         },
@@ -141,39 +146,38 @@ def setup_activity_handler() -> ConversationHandler:
 # Seção 2: Lógica de Listagem e Gerenciamento
 # =============================================================================
 
+@router.route("cal")
 async def list_activities(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Lista as atividades, respondendo a um comando ou editando uma mensagem de botão."""
+    """
+    Lista as atividades, respondendo a um comando ou editando uma mensagem de botão.
+    Mostra uma página por vez; os botões Anterior/Próxima ("cal" com direção e cursor)
+    trazem as vizinhas.
+    """
     query = update.callback_query
+    cursor, backward = None, False
     if query:
         await query.answer()
         telegram_user = query.from_user
+        callback = router.parse(query.data)
+        if callback and callback.args:
+            direction, raw_cursor = callback.args
+            cursor = decode_cursor(raw_cursor, activity_service.ACTIVITY_CURSOR)
+            backward = direction == "p"
     else:
         telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        activities = activity_service.get_activities_by_user(db, user)
-
-        if not activities:
-            message = dialogs.ACTIVITY_LIST_NO_ACTIVITIES
-        else:
-            message = dialogs.ACTIVITY_LIST_HEADER
-            for a in activities:
-                icon = "📝" if a.activity_type == "trabalho" else "❗️"
-                date_str = a.due_date.strftime("%d/%m/%Y")
-                message += (
-                    f"{icon} <b>{a.name}</b> ({a.activity_type.capitalize()})\n"
-                    f"   • <b>Matéria:</b> {a.subject.name}\n"
-                    f"   • <b>Data:</b> {date_str}\n"
-                )
-                if a.notes:
-                    message += f"   • <b>Obs:</b> {a.notes}\n"
-                message += dialogs.SEPARATOR
-    
-    if query:
-        await query.edit_message_text(message, parse_mode="HTML")
-    else:
-        await update.message.reply_html(message)
+    db, user = reader_for(context, telegram_user)
+    page = activity_service.get_activities_page(db, user, cursor, backward)
+    if not page.items and cursor is not None:
+        # As atividades da página pedida foram apagadas: volta para o começo
+        page = activity_service.get_activities_page(db, user)
+
+    message = views.render_activity_list(page.items)
+    keyboard = views.page_keyboard(
+        router.data("cal", "p", encode_cursor(page.first)) if page.has_prev and page.items else None,
+        router.data("cal", "n", encode_cursor(page.last)) if page.has_next and page.items else None,
+    )
+    await send_html(update, message, keyboard)
 
 
 async def manage_activities_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -182,8 +186,7 @@ async def manage_activities_start(update: Update, context: ContextTypes.DEFAULT_
     activity_type = ""
     if query:
         await query.answer()
-        data = query.data
-        activity_type = "trabalho" if "trabalhos" in data else "prova"
+        activity_type = router.parse(query.data).args[0]
     else:
         command = update.message.text.split(' ')[0][1:]
         activity_type = "trabalho" if command == "gerenciartrabalhos" else "prova"
@@ -191,9 +194,9 @@ async def manage_activities_start(update: Update, context: ContextTypes.DEFAULT_
     context.user_data["activity_type_to_manage"] = activity_type
     telegram_user = query.from_user if query else update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        acts = activity_service.get_activities_by_user_and_type(db, user, activity_type)
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    acts = activity_service.get_activities_by_user_and_type(db, user, activity_type)
 
     if not acts:
         text = dialogs.MANAGE_ACTIVITIES_NONE.format(type=activity_type)
@@ -201,7 +204,7 @@ async def manage_activities_start(update: Update, context: ContextTypes.DEFAULT_
         else: await update.message.reply_text(text)
         return ConversationHandler.END
 
-    kb = [[InlineKeyboardButton(f"{a.name} ({a.due_date.strftime('%d/%m')})", callback_data=f"mng_act_{a.id}")] for a in acts]
+    kb = [[InlineKeyboardButton(f"{a.name} ({a.due_date.strftime('%d/%m')})", callback_data=router.data("act.sel", a.id))] for a in acts]
     text = dialogs.MANAGE_ACTIVITIES_HEADER.format(type=activity_type.capitalize())
     reply_markup = InlineKeyboardMarkup(kb)
     
@@ -214,15 +217,15 @@ async def manage_activities_start(update: Update, context: ContextTypes.DEFAULT_
 async def select_activity_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    activity_id = int(query.data.split('_')[-1])
+    activity_id = router.parse(query.data).int_arg()
     context.user_data['activity_id_to_manage'] = activity_id
 
-    with SessionLocal() as db:
-        activity = activity_service.get_activity_by_id(db, activity_id)
+    db = context.db
+    activity = activity_service.get_activity_by_id(db, activity_id)
 
     keyboard = [
-        [InlineKeyboardButton("Editar ✏️", callback_data=f"edit_activity_{activity_id}")],
-        [InlineKeyboardButton("Excluir 🗑️", callback_data=f"delete_activity_{activity_id}")],
+        [InlineKeyboardButton("Editar ✏️", callback_data=router.data("act.edit", activity_id))],
+        [InlineKeyboardButton("Excluir 🗑️", callback_data=router.data("act.del", activity_id))],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(dialogs.MANAGING_ACTIVITY_HEADER.format(name=activity.name), reply_markup=reply_markup, parse_mode='HTML')
@@ -233,8 +236,8 @@ async def show_activity_edit_options(update: Update, context: ContextTypes.DEFAU
     query = update.callback_query
     await query.answer()
     activity_id = context.user_data['activity_id_to_manage']
-    with SessionLocal() as db:
-        activity = activity_service.get_activity_by_id(db, activity_id)
+    db = context.db
+    activity = activity_service.get_activity_by_id(db, activity_id)
     
     text = dialogs.EDITING_ACTIVITY_HEADER.format(
         name=activity.name,
@@ -244,14 +247,14 @@ async def show_activity_edit_options(update: Update, context: ContextTypes.DEFAU
     )
     keyboard = [
         [
-            InlineKeyboardButton("Nome", callback_data="editactivityfield_name"),
-            InlineKeyboardButton("Matéria", callback_data="editactivityfield_subject_id"),
+            InlineKeyboardButton("Nome", callback_data=router.data("act.field", "name")),
+            InlineKeyboardButton("Matéria", callback_data=router.data("act.field", "subject_id")),
         ],
         [
-            InlineKeyboardButton("Data de Entrega", callback_data="editactivityfield_due_date"),
-            InlineKeyboardButton("Observações", callback_data="editactivityfield_notes"),
+            InlineKeyboardButton("Data de Entrega", callback_data=router.data("act.field", "due_date")),
+            InlineKeyboardButton("Observações", callback_data=router.data("act.field", "notes")),
         ],
-        [InlineKeyboardButton("« Voltar", callback_data=f"mng_act_{activity_id}")]
+        [InlineKeyboardButton("« Voltar", callback_data=router.data("act.sel", activity_id))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
@@ -261,16 +264,14 @@ async def show_activity_edit_options(update: Update, context: ContextTypes.DEFAU
 async def select_activity_field_to_edit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    field_to_edit = query.data.split('_')[1]
+    field_to_edit = router.parse(query.data).args[0]
     context.user_data['field_to_edit'] = field_to_edit
 
     if field_to_edit == "subject_id":
         telegram_user = query.from_user
-        with SessionLocal() as db:
-            user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-            subjects = subject_service.get_subjects_by_user(db, user)
-        keyboard = [[InlineKeyboardButton(s.name, callback_data=f"newsubjectid_{s.id}")] for s in subjects]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        db = context.db
+        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+        reply_markup = keyboards.subject_picker(db, user, "act.newsubj")
         await query.edit_message_text(dialogs.ASK_NEW_SUBJECTID, reply_markup=reply_markup)
     elif field_to_edit == "due_date":
         await query.message.reply_text(dialogs.ASK_NEW_DUE_DATE, parse_mode='HTML')
@@ -288,8 +289,9 @@ async def receive_activity_field_update(update: Update, context: ContextTypes.DE
 
     if query:
         await query.answer()
-        if query.data.startswith("newsubjectid_"):
-            new_value = int(query.data.split('_')[1])
+        callback = router.parse(query.data)
+        if callback and callback.action == "act.newsubj":
+            new_value = callback.int_arg()
             await query.delete_message()
     else:
         new_value = update.message.text
@@ -302,21 +304,21 @@ async def receive_activity_field_update(update: Update, context: ContextTypes.DE
         elif field_to_edit == 'notes' and new_value.lower() in ['não', 'nao', 'n', 'pular', 'remover']:
             new_value = None
 
-    with SessionLocal() as db:
-        activity_service.update_activity(db, activity_id, {field_to_edit: new_value})
+    db = context.db
+    activity_service.update_activity(db, activity_id, {field_to_edit: new_value})
 
     message_to_send_from = update.message if not query else query.message
-    fake_update = type('Update', (), {'callback_query': type('CallbackQuery', (), {'data': f"edit_activity_{activity_id}", 'answer': (lambda: None), 'from_user': update.effective_user, 'message': message_to_send_from})(), 'effective_user': update.effective_user})()
+    fake_update = type('Update', (), {'callback_query': type('CallbackQuery', (), {'data': router.data("act.edit", activity_id), 'answer': (lambda: None), 'from_user': update.effective_user, 'message': message_to_send_from})(), 'effective_user': update.effective_user})()
     return await show_activity_edit_options(fake_update, context)
 
 
 async def handle_delete_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    activity_id = int(query.data.split('_')[-1])
+    activity_id = router.parse(query.data).int_arg()
     keyboard = [[
-        InlineKeyboardButton("✅ Sim, excluir", callback_data=f"confirmdelete_activity_{activity_id}"),
-        InlineKeyboardButton("❌ Cancelar", callback_data=f"mng_act_{activity_id}")
+        InlineKeyboardButton("✅ Sim, excluir", callback_data=router.data("act.delok", activity_id)),
+        InlineKeyboardButton("❌ Cancelar", callback_data=router.data("act.sel", activity_id))
     ]]
     await query.edit_message_text(dialogs.CONFIRM_DELETE_ITEM, reply_markup=InlineKeyboardMarkup(keyboard))
     return CONFIRM_ACTIVITY_DELETE
@@ -325,9 +327,9 @@ async def handle_delete_confirmation(update: Update, context: ContextTypes.DEFAU
 async def confirm_activity_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    activity_id = int(query.data.split('_')[-1])
-    with SessionLocal() as db:
-        activity_service.delete_activity_by_id(db, activity_id)
+    activity_id = router.parse(query.data).int_arg()
+    db = context.db
+    activity_service.delete_activity_by_id(db, activity_id)
     await query.edit_message_text(dialogs.ACTIVITY_DELETED)
     context.user_data.clear()
     return ConversationHandler.END
@@ -335,29 +337,31 @@ async def confirm_activity_delete_callback(update: Update, context: ContextTypes
 
 def setup_activity_management_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="manage_activities",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("gerenciartrabalhos", manage_activities_start),
             CommandHandler("gerenciarprovas", manage_activities_start),
-            CallbackQueryHandler(manage_activities_start, pattern="^start_manage_trabalhos$"),
-            CallbackQueryHandler(manage_activities_start, pattern="^start_manage_provas$")
+            CallbackQueryHandler(manage_activities_start, pattern=router.pattern("act.manage"))
         ],
         states={
             SELECT_ACTIVITY_ACTION: [
-                CallbackQueryHandler(select_activity_action_callback, pattern="^mng_act_"),
-                CallbackQueryHandler(show_activity_edit_options, pattern="^edit_activity_"),
-                CallbackQueryHandler(handle_delete_confirmation, pattern="^delete_activity_"),
+                CallbackQueryHandler(select_activity_action_callback, pattern=router.pattern("act.sel")),
+                CallbackQueryHandler(show_activity_edit_options, pattern=router.pattern("act.edit")),
+                CallbackQueryHandler(handle_delete_confirmation, pattern=router.pattern("act.del")),
             ],
             SHOWING_ACTIVITY_EDIT_OPTIONS: [
-                CallbackQueryHandler(select_activity_field_to_edit_callback, pattern="^editactivityfield_"),
-                CallbackQueryHandler(select_activity_action_callback, pattern="^mng_act_"),
+                CallbackQueryHandler(select_activity_field_to_edit_callback, pattern=router.pattern("act.field")),
+                CallbackQueryHandler(select_activity_action_callback, pattern=router.pattern("act.sel")),
             ],
             AWAITING_ACTIVITY_NEW_VALUE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, receive_activity_field_update),
-                CallbackQueryHandler(receive_activity_field_update, pattern="^newsubjectid_"),
+                CallbackQueryHandler(receive_activity_field_update, pattern=router.pattern("act.newsubj")),
             ],
             CONFIRM_ACTIVITY_DELETE: [
-                CallbackQueryHandler(confirm_activity_delete_callback, pattern="^confirmdelete_activity_"),
-                CallbackQueryHandler(select_activity_action_callback, pattern="^mng_act_"),
+                CallbackQueryHandler(confirm_activity_delete_callback, pattern=router.pattern("act.delok")),
+                CallbackQueryHandler(select_activity_action_callback, pattern=router.pattern("act.sel")),
             ],
         },
         fallbacks=[CommandHandler("cancelar", activity_cancel)],
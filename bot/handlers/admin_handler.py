@@ -1,7 +1,7 @@
 import logging
 import asyncio
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.error import Forbidden
+from telegram.error import BadRequest, Forbidden
 from telegram.ext import (
     ContextTypes,
     ConversationHandler,
@@ -11,9 +11,14 @@ from telegram.ext import (
     CallbackQueryHandler,
 )
 
-from bot.db.base import SessionLocal
-from bot.services import user_service
+from bot.services import user_service, stats_service
+from bot import views
 from bot.core import dialogs
+from bot.core.callbacks import router
+from bot.core.errors import is_unreachable_chat
+from bot.core.outbound import PRIORITY_BROADCAST
+from bot.core.settings import CONVERSATION_TIMEOUT
+from bot.db.base import SessionLocal
 from bot.decorators import admin_only # Importamos nosso decorador de segurança
 
 logger = logging.getLogger(__name__)
@@ -21,6 +26,11 @@ logger = logging.getLogger(__name__)
 # Estados da conversa
 AWAITING_MESSAGE, AWAITING_CONFIRMATION = range(2)
 
+# Chave, no user_data do admin, da mensagem aguardando confirmação
+BROADCAST_KEY = "broadcast_message"
+# Quantos envios do broadcast ficam aguardando a fila de saída ao mesmo tempo (workers)
+BROADCAST_CONCURRENCY = 30
+
 @admin_only
 async def send_to_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """(Admin) Envia uma mensagem para um usuário específico."""
@@ -40,8 +50,8 @@ async def send_to_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     message_text = " ".join(context.args[1:])
     
     # Verifica se o usuário existe no nosso DB
-    with SessionLocal() as db:
-        target_user = user_service.get_user_by_telegram_id(db, target_user_id)
+    db = context.db
+    target_user = user_service.get_user_by_telegram_id(db, target_user_id)
         
     if not target_user:
         await update.message.reply_html(dialogs.ADMIN_SEND_FAILURE_NOT_FOUND.format(user_id=target_user_id))
@@ -53,7 +63,14 @@ async def send_to_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_html(
             dialogs.ADMIN_SEND_SUCCESS.format(user_name=target_user.first_name, user_id=target_user_id)
         )
-    except Forbidden:
+    except (Forbidden, BadRequest) as e:
+        if not is_unreachable_chat(e):
+            logger.error(f"Erro ao enviar mensagem para {target_user_id}: {e}")
+            await update.message.reply_html(dialogs.ADMIN_SEND_FAILURE_GENERAL.format(user_id=target_user_id))
+            return
+        # Bloqueou o bot ou o chat não existe mais: deixa de receber mensagens
+        db = context.db
+        user_service.mark_user_blocked(db, target_user_id)
         await update.message.reply_html(
             dialogs.ADMIN_SEND_FAILURE_BLOCKED.format(user_name=target_user.first_name, user_id=target_user_id)
         )
@@ -70,13 +87,15 @@ async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def received_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Recebe a mensagem, armazena e pede confirmação."""
-    context.user_data['broadcast_message'] = update.message
-    
-    with SessionLocal() as db:
-        users = user_service.get_all_active_users(db)
-        user_count = len(users)
+    db = context.read_db
+    user_count = len(user_service.get_all_active_users(db))
 
-    context.user_data['user_list'] = [user.user_id for user in users]
+    # Só a referência da mensagem vai para o user_data (persistido, vale em qualquer
+    # instância e depois de um reinício); os destinatários são lidos de novo no envio
+    context.user_data[BROADCAST_KEY] = {
+        "from_chat_id": update.message.chat_id,
+        "message_id": update.message.message_id,
+    }
 
     await update.message.reply_html(
         text=dialogs.ADMIN_BROADCAST_CONFIRM.format(
@@ -84,73 +103,130 @@ async def received_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             user_count=user_count
         ),
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("✅ Enviar para Todos", callback_data="confirm_broadcast")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="cancel_broadcast")]
+            [InlineKeyboardButton("✅ Enviar para Todos", callback_data=router.data("bcast.send"))],
+            [InlineKeyboardButton("❌ Cancelar", callback_data=router.data("bcast.cancel"))]
         ])
     )
     return AWAITING_CONFIRMATION
 
 async def send_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Envia a mensagem em massa para todos os usuários."""
+    """Confirma a transmissão e dispara o envio em segundo plano (veja run_broadcast)."""
     query = update.callback_query
     await query.answer()
 
-    if query.data == "cancel_broadcast":
+    callback = router.parse(query.data)
+    message = context.user_data.get(BROADCAST_KEY)
+    if callback.action == "bcast.cancel":
         await query.edit_message_text(dialogs.ADMIN_BROADCAST_CANCELED)
         context.user_data.clear()
         return ConversationHandler.END
-    
+    if message is None:
+        # Conversa restaurada sem a mensagem (user_data limpo): encerra em vez de prender o admin
+        await query.edit_message_text(dialogs.ADMIN_BROADCAST_EXPIRED)
+        return ConversationHandler.END
+
     await query.edit_message_text(dialogs.ADMIN_BROADCAST_SENDING)
 
-    message_to_send = context.user_data['broadcast_message']
-    user_ids = context.user_data['user_list']
-    
-    success_count = 0
-    failure_count = 0
+    # O envio roda fora do handler: as atualizações são processadas uma de cada vez, e
+    # esperar milhares de envios aqui travaria o bot para todos os outros usuários
+    context.application.create_task(
+        run_broadcast(context.bot, update.effective_chat.id, message["from_chat_id"], message["message_id"]),
+        update=update,
+        name="broadcast",
+    )
+    context.user_data.clear()
+    return ConversationHandler.END
+
 
-    for user_id in user_ids:
+def _active_user_ids() -> list:
+    with SessionLocal() as db:
+        return [user.user_id for user in user_service.get_all_active_users(db)]
+
+
+def _mark_blocked(user_id: int) -> None:
+    # Sessão própria e curta: a da atualização já terminou
+    with SessionLocal() as db:
+        user_service.mark_user_blocked(db, user_id)
+
+
+async def run_broadcast(bot, admin_chat_id: int, from_chat_id: int, message_id: int) -> None:
+    """Copia a mensagem para cada usuário ativo e, no fim, manda o relatório para o admin."""
+    async def deliver(user_id: int) -> bool:
         try:
-            await context.bot.copy_message(
+            # Prioridade baixa: o broadcast nunca atrasa as respostas aos outros usuários
+            await bot.copy_message(
                 chat_id=user_id,
-                from_chat_id=message_to_send.chat_id,
-                message_id=message_to_send.message_id
+                from_chat_id=from_chat_id,
+                message_id=message_id,
+                rate_limit_args=PRIORITY_BROADCAST,
             )
-            success_count += 1
-        except Forbidden:
-            logger.warning(f"Não foi possível enviar mensagem para o usuário {user_id}. Ele bloqueou o bot.")
-            failure_count += 1
+            return True
+        except (Forbidden, BadRequest) as e:
+            if is_unreachable_chat(e):
+                # Marca como inativo para que os próximos envios em massa o ignorem
+                logger.warning(f"Não foi possível enviar mensagem para o usuário {user_id}. Ele bloqueou o bot.")
+                await asyncio.to_thread(_mark_blocked, user_id)
+            else:
+                logger.error(f"Erro ao enviar mensagem para {user_id}: {e}")
         except Exception as e:
             logger.error(f"Erro inesperado ao enviar mensagem para {user_id}: {e}")
-            failure_count += 1
-        
-        await asyncio.sleep(0.1) # Pequena pausa para não sobrecarregar a API do Telegram
+        return False
+
+    async def worker() -> None:
+        nonlocal success_count, failure_count
+        # Todos os workers consomem o mesmo iterador: cada id sai uma vez só
+        for user_id in pending:
+            if await deliver(user_id):
+                success_count += 1
+            else:
+                failure_count += 1
+
+    # Destinatários lidos agora: quem bloqueou o bot desde a confirmação fica de fora
+    user_ids = await asyncio.to_thread(_active_user_ids)
+
+    # Um número fixo de workers (e não uma tarefa por usuário): a memória não cresce com
+    # a base. O ritmo dos envios é controlado pela fila central (bot/core/outbound.py)
+    pending = iter(user_ids)
+    success_count = failure_count = 0
+    await asyncio.gather(*(worker() for _ in range(min(BROADCAST_CONCURRENCY, len(user_ids)))))
 
     # Envia o relatório final para o admin
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
+    await bot.send_message(
+        chat_id=admin_chat_id,
         text=dialogs.ADMIN_BROADCAST_REPORT.format(
             success_count=success_count,
             failure_count=failure_count
         )
     )
-    
-    context.user_data.clear()
-    return ConversationHandler.END
+
+
+@admin_only
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """(Admin) Mostra as estatísticas agregadas, na versão calculada pela tarefa periódica."""
+    stats = stats_service.get_stats(context.read_db)
+    if stats is None:
+        # A tarefa ainda não rodou (banco novo): calcula agora uma vez
+        stats = stats_service.refresh_stats(context.db)
+    await update.message.reply_html(views.render_stats(stats))
 
 
 def setup_admin_handlers() -> list:
     """Cria e configura todos os handlers de admin."""
     
     broadcast_handler = ConversationHandler(
+        name="broadcast",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[CommandHandler("broadcast", broadcast_start)],
         states={
             AWAITING_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_message)],
-            AWAITING_CONFIRMATION: [CallbackQueryHandler(send_broadcast)],
+            AWAITING_CONFIRMATION: [CallbackQueryHandler(send_broadcast, pattern=router.pattern("bcast.send", "bcast.cancel"))],
         },
         fallbacks=[CommandHandler("cancelar", dialogs.OPERATION_CANCELED)],
     )
 
     send_to_user_handler = CommandHandler("enviar", send_to_user)
-    
-    return [broadcast_handler, send_to_user_handler]
+    stats_handler = CommandHandler("stats", stats_command)
+
+    return [broadcast_handler, send_to_user_handler, stats_handler]
 
@@ -1,6 +1,8 @@
 # bot/handlers/bug_report_handler.py
 
 import logging
+import os
+import tempfile
 from telegram import Update
 from telegram.ext import (
     ContextTypes, ConversationHandler, CommandHandler,
@@ -9,6 +11,7 @@ from telegram.ext import (
 
 from bot.services import email_service
 from bot.core import dialogs
+from bot.core.settings import CONVERSATION_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -26,10 +29,9 @@ async def bug_report_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 async def received_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Recebe o screenshot e pede a descrição."""
     photo = update.message.photo[-1] # Pega a foto na maior resolução
-    file = await photo.get_file()
-    
-    photo_bytes = await file.download_as_bytearray()
-    context.user_data['bug_screenshot'] = photo_bytes
+
+    # Guarda só o file_id; a imagem é baixada apenas no envio do relatório
+    context.user_data['bug_screenshot_file_id'] = photo.file_id
     
     await update.message.reply_text(
         "Ótimo, recebi a imagem. Agora, por favor, **descreva o que aconteceu** ou o que você esperava que acontecesse."
@@ -39,7 +41,7 @@ async def received_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def received_description(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Recebe a descrição, envia o email e finaliza."""
     description = update.message.text
-    screenshot_data = context.user_data['bug_screenshot']
+    screenshot_file_id = context.user_data['bug_screenshot_file_id']
     user = update.effective_user
     
     subject = f"Relatório de Bug do Jovis Bot - Usuário: {user.first_name} ({user.id})"
@@ -54,7 +56,11 @@ async def received_description(update: Update, context: ContextTypes.DEFAULT_TYP
     
     await update.message.reply_text("Enviando seu relatório para a equipe de desenvolvimento... 👨‍💻")
     
-    success = email_service.send_bug_report_email(subject, body, screenshot_data)
+    # Baixa a imagem direto para um arquivo temporário, apagado logo após o envio
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = await context.bot.get_file(screenshot_file_id)
+        screenshot_path = await file.download_to_drive(os.path.join(tmp_dir, "screenshot.jpg"))
+        success = email_service.send_bug_report_email(subject, body, str(screenshot_path))
     
     if success:
         await update.message.reply_text("Obrigado! Seu relatório foi enviado com sucesso. Vamos analisar o mais rápido possível.")
@@ -66,6 +72,9 @@ async def received_description(update: Update, context: ContextTypes.DEFAULT_TYP
 
 def setup_bug_report_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="bug_report",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[CommandHandler("bug", bug_report_start)],
         states={
             AWAITING_SCREENSHOT: [MessageHandler(filters.PHOTO, received_screenshot)],
@@ -1,34 +1,159 @@
 
 import logging
-from datetime import date, timedelta
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
+import time
+from datetime import date, datetime, timedelta
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember
+from telegram.ext import ApplicationHandlerStop, ContextTypes
 
-from bot.db.base import SessionLocal
-from bot.services import user_service, subject_service, activity_service
-
-# Importa as funções de outros handlers
-from bot.handlers.subject_handler import list_subjects
-from bot.handlers.activity_handler import list_activities
-from bot.handlers.absence_handler import report_absences
+from bot.services import user_service, activity_service, timetable_service
 
 # SUGESTÃO DE MELHORIA: Importa o módulo inteiro
 from bot.core import dialogs
+from bot.core.callbacks import router
+from bot import views
+from bot.handlers.replies import send_html
+from bot.handlers.users import reader_for
+from bot.core.ratelimit import FLOOD_CONTROL_KEY, FloodControl
 
 logger = logging.getLogger(__name__)
 
 
+async def flood_control(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Roda antes de todos os handlers e descarta rajadas de um mesmo usuário, para
+    que poucos clientes abusivos não esgotem o pool de conexões do banco.
+    """
+    flood = context.bot_data.get(FLOOD_CONTROL_KEY)
+    user = update.effective_user
+    query = update.callback_query
+    if flood is None or user is None or not (update.message or query):
+        return
+
+    outcome = flood.check(user.id, query.data if query else None)
+    if outcome == FloodControl.ALLOWED:
+        return
+
+    if query:
+        # Clique repetido: a mensagem já mostra a resposta do primeiro, só encerra o "carregando"
+        warn = outcome == FloodControl.REJECTED and flood.should_warn(user.id)
+        await query.answer(dialogs.FLOOD_SLOW_DOWN if warn else None)
+    elif flood.should_warn(user.id):
+        await update.message.reply_text(dialogs.FLOOD_SLOW_DOWN)
+    raise ApplicationHandlerStop
+
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Registra o erro e avisa o usuário. Também recebe as falhas do COMMIT da atualização
+    (veja bot/db/unit_of_work.py), que podem acontecer depois de o handler responder.
+    """
+    logger.error("Erro ao processar uma atualização.", exc_info=context.error)
+    if isinstance(update, Update) and update.effective_chat:
+        try:
+            await context.bot.send_message(chat_id=update.effective_chat.id, text=dialogs.UNEXPECTED_ERROR)
+        except Exception as e:
+            logger.warning(f"Não foi possível avisar o usuário sobre o erro: {e}")
+
+
+async def track_user_activity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Registra o horário da última atualização de cada usuário (usado na limpeza do user_data).
+    Na primeira atualização de um usuário (ou depois de ele ficar parado), garante que ele
+    esteja marcado como ativo no banco e registra o dia de uso (DAU/WAU do /stats).
+    """
+    if not update.effective_user:
+        return
+    user_id = update.effective_user.id
+    last_seen = context.bot_data.setdefault("last_seen", {})
+    if user_id not in last_seen and not update.my_chat_member:
+        db = context.db
+        user_service.mark_user_seen(db, user_id)
+    last_seen[user_id] = time.monotonic()
+
+
+async def track_bot_membership(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Atualiza o is_active do usuário quando ele bloqueia ou desbloqueia o bot no chat privado."""
+    member_update = update.my_chat_member
+    if member_update.chat.type != "private":
+        return
+    user_id = member_update.chat.id
+    db = context.db
+    if member_update.new_chat_member.status == ChatMember.BANNED:
+        if user_service.mark_user_blocked(db, user_id):
+            logger.info(f"Usuário {user_id} bloqueou o bot.")
+    else:
+        user_service.reactivate_user(db, user_id)
+
+
+# Os menus não mudam: são montados uma vez, na importação, e reaproveitados a cada clique
+MAIN_MENU = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("☀️ Resumo de Hoje", callback_data=router.data("today")),
+        InlineKeyboardButton("🗓️ Resumo da Semana", callback_data=router.data("week")),
+    ],
+    [
+        InlineKeyboardButton("📚 Matérias", callback_data=router.data("menu", "subjects")),
+        InlineKeyboardButton("🗓️ Trabalhos e Provas", callback_data=router.data("menu", "activities")),
+    ],
+    [
+        InlineKeyboardButton("✖️ Faltas", callback_data=router.data("menu", "absences")),
+        InlineKeyboardButton("🎓 Notas", callback_data=router.data("menu", "grades")),
+    ],
+    [InlineKeyboardButton("❓ Ajuda", callback_data=router.data("help"))],
+])
+
+_BACK_TO_MAIN = [InlineKeyboardButton(dialogs.BACK_TO_MAIN_MENU_PROMPT, callback_data=router.data("menu", "main"))]
+
+# Nome do submenu -> (texto, teclado)
+SUBMENUS = {
+    "subjects": (dialogs.MENU_SUBJECTS, InlineKeyboardMarkup([
+        [InlineKeyboardButton("📖 Ver Grade Horária", callback_data=router.data("grade"))],
+        [InlineKeyboardButton("➕ Adicionar Matéria", callback_data=router.data("subj.new"))],
+        [InlineKeyboardButton("⚙️ Gerenciar Matérias", callback_data=router.data("subj.manage"))],
+        _BACK_TO_MAIN,
+    ])),
+    "activities": (dialogs.MENU_ACTIVITIES, InlineKeyboardMarkup([
+        [InlineKeyboardButton("📅 Ver Calendário Completo", callback_data=router.data("cal"))],
+        [
+            InlineKeyboardButton("📝 Add Trabalho", callback_data=router.data("act.new", "trabalho")),
+            InlineKeyboardButton("❗️ Add Prova", callback_data=router.data("act.new", "prova")),
+        ],
+        [
+            InlineKeyboardButton("⚙️ Gerenciar Trabalhos", callback_data=router.data("act.manage", "trabalho")),
+            InlineKeyboardButton("⚙️ Gerenciar Provas", callback_data=router.data("act.manage", "prova")),
+        ],
+        _BACK_TO_MAIN,
+    ])),
+    # A mensagem inclui a instrução para o comando
+    "absences": (
+        "✖️ <b>Faltas</b>\n\n"
+        "Use os botões para ações rápidas.\n"
+        "Para editar ou excluir registros, envie o comando /gerenciarfaltas.",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Registrar Falta", callback_data=router.data("abs.new"))],
+            [InlineKeyboardButton("📊 Ver Relatório de Faltas", callback_data=router.data("abs.report"))],
+            _BACK_TO_MAIN,
+        ]),
+    ),
+    "grades": (dialogs.MENU_GRADES, InlineKeyboardMarkup([
+        [InlineKeyboardButton("➕ Lançar Nota", callback_data=router.data("grd.new"))],
+        [InlineKeyboardButton("⚙️ Gerenciar Notas", callback_data=router.data("grd.manage"))],
+        _BACK_TO_MAIN,
+    ])),
+}
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Processa o /start, mostrando mensagem de boas-vindas e o menu principal."""
     telegram_user = update.callback_query.from_user if update.callback_query else update.effective_user
 
-    with SessionLocal() as db:
-        user, is_new = user_service.get_or_create_user(
-            db=db,
-            user_id=telegram_user.id,
-            first_name=telegram_user.first_name,
-            username=telegram_user.username,
-        )
+    db = context.db
+    user, is_new = user_service.get_or_create_user(
+        db=db,
+        user_id=telegram_user.id,
+        first_name=telegram_user.first_name,
+        username=telegram_user.username,
+    )
 
     if is_new:
         logger.info("Novo usuário %s (ID: %s) iniciou o bot.", user.first_name, user.user_id)
@@ -37,106 +162,32 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.info("Usuário %s (ID: %s) retornou.", user.first_name, user.user_id)
         welcome_message = dialogs.WELCOME_BACK.format(first_name=user.first_name)
 
-    keyboard = [
-        [
-            InlineKeyboardButton("☀️ Resumo de Hoje", callback_data="summary_today"),
-            InlineKeyboardButton("🗓️ Resumo da Semana", callback_data="summary_week"),
-        ],
-        [
-            InlineKeyboardButton("📚 Matérias", callback_data="menu_subjects"),
-            InlineKeyboardButton("🗓️ Trabalhos e Provas", callback_data="menu_activities"),
-        ],
-        [
-            InlineKeyboardButton("✖️ Faltas", callback_data="menu_absences"),
-            InlineKeyboardButton("🎓 Notas", callback_data="menu_grades"),
-        ],
-        [InlineKeyboardButton("❓ Ajuda", callback_data="main_help")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     if update.callback_query:
         await update.callback_query.answer()
         await update.callback_query.edit_message_text(
             text=welcome_message,
-            reply_markup=reply_markup,
+            reply_markup=MAIN_MENU,
             parse_mode="HTML",
         )
     else:
-        await update.message.reply_html(text=welcome_message, reply_markup=reply_markup)
+        await update.message.reply_html(text=welcome_message, reply_markup=MAIN_MENU)
 
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Roteia os cliques dos botões principais."""
+@router.route("menu")
+async def show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mostra um dos submenus, ou volta ao menu principal."""
     query = update.callback_query
-    
-    await query.answer()
-    data = query.data
-
-    if data == "main_menu":
+    name = router.parse(query.data).args[0]
+    if name == "main":
         # A função start já é context-aware e vai editar a mensagem
         return await start(update, context)
 
-    # --- Sub-Menus ---
-    if data == "menu_subjects":
-        keyboard = [
-            [InlineKeyboardButton("📖 Ver Grade Horária", callback_data="main_grade")],
-            [InlineKeyboardButton("➕ Adicionar Matéria", callback_data="start_new_subject")],
-            [InlineKeyboardButton("⚙️ Gerenciar Matérias", callback_data="start_manage_subjects")],
-            [InlineKeyboardButton(dialogs.BACK_TO_MAIN_MENU_PROMPT, callback_data="main_menu")],
-        ]
-        await query.edit_message_text(dialogs.MENU_SUBJECTS, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
-
-    elif data == "menu_activities":
-        keyboard = [
-            [InlineKeyboardButton("📅 Ver Calendário Completo", callback_data="main_agenda")],
-            [
-                InlineKeyboardButton("📝 Add Trabalho", callback_data="start_new_activity_trabalho"),
-                InlineKeyboardButton("❗️ Add Prova", callback_data="start_new_activity_prova"),
-            ],
-            [
-                InlineKeyboardButton("⚙️ Gerenciar Trabalhos", callback_data="start_manage_trabalhos"),
-                InlineKeyboardButton("⚙️ Gerenciar Provas", callback_data="start_manage_provas"),
-            ],
-            [InlineKeyboardButton(dialogs.BACK_TO_MAIN_MENU_PROMPT, callback_data="main_menu")],
-        ]
-        await query.edit_message_text(dialogs.MENU_ACTIVITIES, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
-        
-    elif data == "menu_absences":
-            # A MENSAGEM AGORA INCLUI A INSTRUÇÃO PARA O COMANDO
-            message = (
-                "✖️ <b>Faltas</b>\n\n"
-                "Use os botões para ações rápidas.\n"
-                "Para editar ou excluir registros, envie o comando /gerenciarfaltas."
-            )
-            keyboard = [
-                [InlineKeyboardButton("➕ Registrar Falta", callback_data="start_new_absence")],
-                [InlineKeyboardButton("📊 Ver Relatório de Faltas", callback_data="report_absences_action")],
-                [InlineKeyboardButton(dialogs.BACK_TO_MAIN_MENU_PROMPT, callback_data="main_menu")]
-            ]
-            await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
-        
-    elif data == "menu_grades":
-        keyboard = [
-            [InlineKeyboardButton("➕ Lançar Nota", callback_data="start_new_grade")],
-            [InlineKeyboardButton("⚙️ Gerenciar Notas", callback_data="start_manage_grades")],
-            [InlineKeyboardButton(dialogs.BACK_TO_MAIN_MENU_PROMPT, callback_data="main_menu")],
-        ]
-        await query.edit_message_text(dialogs.MENU_GRADES, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
-    
-    # --- Ações Diretas ---
-    elif data == "summary_today":
-        return await today_command(update, context)
-    elif data == "summary_week":
-        return await week_command(update, context)
-    elif data == "main_grade":
-        return await list_subjects(update, context)
-    elif data == "main_agenda":
-        return await list_activities(update, context)
-    elif data == "report_absences_action":
-        return await report_absences(update, context)
-    elif data == "main_help":
-        return await help_command(update, context)
+    await query.answer()
+    text, reply_markup = SUBMENUS[name]
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="HTML")
+
 
+@router.route("today")
 async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Exibe um resumo do dia, usando o arquivo de diálogos."""
     query = update.callback_query
@@ -147,43 +198,24 @@ async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         telegram_user = update.effective_user
 
     today = date.today()
-    weekday_map = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
-    today_weekday_name = weekday_map[today.weekday()]
-
-    message = dialogs.SUMMARY_TODAY_HEADER.format(date=today.strftime('%d/%m/%Y'), weekday=today_weekday_name)
-    
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        
-        subjects = subject_service.get_subjects_by_day_of_week(db, user, today_weekday_name)
-        message += dialogs.TODAY_COURSES_HEADER
-        if not subjects:
-            message += dialogs.TODAY_NO_COURSES
-        else:
-            for s in subjects:
-                message += dialogs.TODAY_COURSE_LINE.format(
-                    start=s.start_time.strftime('%H:%M') if s.start_time else '--:--',
-                    end=s.end_time.strftime('%H:%M') if s.end_time else '--:--',
-                    name=s.name, room=s.room
-                )
-        
-        message += "\n" + dialogs.SEPARATOR + "\n\n"
-
-        activities = activity_service.get_activities_by_date(db, user, today)
-        message += dialogs.ACTIVITIES_FOR_TODAY_HEADER
-        if not activities:
-            message += dialogs.NO_ACTIVITIES_TODAY
-        else:
-            for act in activities:
-                icon = "📝" if act.activity_type == "trabalho" else "❗️"
-                message += dialogs.TODAY_ACTIVITY_LINE.format(icon=icon, name=act.name, subject_name=act.subject.name)
+    today_weekday_name = timetable_service.WEEKDAYS[today.weekday()]
 
-    if query:
-        await query.edit_message_text(message, parse_mode="HTML")
-    else:
-        await update.message.reply_html(message)
+    db, user = reader_for(context, telegram_user)
+    subjects = timetable_service.get_timetable(db, user).classes_on(today.weekday())
+    activities = activity_service.get_activities_by_date(db, user, today)
+    await send_html(update, views.render_today(today, today_weekday_name, subjects, activities))
+
+
+async def next_class_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/proxima: mostra a aula em andamento (se houver) e a próxima aula da grade."""
+    telegram_user = update.effective_user
+    now = datetime.now()
+    db, user = reader_for(context, telegram_user)
+    timetable = timetable_service.get_timetable(db, user)
+    await update.message.reply_html(views.render_next_class(now, timetable.current_class(now), timetable.next_class(now)))
 
 
+@router.route("week")
 async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Exibe as atividades da semana, usando o arquivo de diálogos."""
     query = update.callback_query
@@ -195,25 +227,11 @@ async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
     today = date.today()
     end_of_week = today + timedelta(days=6)
-    message = dialogs.AGENDA_WEEK_HEADER.format(start=today.strftime('%d/%m'), end=end_of_week.strftime('%d/%m'))
-    
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        week_activities = activity_service.get_activities_by_date_range(db, user, today, end_of_week)
-
-        if not week_activities:
-            message += dialogs.NO_ACTIVITIES_WEEK
-        else:
-            for act in week_activities:
-                icon = "📝" if act.activity_type == "trabalho" else "❗️"
-                date_str = act.due_date.strftime("%d/%m (%a)")
-                message += dialogs.WEEK_ACTIVITY_LINE.format(date_str=date_str, icon=icon, name=act.name, subject_name=act.subject.name)
-
-    if query:
-        await query.edit_message_text(message, parse_mode="HTML")
-    else:
-        await update.message.reply_html(message)
+    db, user = reader_for(context, telegram_user)
+    week_activities = activity_service.get_activities_by_date_range(db, user, today, end_of_week)
+    await send_html(update, views.render_week(today, end_of_week, week_activities))
 
+@router.route("help")
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mostra a mensagem de ajuda completa."""
     query = update.callback_query
@@ -0,0 +1,74 @@
+# bot/handlers/export_handler.py
+
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import date
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from bot.services import user_service, calendar_service, export_service
+from bot.core import dialogs
+from bot.core.settings import CALENDAR_PUBLIC_URL
+from bot.calendar_server import feed_url
+from bot.db.base import ReadSessionLocal
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_FILENAME = "jovis.ics"
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /exportar: envia o calendário (.ics) com as aulas e as atividades e, se o servidor
+    do calendário estiver configurado, o link de assinatura. '/exportar novolink' troca
+    a chave do link (o anterior deixa de funcionar). '/exportar dados' envia um ZIP
+    com todos os dados do usuário.
+    """
+    option = context.args[0].lower() if context.args else None
+    if option == "dados":
+        return await export_data(update, context)
+    if option not in (None, "novolink"):
+        await update.message.reply_html(dialogs.EXPORT_USAGE)
+        return
+
+    telegram_user = update.effective_user
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+
+    feed = calendar_service.get_user_calendar(db, user)
+    await update.message.reply_document(document=feed.body, filename=CALENDAR_FILENAME, caption=dialogs.EXPORT_CALENDAR_CAPTION)
+
+    if CALENDAR_PUBLIC_URL:
+        token = calendar_service.get_calendar_token(db, user, renew=option == "novolink")
+        await update.message.reply_html(dialogs.EXPORT_CALENDAR_LINK.format(url=feed_url(CALENDAR_PUBLIC_URL, token)))
+
+
+def _write_export(telegram_id: int, path: str) -> dict | None:
+    """Escreve o ZIP do usuário em `path`; None se ele não existe. Roda fora do event loop."""
+    # Sessão própria: a da atualização não pode ser usada de outra thread
+    with ReadSessionLocal() as db:
+        user = user_service.get_user_by_telegram_id(db, telegram_id)
+        if user is None:
+            return None
+        with open(path, "wb") as target:
+            return export_service.write_user_export(db, user, target)
+
+
+async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Envia um ZIP com matérias (no formato do /import), atividades, faltas e notas."""
+    # O ZIP (consultas e compressão) é escrito em disco, em fluxo, numa thread, e
+    # enviado a partir do arquivo
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "export.zip")
+        counts = await asyncio.to_thread(_write_export, update.effective_user.id, path)
+        if counts is None:
+            await update.message.reply_text(dialogs.EXPORT_DATA_NO_USER)
+            return
+        with open(path, "rb") as document:
+            await update.message.reply_document(
+                document=document,
+                filename=f"jovis-dados-{date.today():%Y-%m-%d}.zip",
+                caption=dialogs.EXPORT_DATA_CAPTION.format(**counts),
+            )
@@ -7,15 +7,19 @@ from telegram.ext import (
     MessageHandler, filters, CallbackQueryHandler,
 )
 
-from bot.db.base import SessionLocal
 from bot.services import user_service, subject_service, course_service
 from bot.core import dialogs
+from bot.core.callbacks import router
+from bot.core.settings import CONVERSATION_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
 # Estados da conversa
 CHOOSE_COURSE, CHOOSE_SHIFT, CHOOSE_GRADE_TYPE, IDEAL_SEMESTER, PAGINATING_SUBJECTS, CUSTOM_IDS, CUSTOM_SEMESTER = range(7)
 
+# Matérias por página na grade personalizada
+SUBJECTS_PER_PAGE = 5
+
 # Lista de cursos
 COURSES = [
     "Informática para Negócios",
@@ -25,7 +29,10 @@ COURSES = [
 
 async def fatec_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Inicia o fluxo de cadastro da Fatec, pedindo o curso."""
-    keyboard = [[InlineKeyboardButton(course, callback_data=course)] for course in COURSES]
+    keyboard = [
+        [InlineKeyboardButton(course, callback_data=router.data("fatec.course", i))]
+        for i, course in enumerate(COURSES)
+    ]
     await update.message.reply_text(dialogs.FATEC_ONBOARDING_START, reply_markup=InlineKeyboardMarkup(keyboard))
     return CHOOSE_COURSE
 
@@ -33,11 +40,11 @@ async def received_course(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """Recebe o curso e pede o turno."""
     query = update.callback_query
     await query.answer()
-    context.user_data['course'] = query.data
+    context.user_data['course'] = COURSES[router.parse(query.data).int_arg()]
     
     keyboard = [[
-        InlineKeyboardButton("Matutino", callback_data="Matutino"),
-        InlineKeyboardButton("Noturno", callback_data="Noturno")
+        InlineKeyboardButton("Matutino", callback_data=router.data("fatec.shift", "Matutino")),
+        InlineKeyboardButton("Noturno", callback_data=router.data("fatec.shift", "Noturno"))
     ]]
     await query.edit_message_text(dialogs.FATEC_ONBOARDING_ASK_SHIFT, reply_markup=InlineKeyboardMarkup(keyboard))
     return CHOOSE_SHIFT
@@ -46,26 +53,26 @@ async def received_shift(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """Recebe o turno e pergunta o tipo de grade."""
     query = update.callback_query
     await query.answer()
-    context.user_data['shift'] = query.data
+    context.user_data['shift'] = router.parse(query.data).args[0]
 
     keyboard = [
-        [InlineKeyboardButton("Grade Ideal do Semestre", callback_data="ideal")],
-        [InlineKeyboardButton("Montar Grade Personalizada", callback_data="custom")]
+        [InlineKeyboardButton("Grade Ideal do Semestre", callback_data=router.data("fatec.type", "ideal"))],
+        [InlineKeyboardButton("Montar Grade Personalizada", callback_data=router.data("fatec.type", "custom"))]
     ]
     await query.edit_message_text(dialogs.FATEC_ONBOARDING_ASK_GRADE_TYPE, reply_markup=InlineKeyboardMarkup(keyboard))
     return CHOOSE_GRADE_TYPE
 
 
-def build_subjects_page(page: int, all_subjects: list, course_info: dict):
-    """Função auxiliar para montar o texto e os botões de uma página."""
-    items_per_page = 5  # Quantas matérias mostrar por página
-    start_index = page * items_per_page
-    end_index = start_index + items_per_page
-    
-    paginated_subjects = all_subjects[start_index:end_index]
+def build_subjects_page(page: int, subject_ids: list, page_subjects: list):
+    """
+    Função auxiliar para montar o texto e os botões de uma página. O user_data guarda só
+    os IDs do catálogo (persistíveis); as matérias da página vêm do banco.
+    """
+    start_index = page * SUBJECTS_PER_PAGE
+    end_index = start_index + SUBJECTS_PER_PAGE
 
     message = dialogs.FATEC_ONBOARDING_CUSTOM_LIST_HEADER
-    for sub in paginated_subjects:
+    for sub in page_subjects:
         start = sub.start_time.strftime('%H:%M')
         end = sub.end_time.strftime('%H:%M')
         message += (
@@ -76,48 +83,57 @@ def build_subjects_page(page: int, all_subjects: list, course_info: dict):
             f"<b>Sala:</b> {sub.room or 'N/A'}\n\n"
         )
     
-    total_pages = (len(all_subjects) - 1) // items_per_page
+    total_pages = (len(subject_ids) - 1) // SUBJECTS_PER_PAGE
     message += f"Página {page + 1} de {total_pages + 1}\n\n"
     message += dialogs.FATEC_ONBOARDING_CUSTOM_PROMPT
 
     # Monta os botões de navegação
     nav_buttons = []
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Anterior", callback_data=f"custom_page_{page - 1}"))
-    if end_index < len(all_subjects):
-        nav_buttons.append(InlineKeyboardButton("Próxima ➡️", callback_data=f"custom_page_{page + 1}"))
+        nav_buttons.append(InlineKeyboardButton("⬅️ Anterior", callback_data=router.data("fatec.page", page - 1)))
+    if end_index < len(subject_ids):
+        nav_buttons.append(InlineKeyboardButton("Próxima ➡️", callback_data=router.data("fatec.page", page + 1)))
 
     keyboard = [nav_buttons] if nav_buttons else []
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     return message, reply_markup
 
+
+def load_subjects_page(db, page: int, subject_ids: list) -> list:
+    """Matérias do catálogo de uma página, na ordem da lista de IDs."""
+    page_ids = subject_ids[page * SUBJECTS_PER_PAGE:(page + 1) * SUBJECTS_PER_PAGE]
+    by_id = {sub.id: sub for sub in course_service.get_subjects_by_ids(db, page_ids)}
+    return [by_id[i] for i in page_ids if i in by_id]
+
 async def received_grade_type(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Direciona o usuário com base na escolha (ideal vs personalizada)."""
     query = update.callback_query
     await query.answer()
+    grade_type = router.parse(query.data).args[0]
     
-    if query.data == "ideal":
-        keyboard = [[InlineKeyboardButton(f"{i}º Semestre", callback_data=str(i))] for i in range(1, 7)]
+    if grade_type == "ideal":
+        keyboard = [[InlineKeyboardButton(f"{i}º Semestre", callback_data=router.data("fatec.sem", i))] for i in range(1, 7)]
         await query.edit_message_text(dialogs.FATEC_ONBOARDING_ASK_IDEAL_SEMESTER, reply_markup=InlineKeyboardMarkup(keyboard))
         return IDEAL_SEMESTER
         
-    elif query.data == "custom":
+    elif grade_type == "custom":
         course = context.user_data['course']
         shift = context.user_data['shift']
         
-        with SessionLocal() as db:
-            all_subjects = course_service.get_all_subjects_for_course(db, course, shift)
+        db = context.db
+        all_subjects = course_service.get_all_subjects_for_course(db, course, shift)
 
         if not all_subjects:
             await query.edit_message_text(dialogs.FATEC_ONBOARDING_NO_CATALOG)
             return ConversationHandler.END
 
-        # Salva a lista completa para uso futuro
-        context.user_data['all_subjects_list'] = all_subjects
-        
+        # Salva só os IDs: objetos do banco não sobrevivem à persistência do user_data
+        subject_ids = [sub.id for sub in all_subjects]
+        context.user_data['all_subject_ids'] = subject_ids
+
         # Monta e exibe a primeira página (página 0)
-        message, reply_markup = build_subjects_page(page=0, all_subjects=all_subjects, course_info=context.user_data)
+        message, reply_markup = build_subjects_page(0, subject_ids, all_subjects[:SUBJECTS_PER_PAGE])
         
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
         return PAGINATING_SUBJECTS
@@ -127,14 +143,15 @@ async def custom_grade_page_callback(update: Update, context: ContextTypes.DEFAU
     query = update.callback_query
     await query.answer()
     
-    page = int(query.data.split('_')[-1])
-    all_subjects = context.user_data.get('all_subjects_list', [])
-    
-    if not all_subjects:
+    page = router.parse(query.data).int_arg()
+    subject_ids = context.user_data.get('all_subject_ids', [])
+    page_subjects = load_subjects_page(context.read_db, page, subject_ids)
+
+    if not page_subjects:
         await query.edit_message_text("Ocorreu um erro ao carregar a lista de matérias. Por favor, comece de novo com /fatec.")
         return ConversationHandler.END
 
-    message, reply_markup = build_subjects_page(page=page, all_subjects=all_subjects, course_info=context.user_data)
+    message, reply_markup = build_subjects_page(page, subject_ids, page_subjects)
     
     await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
     return PAGINATING_SUBJECTS    
@@ -145,20 +162,21 @@ async def register_ideal_grade(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
-    semester = int(query.data)
+    semester = router.parse(query.data).int_arg()
     data = context.user_data
     telegram_user = query.from_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        ideal_subjects = course_service.get_ideal_grade_subjects(db, data['course'], data['shift'], semester)
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    ideal_subjects = course_service.get_ideal_grade_subjects(db, data['course'], data['shift'], semester)
         
-        if not ideal_subjects:
-            await query.edit_message_text(dialogs.FATEC_ONBOARDING_NO_IDEAL_GRADE.format(semester=semester))
-            context.user_data.clear()
-            return ConversationHandler.END
+    if not ideal_subjects:
+        await query.edit_message_text(dialogs.FATEC_ONBOARDING_NO_IDEAL_GRADE.format(semester=semester))
+        context.user_data.clear()
+        return ConversationHandler.END
             
-        count = subject_service.bulk_create_from_course_subjects(db, user, ideal_subjects)
+    count = subject_service.bulk_create_from_course_subjects(db, user, ideal_subjects)
+    user_service.set_user_course(db, user, data['course'])
     
     await query.edit_message_text(dialogs.FATEC_ONBOARDING_IDEAL_SUCCESS.format(count=count, semester=semester))
     context.user_data.clear()
@@ -174,9 +192,9 @@ async def received_custom_ids(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(dialogs.FATEC_ONBOARDING_INVALID_IDS)
         return CUSTOM_IDS
 
-    with SessionLocal() as db:
-        selected_subjects = course_service.get_subjects_by_ids(db, selected_ids)
-        conflict_error = course_service.check_schedule_conflict(selected_subjects)
+    db = context.db
+    selected_subjects = course_service.get_subjects_by_ids(db, selected_ids)
+    conflict_error = course_service.check_schedule_conflict(selected_subjects)
 
     if conflict_error:
         await update.message.reply_text(dialogs.FATEC_ONBOARDING_CONFLICT_ERROR.format(error=conflict_error))
@@ -201,10 +219,11 @@ async def register_custom_grade(update: Update, context: ContextTypes.DEFAULT_TY
     selected_ids = context.user_data['selected_ids']
     telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subjects_to_create = course_service.get_subjects_by_ids(db, selected_ids)
-        count = subject_service.bulk_create_from_course_subjects(db, user, subjects_to_create, semester_override=semester)
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    subjects_to_create = course_service.get_subjects_by_ids(db, selected_ids)
+    count = subject_service.bulk_create_from_course_subjects(db, user, subjects_to_create, semester_override=semester)
+    user_service.set_user_course(db, user, context.user_data['course'])
 
     await update.message.reply_text(dialogs.FATEC_ONBOARDING_CUSTOM_SUCCESS.format(count=count))
     context.user_data.clear()
@@ -223,14 +242,17 @@ async def fatec_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 def setup_fatec_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="fatec_onboarding",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[CommandHandler("fatec", fatec_start)],
         states={
-            CHOOSE_COURSE: [CallbackQueryHandler(received_course)],
-            CHOOSE_SHIFT: [CallbackQueryHandler(received_shift)],
-            CHOOSE_GRADE_TYPE: [CallbackQueryHandler(received_grade_type)],
-            IDEAL_SEMESTER: [CallbackQueryHandler(register_ideal_grade, pattern=r"^[1-6]$")],
+            CHOOSE_COURSE: [CallbackQueryHandler(received_course, pattern=router.pattern("fatec.course"))],
+            CHOOSE_SHIFT: [CallbackQueryHandler(received_shift, pattern=router.pattern("fatec.shift"))],
+            CHOOSE_GRADE_TYPE: [CallbackQueryHandler(received_grade_type, pattern=router.pattern("fatec.type"))],
+            IDEAL_SEMESTER: [CallbackQueryHandler(register_ideal_grade, pattern=router.pattern("fatec.sem"))],
             PAGINATING_SUBJECTS: [
-                CallbackQueryHandler(custom_grade_page_callback, pattern=r"^custom_page_"),
+                CallbackQueryHandler(custom_grade_page_callback, pattern=router.pattern("fatec.page")),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, received_custom_ids)
             ],
             CUSTOM_IDS: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_custom_ids)],
@@ -10,9 +10,14 @@ from telegram.ext import (
     CallbackQueryHandler,
 )
 
-from bot.db.base import SessionLocal
-from bot.services import user_service, subject_service, grade_service
+from bot.services import user_service, subject_service, grade_service, grade_stats_service, course_service
 from bot.core import dialogs
+from bot.core.callbacks import router
+from bot.handlers import keyboards
+from bot.handlers.replies import send_html
+from bot.handlers.users import reader_for
+from bot import views
+from bot.core.settings import ADMIN_USER_IDS, CONVERSATION_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -32,13 +37,13 @@ async def new_grade_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if query:
         await query.answer()
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(
-            db, telegram_user.id, telegram_user.first_name, telegram_user.username
-        )
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db = context.db
+    user, _ = user_service.get_or_create_user(
+        db, telegram_user.id, telegram_user.first_name, telegram_user.username
+    )
+    reply_markup = keyboards.subject_picker(db, user, "grd.subj")
 
-    if not subjects:
+    if reply_markup is None:
         text = dialogs.GRADE_CREATE_NO_SUBJECTS
         if query:
             await query.message.reply_text(text)
@@ -46,8 +51,6 @@ async def new_grade_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text(text)
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(s.name, callback_data=f"grade_subject_{s.id}")] for s in subjects]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     text = dialogs.GRADE_CREATE_ASK_SUBJECT
     
     if query:
@@ -60,7 +63,7 @@ async def new_grade_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 async def received_grade_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    subject_id = int(query.data.split("_")[-1])
+    subject_id = router.parse(query.data).int_arg()
     context.user_data["grade_subject_id"] = subject_id
     await query.edit_message_text(dialogs.GRADE_CREATE_ASK_NAME)
     return SELECT_GRADE_NAME
@@ -85,20 +88,20 @@ async def received_grade_value(update: Update, context: ContextTypes.DEFAULT_TYP
     name = context.user_data["grade_name"]
     telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(
-            db, telegram_user.id, telegram_user.first_name, telegram_user.username
-        )
-        subject = subject_service.get_subject_by_id(db, subj_id)
-        grade_service.add_grade(db, user, subject, name, val)
-
-        # CORREÇÃO: A formatação e o envio da mensagem agora estão DENTRO do 'with'
-        text = dialogs.GRADE_CREATE_SUCCESS.format(
-            grade_value=f"{val:.2f}", 
-            grade_name=name, 
-            subject_name=subject.name
-        )
-        await update.message.reply_html(text)
+    db = context.db
+    user, _ = user_service.get_or_create_user(
+        db, telegram_user.id, telegram_user.first_name, telegram_user.username
+    )
+    subject = subject_service.get_subject_by_id(db, subj_id)
+    grade_service.add_grade(db, user, subject, name, val)
+
+    # CORREÇÃO: A formatação e o envio da mensagem agora estão DENTRO do 'with'
+    text = dialogs.GRADE_CREATE_SUCCESS.format(
+        grade_value=f"{val:.2f}", 
+        grade_name=name, 
+        subject_name=subject.name
+    )
+    await update.message.reply_html(text)
 
     context.user_data.clear()
     return ConversationHandler.END
@@ -124,13 +127,13 @@ async def manage_grades_start(update: Update, context: ContextTypes.DEFAULT_TYPE
     else:
         telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(
-            db, telegram_user.id, telegram_user.first_name, telegram_user.username
-        )
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db = context.db
+    user, _ = user_service.get_or_create_user(
+        db, telegram_user.id, telegram_user.first_name, telegram_user.username
+    )
+    reply_markup = keyboards.subject_picker(db, user, "grd.list")
 
-    if not subjects:
+    if reply_markup is None:
         text = dialogs.GRADE_MANAGE_NO_SUBJECTS
         if query:
             await query.edit_message_text(text)
@@ -138,8 +141,6 @@ async def manage_grades_start(update: Update, context: ContextTypes.DEFAULT_TYPE
             await update.message.reply_text(text)
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(s.name, callback_data=f"mng_grade_subj_{s.id}")] for s in subjects]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     text = dialogs.GRADE_MANAGE_ASK_SUBJECT
 
     if query:
@@ -153,12 +154,17 @@ async def manage_grades_start(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def list_grades_for_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    subj_id = int(query.data.split("_")[-1])
-    context.user_data["subject_id_for_grade_mng"] = subj_id
+    callback = router.parse(query.data)
+    if callback and callback.action == "grd.list":
+        subj_id = callback.int_arg()
+        context.user_data["subject_id_for_grade_mng"] = subj_id
+    else:
+        # Recarregando a lista depois de editar ou excluir uma nota
+        subj_id = context.user_data["subject_id_for_grade_mng"]
 
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subj_id)
-        grades = grade_service.get_grades_by_subject(db, subject)
+    db = context.db
+    subject = subject_service.get_subject_by_id(db, subj_id)
+    grades = grade_service.get_grades_by_subject(db, subject)
 
     if not grades:
         await query.edit_message_text(
@@ -170,7 +176,7 @@ async def list_grades_for_subject(update: Update, context: ContextTypes.DEFAULT_
     message = dialogs.GRADE_MANAGE_LIST_HEADER.format(subject_name=subject.name)
     message += "".join(f" • <b>{g.name}:</b> {g.value:.2f}\n" for g in grades)
     keyboard = [
-        [InlineKeyboardButton(f"Editar / Excluir: {g.name}", callback_data=f"select_grade_{g.id}")]
+        [InlineKeyboardButton(f"Editar / Excluir: {g.name}", callback_data=router.data("grd.sel", g.id))]
         for g in grades
     ]
     await query.edit_message_text(
@@ -184,15 +190,15 @@ async def list_grades_for_subject(update: Update, context: ContextTypes.DEFAULT_
 async def select_grade_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    grade_id = int(query.data.split("_")[-1])
+    grade_id = router.parse(query.data).int_arg()
     context.user_data["grade_id_to_manage"] = grade_id
 
     keyboard = [
         [
-            InlineKeyboardButton("✏️ Editar Nota", callback_data=f"edit_grade_{grade_id}"),
-            InlineKeyboardButton("🗑️ Excluir Nota", callback_data=f"delete_grade_{grade_id}")
+            InlineKeyboardButton("✏️ Editar Nota", callback_data=router.data("grd.edit", grade_id)),
+            InlineKeyboardButton("🗑️ Excluir Nota", callback_data=router.data("grd.del", grade_id))
         ],
-        [InlineKeyboardButton("« Voltar", callback_data=f"mng_grade_subj_{context.user_data['subject_id_for_grade_mng']}")]
+        [InlineKeyboardButton("« Voltar", callback_data=router.data("grd.list", context.user_data['subject_id_for_grade_mng']))]
     ]
     await query.edit_message_text(dialogs.GRADE_MANAGE_ACTION_PROMPT, reply_markup=InlineKeyboardMarkup(keyboard))
     return LIST_GRADES
@@ -201,20 +207,20 @@ async def select_grade_action(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def handle_grade_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    action, id_str = query.data.split("_", 2)[1:]
-    gid = int(id_str)
+    callback = router.parse(query.data)
+    gid = callback.int_arg()
 
-    if action == "delete":
+    if callback.action == "grd.del":
         await query.edit_message_text(
             dialogs.GRADE_MANAGE_DELETE_CONFIRM,
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("✅ Sim, excluir", callback_data=f"confirm_delete_grade_{gid}"),
-                InlineKeyboardButton("❌ Cancelar", callback_data=f"select_grade_{gid}")
+                InlineKeyboardButton("✅ Sim, excluir", callback_data=router.data("grd.delok", gid)),
+                InlineKeyboardButton("❌ Cancelar", callback_data=router.data("grd.sel", gid))
             ]])
         )
         return CONFIRM_DELETE
 
-    if action == "edit":
+    if callback.action == "grd.edit":
         await query.message.reply_text(dialogs.GRADE_EDIT_ASK_NAME)
         return AWAIT_NEW_GRADE_NAME
 
@@ -238,14 +244,14 @@ async def received_new_grade_value(update: Update, context: ContextTypes.DEFAULT
     subject_id = context.user_data["subject_id_for_grade_mng"]
     new_name = context.user_data["new_grade_name"]
 
-    with SessionLocal() as db:
-        grade_service.update_grade(db, grade_id, new_name, new_val)
+    db = context.db
+    grade_service.update_grade(db, grade_id, new_name, new_val)
 
     await update.message.reply_text(dialogs.GRADE_EDIT_SUCCESS)
 
     # LÓGICA DE RECARREGAMENTO (SEM 'fake_update')
     # Prepara os dados e chama a função que lista as notas novamente
-    query_data = f"mng_grade_subj_{subject_id}"
+    query_data = router.data("grd.list", subject_id)
     update.callback_query = type('CallbackQuery', (), {'data': query_data, 'answer': (lambda: None), 'message': update.message, 'from_user': update.effective_user})()
     
     return await list_grades_for_subject(update, context)
@@ -253,29 +259,63 @@ async def received_new_grade_value(update: Update, context: ContextTypes.DEFAULT
 async def confirm_delete_grade(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    gid = int(query.data.split("_")[-1])
-    subj_id = context.user_data["subject_id_for_grade_mng"]
+    gid = router.parse(query.data).int_arg()
 
-    with SessionLocal() as db:
-        grade_service.delete_grade_by_id(db, gid)
+    db = context.db
+    grade_service.delete_grade_by_id(db, gid)
 
     await query.edit_message_text(dialogs.GRADE_DELETE_SUCCESS)
-    query.data = f"mng_grade_subj_{subj_id}"
     return await list_grades_for_subject(update, context)
 
 
 # =============================================================================
-# Seção 3: Funções de Setup que Montam os Handlers
+# Seção 3: Médias (/medias)
+# =============================================================================
+
+async def averages_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /medias: média de cada matéria, a nota necessária nas avaliações que faltam e a
+    posição na turma. Admins podem passar um curso ('/medias análise') para ver o
+    resumo das notas de todos os alunos dele.
+    """
+    telegram_user = update.effective_user
+    if context.args and telegram_user.id in ADMIN_USER_IDS:
+        return await course_averages(update, context.read_db, " ".join(context.args))
+
+    db, user = reader_for(context, telegram_user)
+    standings = grade_stats_service.get_user_standings(db, user)
+    if not standings:
+        await update.message.reply_text(dialogs.AVERAGES_NO_SUBJECTS)
+        return
+    await send_html(update, views.render_averages(standings))
+
+
+async def course_averages(update: Update, db, search: str) -> None:
+    """(Admin) Resumo das notas de um curso do catálogo, buscado por parte do nome."""
+    courses = course_service.get_available_courses(db)
+    matches = [course for course in courses if search.lower() in course.lower()]
+    if len(matches) != 1:
+        await update.message.reply_html(views.render_course_not_found(courses))
+        return
+    summary = grade_stats_service.get_course_summary(db, matches[0])
+    await send_html(update, views.render_course_summary(matches[0], summary))
+
+
+# =============================================================================
+# Seção 4: Funções de Setup que Montam os Handlers
 # =============================================================================
 
 def setup_grade_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="add_grade",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("addnota", new_grade_start),
-            CallbackQueryHandler(new_grade_start, pattern="^start_new_grade$")
+            CallbackQueryHandler(new_grade_start, pattern=router.pattern("grd.new"))
         ],
         states={
-            SELECT_GRADE_SUBJECT: [CallbackQueryHandler(received_grade_subject, pattern="^grade_subject_")],
+            SELECT_GRADE_SUBJECT: [CallbackQueryHandler(received_grade_subject, pattern=router.pattern("grd.subj"))],
             SELECT_GRADE_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_grade_name)],
             SELECT_GRADE_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_grade_value)],
         },
@@ -286,20 +326,23 @@ def setup_grade_handler() -> ConversationHandler:
 
 def setup_grade_management_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="manage_grades",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("gerenciarnotas", manage_grades_start),
-            CallbackQueryHandler(manage_grades_start, pattern="^start_manage_grades$")
+            CallbackQueryHandler(manage_grades_start, pattern=router.pattern("grd.manage"))
         ],
         states={
-            SELECT_SUBJECT_TO_MANAGE: [CallbackQueryHandler(list_grades_for_subject, pattern="^mng_grade_subj_")],
+            SELECT_SUBJECT_TO_MANAGE: [CallbackQueryHandler(list_grades_for_subject, pattern=router.pattern("grd.list"))],
             LIST_GRADES: [
-                CallbackQueryHandler(select_grade_action, pattern="^select_grade_"),
-                CallbackQueryHandler(handle_grade_action, pattern="^(edit_grade_|delete_grade_)"),
-                CallbackQueryHandler(list_grades_for_subject, pattern="^mng_grade_subj_"),
+                CallbackQueryHandler(select_grade_action, pattern=router.pattern("grd.sel")),
+                CallbackQueryHandler(handle_grade_action, pattern=router.pattern("grd.edit", "grd.del")),
+                CallbackQueryHandler(list_grades_for_subject, pattern=router.pattern("grd.list")),
             ],
             CONFIRM_DELETE: [
-                CallbackQueryHandler(confirm_delete_grade, pattern="^confirm_delete_grade_"),
-                CallbackQueryHandler(select_grade_action, pattern="^select_grade_"),
+                CallbackQueryHandler(confirm_delete_grade, pattern=router.pattern("grd.delok")),
+                CallbackQueryHandler(select_grade_action, pattern=router.pattern("grd.sel")),
             ],
             AWAIT_NEW_GRADE_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_new_grade_name)],
             AWAIT_NEW_GRADE_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_new_grade_value)],
@@ -2,21 +2,26 @@
 
 import logging
 import json
+import os
+import tempfile
 from telegram import Update
 from telegram.ext import (
     ContextTypes, ConversationHandler, CommandHandler,
     MessageHandler, filters
 )
 
-from bot.db.base import SessionLocal
-from bot.services import user_service, subject_service
+from bot.services import user_service, subject_service, import_service
 from bot.core import dialogs
+from bot.core.settings import CONVERSATION_TIMEOUT, IMPORT_MAX_FILE_SIZE
 
 logger = logging.getLogger(__name__)
 
 # Estado da conversa
 AWAITING_FILE = 0
 
+# Quantos erros, no máximo, são listados no relatório de falha
+MAX_ERRORS_SHOWN = 20
+
 # O formato JSON que será mostrado ao usuário como exemplo
 JSON_EXAMPLE = """
 <code>[
@@ -52,34 +57,41 @@ async def import_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return AWAITING_FILE
 
 async def received_json_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Recebe, processa o arquivo JSON e cadastra as matérias."""
+    """Recebe o arquivo JSON ou CSV, valida linha a linha e cadastra as matérias."""
     document = update.message.document
-    if not document or not document.file_name.endswith('.json'):
+    extension = os.path.splitext(document.file_name or "")[1].lower() if document else ""
+    if extension not in (".json", ".csv"):
         await update.message.reply_text(dialogs.IMPORT_INVALID_FILE_EXTENSION)
         return AWAITING_FILE
 
-    await update.message.reply_text(dialogs.IMPORT_PROCESSING_FILE)
-
-    file = await document.get_file()
-    file_content = await file.download_as_bytearray()
-
-    try:
-        subjects_data = json.loads(file_content.decode('utf-8'))
-        if not isinstance(subjects_data, list):
-            raise ValueError(dialogs.IMPORT_JSON_NOT_A_LIST)
-            
-    except (json.JSONDecodeError, ValueError) as e:
-        await update.message.reply_text(dialogs.IMPORT_JSON_ERROR.format(error=e))
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await update.message.reply_text(dialogs.IMPORT_FILE_TOO_LARGE.format(max_kb=IMPORT_MAX_FILE_SIZE // 1024))
         return AWAITING_FILE
 
+    await update.message.reply_text(dialogs.IMPORT_PROCESSING_FILE)
+
     telegram_user = update.effective_user
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        report = subject_service.bulk_create_subjects(db, user, subjects_data)
+    file = await document.get_file()
+    # O arquivo vai para o disco e é lido em fluxo, sem carregar tudo na memória
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = await file.download_to_drive(os.path.join(tmp_dir, f"import{extension}"))
+        db = context.db
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as stream:
+                rows = import_service.iter_csv_rows(stream) if extension == ".csv" else import_service.iter_json_rows(stream)
+                user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+                report = subject_service.bulk_create_subjects(db, user, rows)
+        except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+            # Arquivo quebrado no meio: bulk_create_subjects já desfez (SAVEPOINT) os lotes inseridos
+            await update.message.reply_text(dialogs.IMPORT_JSON_ERROR.format(error=e))
+            return AWAITING_FILE
 
     # Monta o relatório final
     if report["errors"]:
-        error_list = "\n".join(f"- {error}" for error in report["errors"])
+        errors = report["errors"]
+        error_list = "\n".join(f"- {error}" for error in errors[:MAX_ERRORS_SHOWN])
+        if len(errors) > MAX_ERRORS_SHOWN:
+            error_list += "\n" + dialogs.IMPORT_MORE_ERRORS.format(count=len(errors) - MAX_ERRORS_SHOWN)
         message = dialogs.IMPORT_FAILURE.format(error_list=error_list)
     else:
         message = dialogs.IMPORT_SUCCESS.format(count=report['success'])
@@ -99,9 +111,15 @@ async def import_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 def setup_import_handler() -> ConversationHandler:
     """Cria e configura o ConversationHandler para /import."""
     return ConversationHandler(
+        name="import_subjects",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[CommandHandler("import", import_start)],
         states={
-            AWAITING_FILE: [MessageHandler(filters.Document.FileExtension("json"), received_json_file)]
+            AWAITING_FILE: [MessageHandler(
+                filters.Document.FileExtension("json") | filters.Document.FileExtension("csv"),
+                received_json_file,
+            )]
         },
         fallbacks=[CommandHandler("cancelar", import_cancel)],
     )
\ No newline at end of file
@@ -0,0 +1,93 @@
+# bot/handlers/keyboards.py
+"""
+Teclados de escolha de matéria, guardados em memória por usuário.
+
+Os seletores de matéria (/faltei, /novanota, /gerenciarmaterias, ...) mudam só quando
+as matérias do usuário mudam, então são montados uma vez e reaproveitados, sem
+consultar o banco de novo. Cada teclado guarda o users.data_version com que foi
+montado e deixa de valer quando a versão muda (veja bot/db/changes.py).
+"""
+
+from typing import Callable
+
+from sqlalchemy.orm import Session
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.core.callbacks import router
+from bot.db.changes import changed_in
+from bot.db.models import Subject, User
+from bot.services import subject_service
+
+_MISSING = object()
+
+
+def subject_name(subject: Subject) -> str:
+    return subject.name
+
+
+def subject_with_absences(subject: Subject) -> str:
+    return f"{subject.name} ({subject.total_absences} faltas)"
+
+
+class PickerCache:
+    """
+    Teclados por usuário, versão e ação; descarta os usuários menos recentes quando enche.
+
+    A chave é o users.id (não o id do Telegram): quem apaga os dados e volta recomeça
+    da versão 0 com outro id, sem cruzar com os teclados antigos.
+    """
+
+    def __init__(self, max_users: int = 10_000):
+        self.max_users = max_users
+        # users.id -> (versão, {ação: teclado, ou None se o usuário não tem matérias})
+        self._users: dict[int, tuple[int, dict[str, InlineKeyboardMarkup | None]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, user: User, action: str):
+        entry = self._users.pop(user.id, None)
+        if entry is None or entry[0] != user.data_version:
+            return _MISSING
+        # Reinsere no fim: o dict fica em ordem de uso
+        self._users[user.id] = entry
+        return entry[1].get(action, _MISSING)
+
+    def put(self, user: User, action: str, markup: InlineKeyboardMarkup | None) -> None:
+        entry = self._users.get(user.id)
+        if entry is None or entry[0] != user.data_version:
+            if entry is None and len(self._users) >= self.max_users:
+                del self._users[next(iter(self._users))]
+            entry = self._users[user.id] = (user.data_version, {})
+        entry[1][action] = markup
+
+    def clear(self) -> None:
+        self._users.clear()
+
+
+pickers = PickerCache()
+
+
+def subject_picker(
+    db: Session,
+    user: User,
+    action: str,
+    label: Callable[[Subject], str] = subject_name,
+) -> InlineKeyboardMarkup | None:
+    """
+    Teclado com um botão por matéria do usuário, cada um com router.data(action, id).
+    None se o usuário não tem matérias. Cada ação deve usar sempre o mesmo `label`.
+    """
+    markup = pickers.get(user, action)
+    if markup is not _MISSING:
+        return markup
+
+    subjects = subject_service.get_subjects_by_user(db, user)
+    markup = InlineKeyboardMarkup(
+        [[InlineKeyboardButton(label(s), callback_data=router.data(action, s.id))] for s in subjects]
+    ) if subjects else None
+    # Mudanças ainda não confirmadas podem ser desfeitas: não guarda o que não foi gravado
+    if user.user_id not in changed_in(db):
+        pickers.put(user, action, markup)
+    return markup
+
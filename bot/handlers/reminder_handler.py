@@ -1,3 +1,4 @@
+import html
 import logging
 import dateparser
 from telegram import Update
@@ -9,6 +10,8 @@ from telegram.ext import (
     filters,
 )
 from bot.core import dialogs
+from bot.core.settings import CONVERSATION_TIMEOUT
+from bot.services import notification_service
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +29,7 @@ async def received_reminder_message(update: Update, context: ContextTypes.DEFAUL
     return AWAITING_TIME
 
 async def received_reminder_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Recebe o horário, agenda a tarefa e finaliza."""
+    """Recebe o horário, grava o lembrete na fila de notificações e finaliza."""
     time_text = update.message.text
     
     reminder_datetime = dateparser.parse(time_text, languages=['pt'])
@@ -38,13 +41,16 @@ async def received_reminder_time(update: Update, context: ContextTypes.DEFAULT_T
     reminder_message = context.user_data['reminder_message']
     user_id = update.effective_user.id
     
-    async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
-        await context.bot.send_message(
-            chat_id=user_id, 
-            text=dialogs.REMINDER_CUSTOM_NOTIFICATION.format(reminder_message=reminder_message)
-        )
-
-    context.job_queue.run_once(send_reminder, reminder_datetime)
+    # Fica gravado no banco, então sobrevive a reinícios do bot; o dedup_key evita
+    # agendar duas vezes se a mesma mensagem for processada de novo
+    db = context.db
+    notification_service.enqueue_notifications(db, [{
+        "user_id": user_id,
+        "text": dialogs.REMINDER_CUSTOM_NOTIFICATION.format(reminder_message=html.escape(reminder_message)),
+        "parse_mode": "HTML",
+        "dedup_key": f"lembrar:{user_id}:{update.message.message_id}",
+        "send_after": reminder_datetime.replace(tzinfo=None),
+    }])
     
     await update.message.reply_html(
         dialogs.REMINDER_CUSTOM_SUCCESS.format(
@@ -59,6 +65,9 @@ async def received_reminder_time(update: Update, context: ContextTypes.DEFAULT_T
 def setup_reminder_handler() -> ConversationHandler:
     """Cria e configura o ConversationHandler para /lembrar."""
     return ConversationHandler(
+        name="custom_reminder",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[CommandHandler("lembrar", reminder_start)],
         states={
             AWAITING_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_reminder_message)],
@@ -0,0 +1,23 @@
+# bot/handlers/replies.py
+
+from telegram import InlineKeyboardMarkup, Update
+
+from bot import views
+
+
+async def send_html(update: Update, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+    """
+    Responde ao comando (ou edita a mensagem do botão) com um HTML, dividido em várias
+    mensagens se passar do limite do Telegram. Os botões vão na última parte.
+    """
+    query = update.callback_query
+    chunks = views.split_message(text)
+    last = len(chunks) - 1
+    for i, chunk in enumerate(chunks):
+        markup = reply_markup if i == last else None
+        if query and i == 0:
+            await query.edit_message_text(chunk, parse_mode="HTML", reply_markup=markup)
+        elif query:
+            await query.message.reply_html(chunk, reply_markup=markup)
+        else:
+            await update.message.reply_html(chunk, reply_markup=markup)
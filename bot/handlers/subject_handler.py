@@ -17,9 +17,14 @@ from telegram.ext import (
     CallbackQueryHandler,
 )
 
-from bot.db.base import SessionLocal
-from bot.services import user_service, subject_service, grade_service, activity_service
+from bot.services import user_service, subject_service, grade_service, activity_service, grade_stats_service
 from bot.core import dialogs
+from bot.core.callbacks import router
+from bot.handlers import keyboards
+from bot import views
+from bot.handlers.replies import send_html
+from bot.handlers.users import reader_for
+from bot.core.settings import CONVERSATION_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -93,15 +98,15 @@ async def received_semester(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     data = context.user_data
     telegram_user = update.effective_user
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(
-            db, telegram_user.id, telegram_user.first_name, telegram_user.username
-        )
-        subject_service.create_subject(
-            db=db, user=user, name=data["subject_name"], professor=data["professor_name"],
-            day=data["day_of_week"], room=data["room"], start_time=data["start_time"],
-            end_time=data["end_time"], semestre=data["semestre"],
-        )
+    db = context.db
+    user, _ = user_service.get_or_create_user(
+        db, telegram_user.id, telegram_user.first_name, telegram_user.username
+    )
+    subject_service.create_subject(
+        db=db, user=user, name=data["subject_name"], professor=data["professor_name"],
+        day=data["day_of_week"], room=data["room"], start_time=data["start_time"],
+        end_time=data["end_time"], semestre=data["semestre"],
+    )
     await update.message.reply_html(dialogs.SUBJECT_CREATE_SUCCESS.format(subject_name=data["subject_name"]))
     context.user_data.clear()
     return ConversationHandler.END
@@ -116,6 +121,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 # Seção 2: Handler de Comando para /grade (Leitura)
 # =============================================================================
 
+@router.route("grade")
 async def list_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Lista as matérias com a nova formatação de grade aprimorada."""
     query = update.callback_query
@@ -125,54 +131,14 @@ async def list_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     else:
         telegram_user = update.effective_user
 
-    message = ""
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(
-            db, telegram_user.id, telegram_user.first_name, telegram_user.username
-        )
-        subjects = subject_service.get_subjects_by_user(db, user)
-
-        if not subjects:
-            message = dialogs.SUBJECT_LIST_NO_SUBJECTS
-        else:
-            days = defaultdict(list)
-            for s in subjects:
-                days[s.day_of_week].append(s)
-            
-            message = dialogs.SUBJECT_LIST_HEADER
-            weekdays = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"]
-            
-            for d in weekdays:
-                day_subjects = days.get(d, [])
-                if day_subjects:
-                    message += dialogs.SUBJECT_LIST_DAY_HEADER.format(day=d.upper())
-                    for s in day_subjects:
-                        message += dialogs.SUBJECT_LIST_ITEM.format(
-                            st=s.start_time.strftime('%H:%M') if s.start_time else '--:--',
-                            et=s.end_time.strftime('%H:%M') if s.end_time else '--:--',
-                            name=s.name,
-                            professor=s.professor,
-                            room=s.room
-                        )
-                        
-                        grades = grade_service.get_grades_by_subject(db, s)
-                        if grades:
-                            gl = ", ".join(f"<b>{g.name}</b>: {g.value:.2f}" for g in grades)
-                            message += dialogs.SUBJECT_LIST_GRADES_LINE.format(grades=gl)
-                        
-                        if s.total_absences > 0:
-                            message += dialogs.SUBJECT_LIST_ABSENCES_LINE.format(absences=s.total_absences)
-                        
-                        # Adiciona um pequeno espaço entre as matérias de um mesmo dia
-                        message += "\n"
-
-                    # Adiciona o separador no final de cada dia com aulas
-                    message += dialogs.SEPARATOR
-    
-    if query:
-        await query.edit_message_text(message, parse_mode='HTML')
-    else:
-        await update.message.reply_html(message)
+    db, user = reader_for(context, telegram_user)
+    subjects = subject_service.get_subjects_by_user(db, user)
+    grades_by_subject = defaultdict(list)
+    if subjects:
+        # Uma consulta para todas as notas, em vez de uma por matéria
+        for grade in sorted(grade_service.get_grades_by_user(db, user), key=lambda g: g.name):
+            grades_by_subject[grade.subject_id].append(grade)
+    await send_html(update, views.render_subject_list(subjects, grades_by_subject))
 
 # =============================================================================
 # Seção 3: Handler de Conversa para /gerenciarmaterias
@@ -186,18 +152,16 @@ async def manage_subjects_start(update: Update, context: ContextTypes.DEFAULT_TY
     else:
         telegram_user = update.effective_user
 
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    reply_markup = keyboards.subject_picker(db, user, "subj.sel")
 
-    if not subjects:
+    if reply_markup is None:
         text = dialogs.SUBJECT_MANAGE_NO_SUBJECTS
         if query: await query.edit_message_text(text=text)
         else: await update.message.reply_text(text)
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(s.name, callback_data=f"manage_{s.id}")] for s in subjects]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     text = dialogs.SUBJECT_MANAGE_PROMPT
 
     if query: await query.edit_message_text(text, reply_markup=reply_markup)
@@ -209,16 +173,16 @@ async def select_action_callback(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
     
-    subject_id = int(query.data.split('_')[1])
+    subject_id = router.parse(query.data).int_arg()
     context.user_data['subject_id_to_manage'] = subject_id
     
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subject_id)
+    db = context.db
+    subject = subject_service.get_subject_by_id(db, subject_id)
 
     keyboard = [
-        [InlineKeyboardButton("Editar ✏️", callback_data=f"edit_{subject_id}")],
-        [InlineKeyboardButton("Excluir 🗑️", callback_data=f"delete_{subject_id}")],
-        [InlineKeyboardButton("« Voltar para a lista", callback_data="back_to_list")]
+        [InlineKeyboardButton("Editar ✏️", callback_data=router.data("subj.edit", subject_id))],
+        [InlineKeyboardButton("Excluir 🗑️", callback_data=router.data("subj.del", subject_id))],
+        [InlineKeyboardButton("« Voltar para a lista", callback_data=router.data("subj.list"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(dialogs.SUBJECT_MANAGE_ACTION_PROMPT.format(subject_name=subject.name), reply_markup=reply_markup, parse_mode='HTML')
@@ -230,11 +194,11 @@ async def show_edit_options_callback(update: Update, context: ContextTypes.DEFAU
 
     subject_id = context.user_data.get('subject_id_to_manage')
     if not subject_id:
-        subject_id = int(query.data.split('_')[1])
+        subject_id = router.parse(query.data).int_arg()
         context.user_data['subject_id_to_manage'] = subject_id
 
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subject_id)
+    db = context.db
+    subject = subject_service.get_subject_by_id(db, subject_id)
 
     if not subject:
         await query.edit_message_text(dialogs.ERROR_NOT_FOUND)
@@ -252,15 +216,15 @@ async def show_edit_options_callback(update: Update, context: ContextTypes.DEFAU
     # Por enquanto, vou omitir os botões de horário para não causar erros.
     keyboard = [
         [
-            InlineKeyboardButton("Nome", callback_data="editfield_name"),
-            InlineKeyboardButton("Professor", callback_data="editfield_professor"),
+            InlineKeyboardButton("Nome", callback_data=router.data("subj.field", "name")),
+            InlineKeyboardButton("Professor", callback_data=router.data("subj.field", "professor")),
         ],
         [
-            InlineKeyboardButton("Dia da Semana", callback_data="editfield_day_of_week"),
-            InlineKeyboardButton("Sala", callback_data="editfield_room"),
-            InlineKeyboardButton("Semestre", callback_data="editfield_semestre"),
+            InlineKeyboardButton("Dia da Semana", callback_data=router.data("subj.field", "day_of_week")),
+            InlineKeyboardButton("Sala", callback_data=router.data("subj.field", "room")),
+            InlineKeyboardButton("Semestre", callback_data=router.data("subj.field", "semestre")),
         ],
-        [InlineKeyboardButton("« Voltar", callback_data=f"manage_{subject_id}")]
+        [InlineKeyboardButton("« Voltar", callback_data=router.data("subj.sel", subject_id))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
@@ -271,8 +235,7 @@ async def select_field_to_edit_callback(update: Update, context: ContextTypes.DE
     query = update.callback_query
     await query.answer()
 
-    # A CORREÇÃO ESTÁ AQUI
-    field_to_edit = query.data.split('_', 1)[1]
+    field_to_edit = router.parse(query.data).args[0]
     context.user_data['field_to_edit'] = field_to_edit
 
     field_map = {
@@ -306,10 +269,10 @@ async def receive_field_update(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_html(error_message)
         return AWAITING_NEW_VALUE
 
-    with SessionLocal() as db:
-        subject_service.update_subject(db, subject_id, {field_to_edit: new_value})
-        # Busca a matéria novamente para pegar os dados atualizados
-        subject = subject_service.get_subject_by_id(db, subject_id)
+    db = context.db
+    subject_service.update_subject(db, subject_id, {field_to_edit: new_value})
+    # Busca a matéria novamente para pegar os dados atualizados
+    subject = subject_service.get_subject_by_id(db, subject_id)
 
     await update.message.reply_text(dialogs.SUBJECT_EDIT_SUCCESS, reply_markup=ReplyKeyboardRemove())
 
@@ -326,16 +289,16 @@ async def receive_field_update(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     keyboard = [
         [
-            InlineKeyboardButton("Nome", callback_data="editfield_name"),
-            InlineKeyboardButton("Professor", callback_data="editfield_professor"),
+            InlineKeyboardButton("Nome", callback_data=router.data("subj.field", "name")),
+            InlineKeyboardButton("Professor", callback_data=router.data("subj.field", "professor")),
         ],
         # Adicione os botões de horário aqui quando implementar a sua parte
         [
-            InlineKeyboardButton("Dia da Semana", callback_data="editfield_day_of_week"),
-            InlineKeyboardButton("Sala", callback_data="editfield_room"),
-            InlineKeyboardButton("Semestre", callback_data="editfield_semestre"),
+            InlineKeyboardButton("Dia da Semana", callback_data=router.data("subj.field", "day_of_week")),
+            InlineKeyboardButton("Sala", callback_data=router.data("subj.field", "room")),
+            InlineKeyboardButton("Semestre", callback_data=router.data("subj.field", "semestre")),
         ],
-        [InlineKeyboardButton("« Voltar", callback_data=f"manage_{subject_id}")]
+        [InlineKeyboardButton("« Voltar", callback_data=router.data("subj.sel", subject_id))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -346,13 +309,13 @@ async def receive_field_update(update: Update, context: ContextTypes.DEFAULT_TYP
 async def handle_delete_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    subject_id = int(query.data.split('_')[-1])
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subject_id)
+    subject_id = router.parse(query.data).int_arg()
+    db = context.db
+    subject = subject_service.get_subject_by_id(db, subject_id)
     
     keyboard = [[
-        InlineKeyboardButton("✅ Sim, tenho certeza", callback_data=f"confirmdelete_{subject_id}"),
-        InlineKeyboardButton("❌ Não, cancelar", callback_data=f"manage_{subject_id}")
+        InlineKeyboardButton("✅ Sim, tenho certeza", callback_data=router.data("subj.delok", subject_id)),
+        InlineKeyboardButton("❌ Não, cancelar", callback_data=router.data("subj.sel", subject_id))
     ]]
     await query.edit_message_text(dialogs.SUBJECT_DELETE_CONFIRM.format(subject_name=subject.name), reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
     return CONFIRMING_DELETE
@@ -360,11 +323,11 @@ async def handle_delete_confirmation(update: Update, context: ContextTypes.DEFAU
 async def confirm_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    subject_id = int(query.data.split('_')[-1])
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subject_id)
-        subject_name = subject.name
-        deleted = subject_service.delete_subject_by_id(db, subject_id)
+    subject_id = router.parse(query.data).int_arg()
+    db = context.db
+    subject = subject_service.get_subject_by_id(db, subject_id)
+    subject_name = subject.name
+    deleted = subject_service.delete_subject_by_id(db, subject_id)
     
     if deleted:
         await query.edit_message_text(dialogs.SUBJECT_DELETE_SUCCESS.format(subject_name=subject_name), parse_mode='HTML')
@@ -392,59 +355,31 @@ async def manage_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 
 async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     telegram_user = update.effective_user
-    with SessionLocal() as db:
-        user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
-        subjects = subject_service.get_subjects_by_user(db, user)
+    db, user = reader_for(context, telegram_user)
+    reply_markup = keyboards.subject_picker(db, user, "subj.report")
 
-    if not subjects:
+    if reply_markup is None:
         await update.message.reply_text(dialogs.REPORT_NO_SUBJECTS)
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(s.name, callback_data=f"report_subject_{s.id}")] for s in subjects]
-    await update.message.reply_text(dialogs.REPORT_PROMPT, reply_markup=InlineKeyboardMarkup(keyboard))
+    await update.message.reply_text(dialogs.REPORT_PROMPT, reply_markup=reply_markup)
     return SELECT_SUBJECT_FOR_REPORT
 
 async def show_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    subject_id = int(query.data.split('_')[-1])
+    subject_id = router.parse(query.data).int_arg()
 
-    with SessionLocal() as db:
-        subject = subject_service.get_subject_by_id(db, subject_id)
-        if not subject:
-            await query.edit_message_text(dialogs.REPORT_NOT_FOUND)
-            return ConversationHandler.END
+    db = context.read_db
+    subject = subject_service.get_subject_by_id(db, subject_id)
+    if not subject:
+        await query.edit_message_text(dialogs.REPORT_NOT_FOUND)
+        return ConversationHandler.END
         
-        activities = activity_service.get_activities_by_subject(db, subject)
-        grades = grade_service.get_grades_by_subject(db, subject)
-
-    start_str = subject.start_time.strftime('%H:%M') if subject.start_time else 'N/A'
-    end_str = subject.end_time.strftime('%H:%M') if subject.end_time else 'N/A'
-    
-    report_text = dialogs.REPORT_HEADER.format(subject_name=subject.name)
-    report_text += dialogs.REPORT_SUBJECT_DETAILS.format(
-        semestre=(subject.semestre or 'N/A'), professor=subject.professor,
-        day_of_week=subject.day_of_week, start_str=start_str, end_str=end_str,
-        room=subject.room, total_absences=subject.total_absences
-    )
-    report_text += "\n" + dialogs.SEPARATOR + "\n"
-
-    report_text += dialogs.REPORT_ACTIVITIES_HEADER
-    if not activities:
-        report_text += dialogs.REPORT_NO_ACTIVITIES
-    else:
-        for act in activities:
-            report_text += dialogs.REPORT_ACTIVITY_ITEM.format(due_date=act.due_date.strftime('%d/%m/%Y'), activity_name=act.name)
-    report_text += "\n" + dialogs.SEPARATOR + "\n"
-    
-    report_text += dialogs.REPORT_GRADES_HEADER
-    if not grades:
-        report_text += dialogs.REPORT_NO_GRADES
-    else:
-        for grade in grades:
-            report_text += dialogs.REPORT_GRADE_ITEM.format(grade_name=grade.name, grade_value=f"{grade.value:.2f}")
-
-    await query.edit_message_text(report_text, parse_mode='HTML')
+    activities = activity_service.get_activities_by_subject(db, subject)
+    grades = grade_service.get_grades_by_subject(db, subject)
+    standing = grade_stats_service.get_subject_standing(db, subject)
+    await send_html(update, views.render_subject_report(subject, activities, grades, standing))
     return ConversationHandler.END
 
 
@@ -454,9 +389,12 @@ async def show_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
 def setup_subject_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="add_subject",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("addmateria", new_subject_start),
-            CallbackQueryHandler(new_subject_start, pattern="^start_new_subject$")
+            CallbackQueryHandler(new_subject_start, pattern=router.pattern("subj.new"))
         ],
         states={
             NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_name)],
@@ -473,27 +411,30 @@ def setup_subject_handler() -> ConversationHandler:
 
 def setup_management_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="manage_subjects",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[
             CommandHandler("gerenciarmaterias", manage_subjects_start),
-            CallbackQueryHandler(manage_subjects_start, pattern="^start_manage_subjects$")
+            CallbackQueryHandler(manage_subjects_start, pattern=router.pattern("subj.manage"))
         ],
         states={
             SELECTING_ACTION: [
-                CallbackQueryHandler(select_action_callback, pattern="^manage_"),
-                CallbackQueryHandler(show_edit_options_callback, pattern="^edit_"),
-                CallbackQueryHandler(handle_delete_confirmation, pattern="^delete_"),
-                CallbackQueryHandler(back_to_list_callback, pattern="^back_to_list$")
+                CallbackQueryHandler(select_action_callback, pattern=router.pattern("subj.sel")),
+                CallbackQueryHandler(show_edit_options_callback, pattern=router.pattern("subj.edit")),
+                CallbackQueryHandler(handle_delete_confirmation, pattern=router.pattern("subj.del")),
+                CallbackQueryHandler(back_to_list_callback, pattern=router.pattern("subj.list"))
             ],
             SHOWING_EDIT_OPTIONS: [
-                CallbackQueryHandler(select_field_to_edit_callback, pattern="^editfield_"),
-                CallbackQueryHandler(select_action_callback, pattern="^manage_"),
+                CallbackQueryHandler(select_field_to_edit_callback, pattern=router.pattern("subj.field")),
+                CallbackQueryHandler(select_action_callback, pattern=router.pattern("subj.sel")),
             ],
             AWAITING_NEW_VALUE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, receive_field_update)
             ],
             CONFIRMING_DELETE: [
-                CallbackQueryHandler(confirm_delete_callback, pattern="^confirmdelete_"),
-                CallbackQueryHandler(select_action_callback, pattern="^manage_")
+                CallbackQueryHandler(confirm_delete_callback, pattern=router.pattern("subj.delok")),
+                CallbackQueryHandler(select_action_callback, pattern=router.pattern("subj.sel"))
             ],
         },
         fallbacks=[CommandHandler("cancelar", manage_cancel)],
@@ -502,9 +443,12 @@ def setup_management_handler() -> ConversationHandler:
 
 def setup_report_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="subject_report",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[CommandHandler("relatorio", report_start)],
         states={
-            SELECT_SUBJECT_FOR_REPORT: [CallbackQueryHandler(show_report, pattern="^report_subject_")]
+            SELECT_SUBJECT_FOR_REPORT: [CallbackQueryHandler(show_report, pattern=router.pattern("subj.report"))]
         },
         fallbacks=[CommandHandler("cancelar", cancel)],
         per_message=False,
@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime
 from telegram import Update
 from telegram.ext import (
     ContextTypes,
@@ -8,9 +9,9 @@ from telegram.ext import (
     filters,
 )
 
-from bot.db.base import SessionLocal
 from bot.services import user_service
 from bot.core import dialogs
+from bot.core.settings import CONVERSATION_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +30,8 @@ async def confirm_data_deletion(update: Update, context: ContextTypes.DEFAULT_TY
     
     if user_input.strip().lower() == CONFIRMATION_PHRASE:
         user_id = update.effective_user.id
-        with SessionLocal() as db:
-            deleted = user_service.delete_user_by_id(db, user_id)
+        db = context.db
+        deleted = user_service.delete_user_by_id(db, user_id)
         
         if deleted:
             await update.message.reply_html(dialogs.DELETE_DATA_SUCCESS)
@@ -54,9 +55,58 @@ async def delete_data_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE)
 def setup_delete_user_handler() -> ConversationHandler:
     """Cria e configura o ConversationHandler para /deletardados."""
     return ConversationHandler(
+        name="delete_user_data",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUT,
         entry_points=[CommandHandler("deletardados", delete_data_start)],
         states={
             AWAITING_CONFIRMATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, confirm_data_deletion)]
         },
         fallbacks=[CommandHandler("cancelar", delete_data_cancel)],
-    )
\ No newline at end of file
+    )
+
+
+# =============================================================================
+# Preferências dos lembretes de prazos (/lembretes)
+# =============================================================================
+
+def _format_days(days: list) -> str:
+    return ", ".join(str(day) for day in days)
+
+async def reminder_preferences(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Sem argumentos, mostra o horário e a antecedência atuais dos lembretes.
+    Com argumentos ('/lembretes 08:30' ou '/lembretes 08:30 1,3,7'), atualiza as preferências.
+    """
+    user_id = update.effective_user.id
+    invalid_message = dialogs.REMINDER_PREFS_INVALID.format(
+        max_days=user_service.REMINDER_MAX_DAYS, max_count=user_service.REMINDER_MAX_COUNT
+    )
+
+    db = context.db
+    user = user_service.get_user_by_telegram_id(db, user_id)
+    if not user:
+        await update.message.reply_text(dialogs.REMINDER_PREFS_NO_USER)
+        return
+
+    if not context.args:
+        await update.message.reply_html(dialogs.REMINDER_PREFS_CURRENT.format(
+            reminder_time=user.reminder_time.strftime('%H:%M'),
+            reminder_days=_format_days(user_service.get_reminder_days(user)),
+        ))
+        return
+
+    try:
+        reminder_time = datetime.strptime(context.args[0], '%H:%M').time()
+        reminder_days = None
+        if len(context.args) > 1:
+            reminder_days = [int(day) for day in "".join(context.args[1:]).split(",") if day]
+        user = user_service.update_reminder_preferences(db, user_id, reminder_time, reminder_days)
+    except ValueError:
+        await update.message.reply_html(invalid_message)
+        return
+
+    await update.message.reply_html(dialogs.REMINDER_PREFS_SAVED.format(
+        reminder_time=user.reminder_time.strftime('%H:%M'),
+        reminder_days=_format_days(user_service.get_reminder_days(user)),
+    ))
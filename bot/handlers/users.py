@@ -0,0 +1,24 @@
+# bot/handlers/users.py
+
+from sqlalchemy.orm import Session
+from telegram import User as TelegramUser
+from telegram.ext import ContextTypes
+
+from bot.db.models import User
+from bot.services import user_service
+
+
+def reader_for(context: ContextTypes.DEFAULT_TYPE, telegram_user: TelegramUser) -> tuple[Session, User]:
+    """
+    Sessão de leitura e usuário para as listagens e relatórios. O usuário é buscado só
+    para leitura em context.read_db: criar por ela faria um COMMIT separado do da
+    atualização e, com a réplica atrasada, tentaria inserir um usuário que já existe.
+    Se ele não aparecer lá (novo ou réplica atrasada), vem do banco principal, que
+    passa a ser usado também nas leituras.
+    """
+    user = user_service.get_user_by_telegram_id(context.read_db, telegram_user.id)
+    if user is not None:
+        return context.read_db, user
+    db = context.db
+    user, _ = user_service.get_or_create_user(db, telegram_user.id, telegram_user.first_name, telegram_user.username)
+    return db, user
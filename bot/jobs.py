@@ -1,50 +1,350 @@
 # bot/jobs.py
 
+import asyncio
 import logging
+import sys
+import time
 from collections import defaultdict
-from telegram.ext import ContextTypes
+from datetime import date, datetime, timedelta, time as dt_time
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.ext import Application, ContextTypes
 
-from bot.db.base import SessionLocal
-from bot.services import activity_service
+from bot.db.base import ReadSessionLocal, SessionLocal, engine, replica_engine
+from bot.db.pool import pool_metrics
+from bot.services import user_service, notification_service, stats_service, attendance_service
 from bot.core import dialogs
+from bot.core.templates import tpl
+from bot.core.cluster import ELECTOR_KEY, cluster_job, owns_user
+from bot.core.errors import is_unreachable_chat
+from bot.core.outbound import PRIORITY_REMINDER
+from bot.core.ratelimit import FLOOD_CONTROL_KEY
+from bot.core.settings import (
+    ATTENDANCE_WARN_REMAINING,
+    CONVERSATION_TIMEOUT,
+    NOTIFICATION_BATCH_SIZE,
+    NOTIFICATION_SEND_CONCURRENCY,
+    NOTIFICATION_MAX_ATTEMPTS,
+    NOTIFICATION_RETENTION_DAYS,
+)
 
 logger = logging.getLogger(__name__)
 
+# Chave, no bot_data, do último minuto já processado pelo agendador de lembretes
+LAST_REMINDER_TICK_KEY = "last_reminder_tick"
+# Quantos minutos, no máximo, o agendador recupera se ficou parado (reinício, atraso)
+REMINDER_MAX_CATCH_UP = timedelta(minutes=30)
+
+
+def _deadline_line(activity, days: int) -> str:
+    """Linha do lembrete de uma atividade que vence em 'days' dias."""
+    if days == 0:
+        template = tpl.REMINDER_AUTOMATIC_TODAY
+    elif days == 1:
+        template = tpl.REMINDER_AUTOMATIC_TOMORROW
+    else:
+        template = tpl.REMINDER_AUTOMATIC_N_DAYS
+    return template(
+        days=days,
+        activity_type=activity.activity_type.capitalize(),
+        activity_name=activity.name,
+        subject_name=activity.subject.name,
+    )
+
+
+def build_deadline_reminders(db, start: dt_time, end: dt_time, today: date) -> list[dict]:
+    """
+    Monta as notificações de prazo dos usuários cujo horário de lembrete cai
+    entre 'start' e 'end'. São só duas consultas, qualquer que seja o número de usuários.
+    """
+    users = [u for u in user_service.get_users_to_remind(db, start, end) if owns_user(u.user_id)]
+    if not users:
+        return []
+
+    days_by_user = {u.user_id: set(user_service.get_reminder_days(u)) for u in users}
+    max_days = max(max(days, default=0) for days in days_by_user.values())
+    activities = user_service.get_activities_due_for_users(
+        db, list(days_by_user), today, today + timedelta(days=max_days)
+    )
+
+    reminders = defaultdict(list)
+    for activity in sorted(activities, key=lambda a: (a.due_date, a.id)):
+        days = (activity.due_date - today).days
+        if days in days_by_user[activity.user_id]:
+            reminders[activity.user_id].append(_deadline_line(activity, days))
+
+    return [
+        {
+            "user_id": user_id,
+            "text": dialogs.REMINDER_AUTOMATIC_HEADER + "\n\n".join(lines),
+            "parse_mode": "HTML",
+            "dedup_key": f"deadlines:{user_id}:{today.isoformat()}",
+        }
+        for user_id, lines in reminders.items()
+    ]
+
+
+@cluster_job(partitioned=True)
 async def check_deadlines_job(context: ContextTypes.DEFAULT_TYPE):
     """
-    A tarefa que roda diariamente para verificar e enviar lembretes de prazos.
+    Tarefa que roda a cada minuto e enfileira os lembretes de prazo dos usuários
+    cujo horário preferido (/lembretes) é aquele minuto. Assim os envios ficam
+    espalhados ao longo do dia em vez de saírem todos de uma vez.
+    Minutos perdidos (reinício ou atraso) são recuperados na rodada seguinte; o
+    dedup_key por usuário e data evita avisos duplicados.
+    Com várias instâncias, cada uma enfileira apenas os usuários da sua partição.
+    """
+    now = datetime.now().replace(second=0, microsecond=0)
+    # Sem a última rodada (reinício ou outra instância assumiu como líder) o bot_data,
+    # que não é persistido, está vazio: recupera a janela inteira
+    last_tick = context.bot_data.get(LAST_REMINDER_TICK_KEY, now - REMINDER_MAX_CATCH_UP - timedelta(minutes=1))
+    # Não atravessa a meia-noite: o intervalo fica sempre dentro do dia atual
+    start = max(last_tick + timedelta(minutes=1), now - REMINDER_MAX_CATCH_UP, datetime.combine(now.date(), dt_time.min))
+    context.bot_data[LAST_REMINDER_TICK_KEY] = now
+    if start > now:
+        return
+
+    # A varredura só lê: pode ir para a réplica (alguns segundos de atraso não importam aqui)
+    with ReadSessionLocal() as db:
+        notifications = build_deadline_reminders(db, start.time(), now.time(), now.date())
+    if not notifications:
+        return
+    with SessionLocal() as db:
+        queued = notification_service.enqueue_notifications(db, notifications)
+    logger.info(f"{queued} lembrete(s) de prazo enfileirado(s) ({start:%H:%M}–{now:%H:%M}).")
+
+
+async def _send_notification(context: ContextTypes.DEFAULT_TYPE, notification: dict) -> tuple[int, str | None, float | None]:
+    """
+    Envia uma notificação. Retorna (id, erro, tentar_de_novo_em_segundos);
+    erro None significa que foi entregue. Se o chat não recebe mais mensagens,
+    o usuário é marcado como inativo.
     """
-    logger.info("Executando a tarefa de verificação de prazos (check_deadlines_job)...")
-    
-    reminders_to_send = defaultdict(list)
-    
+    try:
+        await context.bot.send_message(
+            chat_id=notification["user_id"],
+            text=notification["text"],
+            parse_mode=notification["parse_mode"],
+            rate_limit_args=PRIORITY_REMINDER,
+        )
+        return notification["id"], None, None
+    except RetryAfter as e:
+        retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+        return notification["id"], str(e), retry_after
+    except (Forbidden, BadRequest) as e:
+        # Usuário bloqueou o bot ou a mensagem é inválida: tentar de novo não adianta
+        if is_unreachable_chat(e):
+            with SessionLocal() as db:
+                user_service.mark_user_blocked(db, notification["user_id"])
+        return notification["id"], str(e), None
+    except Exception as e:
+        return notification["id"], str(e), 60.0
+
+
+async def dispatch_notifications_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Tarefa periódica que envia as notificações pendentes da notification_outbox.
+    Roda em todas as instâncias: cada rodada reserva um lote com SKIP LOCKED, envia
+    as mensagens em paralelo e marca as entregues. Se a instância cair no meio, a
+    reserva expira e outra instância envia o que ficou faltando.
+    """
+    with SessionLocal() as db:
+        notifications = notification_service.claim_due_notifications(db, NOTIFICATION_BATCH_SIZE)
+    if not notifications:
+        return
+
+    semaphore = asyncio.Semaphore(NOTIFICATION_SEND_CONCURRENCY)
+
+    async def send(notification: dict):
+        async with semaphore:
+            return await _send_notification(context, notification)
+
+    results = await asyncio.gather(*(send(n) for n in notifications))
+
+    sent_ids = [notification_id for notification_id, error, _ in results if error is None]
     with SessionLocal() as db:
-        # Busca atividades para amanhã (1 dia de antecedência)
-        activities_tomorrow = activity_service.get_upcoming_activities(db, days_ahead=1)
-        for activity in activities_tomorrow:
-            reminders_to_send[activity.user_id].append(
-                dialogs.REMINDER_AUTOMATIC_TOMORROW.format(
-                    activity_type=activity.activity_type.capitalize(),
-                    activity_name=activity.name,
-                    subject_name=activity.subject.name
+        notification_service.mark_notifications_sent(db, sent_ids)
+        for notification_id, error, retry_in in results:
+            if error is not None:
+                logger.warning(f"Falha ao enviar a notificação {notification_id}: {error}")
+                notification_service.mark_notification_failed(
+                    db, notification_id, error, retry_in, NOTIFICATION_MAX_ATTEMPTS
                 )
+    logger.info(f"Notificações: {len(sent_ids)} enviada(s), {len(results) - len(sent_ids)} com falha.")
+
+
+@cluster_job()
+async def purge_notifications_job(context: ContextTypes.DEFAULT_TYPE):
+    """Tarefa diária que apaga da fila as notificações antigas já resolvidas."""
+    with SessionLocal() as db:
+        removed = notification_service.purge_old_notifications(db, NOTIFICATION_RETENTION_DAYS)
+    if removed:
+        logger.info(f"{removed} notificação(ões) antiga(s) removida(s) da fila.")
+
+
+def build_attendance_warnings(db, semester: attendance_service.Semester) -> list[dict]:
+    """
+    Avisos para as matérias perto (ou além) do limite de faltas. Cada matéria é avisada
+    uma vez em cada nível (2, 1, 0 restantes, passou): o nível avisado fica gravado na
+    matéria (veja attendance_warnings_job). O dedup_key com o nível só evita repetir
+    o aviso se a tarefa cair entre enfileirar e gravar o nível.
+    """
+    notifications = []
+    for subject in attendance_service.get_subjects_near_limit(db, ATTENDANCE_WARN_REMAINING, semester):
+        left = subject.absences_left
+        if left < 0:
+            text = tpl.ATTENDANCE_WARNING_OVER(
+                subject_name=subject.name, total_absences=subject.total_absences, absence_limit=subject.absence_limit,
             )
-            
-        # Busca atividades para daqui a 3 dias
-        activities_in_3_days = activity_service.get_upcoming_activities(db, days_ahead=3)
-        for activity in activities_in_3_days:
-            reminders_to_send[activity.user_id].append(
-                dialogs.REMINDER_AUTOMATIC_3_DAYS.format(
-                    activity_type=activity.activity_type.capitalize(),
-                    activity_name=activity.name,
-                    subject_name=activity.subject.name
-                )
+        elif left == 0:
+            text = tpl.ATTENDANCE_WARNING_LAST(subject_name=subject.name, absence_limit=subject.absence_limit)
+        else:
+            text = tpl.ATTENDANCE_WARNING(
+                subject_name=subject.name, total_absences=subject.total_absences,
+                absence_limit=subject.absence_limit, left=left,
             )
+        notifications.append({
+            "user_id": subject.user_id,
+            "text": text,
+            "parse_mode": "HTML",
+            "dedup_key": f"attendance:{subject.id}:{semester.key}:{attendance_service.warning_level(left)}",
+            "subject_id": subject.id,
+            "level": attendance_service.warning_level(left),
+        })
+    return notifications
 
-    # Envia os lembretes agrupados por usuário
-    for user_id, messages in reminders_to_send.items():
-        full_message = dialogs.REMINDER_AUTOMATIC_HEADER + "\n\n".join(messages)
-        try:
-            await context.bot.send_message(chat_id=user_id, text=full_message, parse_mode='HTML')
-        except Exception as e:
-            logger.error(f"Não foi possível enviar lembrete para o usuário {user_id}: {e}")
\ No newline at end of file
+
+@cluster_job()
+async def attendance_warnings_job(context: ContextTypes.DEFAULT_TYPE):
+    """Enfileira os avisos de faltas, lendo os saldos já calculados (sem recalcular nada)."""
+    semester = attendance_service.current_semester()
+    with ReadSessionLocal() as db:
+        notifications = build_attendance_warnings(db, semester)
+    if not notifications:
+        return
+    with SessionLocal() as db:
+        queued = notification_service.enqueue_notifications(db, notifications)
+        attendance_service.mark_warned(db, {item["subject_id"]: item["level"] for item in notifications})
+    if queued:
+        logger.info(f"{queued} aviso(s) de faltas enfileirado(s).")
+
+
+@cluster_job()
+async def refresh_attendance_limits_job(context: ContextTypes.DEFAULT_TYPE):
+    """Recalcula os limites de faltas das matérias de outro semestre (ou ainda sem limite)."""
+    def refresh() -> int:
+        with SessionLocal() as db:
+            return attendance_service.refresh_limits(db)
+
+    refreshed = await asyncio.to_thread(refresh)
+    if refreshed:
+        logger.info(f"Limites de faltas recalculados para {refreshed} matéria(s).")
+
+
+@cluster_job()
+async def refresh_stats_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Recalcula as estatísticas do /stats (agregações no banco, lidas da réplica se houver)
+    e grava o resultado em stats_snapshots, de onde todas as instâncias leem.
+    """
+    def refresh() -> None:
+        with ReadSessionLocal() as read_db, SessionLocal() as db:
+            stats_service.refresh_stats(db, read_db)
+
+    # As agregações varrem tabelas inteiras: não seguram o loop de eventos
+    await asyncio.to_thread(refresh)
+
+
+def _deep_sizeof(obj, seen: set | None = None) -> int:
+    """Estimativa do tamanho em bytes de um objeto e de tudo que ele referencia."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += _deep_sizeof(vars(obj), seen)
+    return size
+
+
+def evict_stale_user_data(application: Application, last_seen: dict, ttl: float, now: float | None = None) -> tuple[int, int]:
+    """
+    Descarta o user_data de quem está parado há mais de 'ttl' segundos.
+    'last_seen' mapeia user_id -> time.monotonic() da última atualização recebida.
+    Retorna (usuários removidos, bytes liberados aproximados).
+    """
+    now = time.monotonic() if now is None else now
+    evicted = 0
+    reclaimed = 0
+
+    for user_id, seen_at in list(last_seen.items()):
+        if now - seen_at < ttl:
+            continue
+        del last_seen[user_id]
+        user_data = application.user_data.get(user_id)
+        if user_data:
+            reclaimed += _deep_sizeof(user_data)
+            application.drop_user_data(user_id)
+            evicted += 1
+
+    return evicted, reclaimed
+
+
+async def sweep_stale_user_data_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Tarefa periódica que limpa o user_data de fluxos abandonados (conversas que
+    já passaram do CONVERSATION_TIMEOUT).
+    """
+    last_seen = context.bot_data.setdefault("last_seen", {})
+    evicted, reclaimed = evict_stale_user_data(context.application, last_seen, CONVERSATION_TIMEOUT)
+    if evicted:
+        logger.info(f"Limpeza de user_data: {evicted} usuário(s) inativo(s), ~{reclaimed / 1024:.1f} KiB liberados.")
+
+
+async def leader_heartbeat_job(context: ContextTypes.DEFAULT_TYPE):
+    """Tarefa periódica que renova (ou tenta assumir) a liderança entre as instâncias."""
+    elector = context.bot_data.get(ELECTOR_KEY)
+    if elector is not None:
+        await elector.heartbeat()
+
+
+async def log_metrics_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Registra no log a profundidade da fila de saída e os contadores por prioridade,
+    as atualizações descartadas pelo controle de flood e o uso do pool de conexões
+    desde o último registro.
+    """
+    limiter = context.bot.rate_limiter
+    if limiter is not None and hasattr(limiter, "metrics"):
+        metrics = limiter.metrics()
+        summary = ", ".join(
+            f"{name}: fila={metrics['queue_depth'].get(name, 0)} enviadas={stats['sent']} "
+            f"retry_after={stats['retry_after']} espera_média={stats['avg_wait_ms']:.0f}ms"
+            for name, stats in metrics["priorities"].items()
+        )
+        logger.info(f"Fila de saída do Telegram - {summary}")
+
+    flood = context.bot_data.get(FLOOD_CONTROL_KEY)
+    if flood is not None:
+        metrics = flood.metrics(reset=True)
+        if metrics["rejected"] or metrics["coalesced"]:
+            top = ", ".join(f"{user_id} ({count})" for user_id, count in metrics["top_rejected"])
+            logger.info(
+                f"Controle de flood - aceitas={metrics['allowed']} agrupadas={metrics['coalesced']} "
+                f"rejeitadas={metrics['rejected']}; mais rejeitados: {top or '-'}"
+            )
+
+    for label, pool_engine in (("principal", engine), ("réplica", replica_engine)):
+        if pool_engine is None:
+            continue
+        metrics = pool_metrics(pool_engine, reset=True)
+        if "checkouts" in metrics:
+            logger.info(
+                f"Pool do banco {label} ({metrics['pool']}) - checkouts={metrics['checkouts']} timeouts={metrics['timeouts']} "
+                f"espera_média={metrics['avg_wait_ms']:.1f}ms espera_máxima={metrics['max_wait_ms']:.1f}ms"
+                + (f" em_uso={metrics['checked_out']}/{metrics['size']}+{metrics['overflow']}" if "size" in metrics else "")
+            )
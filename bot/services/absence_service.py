@@ -4,8 +4,13 @@ from sqlalchemy.orm import Session
 from datetime import date
 from typing import List
 
-from . import subject_service
+from . import attendance_service, subject_service
+from bot.core.settings import LIST_PAGE_SIZE
 from bot.db.models import Absence, User, Subject
+from bot.db.pagination import Cursor, Page, keyset_page
+
+# Tipos das posições do cursor de get_absences_page: (absence_date, id)
+ABSENCE_CURSOR = (date, int)
 
 def add_absence(db: Session, user: User, subject: Subject, absence_date: date, quantity: int, notes: str | None) -> Absence:
     """Adiciona um novo registro de falta e atualiza o contador total na matéria."""
@@ -14,15 +19,23 @@ def add_absence(db: Session, user: User, subject: Subject, absence_date: date, q
         owner=user, subject=subject
     )
     subject.total_absences = (subject.total_absences or 0) + quantity
+    # O saldo (absence_limit - total_absences) acompanha o contador; o limite só muda com o semestre
+    attendance_service.ensure_limits(subject)
     db.add(db_absence)
     db.commit()
-    db.refresh(db_absence)
     return db_absence
 
 def get_absences_by_subject(db: Session, subject: Subject) -> List[Absence]:
     """Retorna uma lista de todos os registros de falta para uma matéria específica."""
     return db.query(Absence).filter(Absence.subject_id == subject.id).order_by(Absence.absence_date.desc()).all()
 
+def get_absences_page(
+    db: Session, subject: Subject, cursor: Cursor | None = None, backward: bool = False, limit: int = LIST_PAGE_SIZE
+) -> Page:
+    """Uma página dos registros de falta de uma matéria, dos mais recentes para os mais antigos."""
+    query = db.query(Absence).filter(Absence.subject_id == subject.id)
+    return keyset_page(query, (Absence.absence_date, Absence.id), cursor, limit, backward, descending=True)
+
 def get_absence_by_id(db: Session, absence_id: int) -> Absence | None:
     """Busca um registro de falta pelo seu ID primário."""
     return db.query(Absence).filter(Absence.id == absence_id).first()
@@ -33,9 +46,9 @@ def update_absence_quantity(db: Session, absence_id: int, new_quantity: int) ->
     if db_absence:
         difference = new_quantity - db_absence.quantity
         db_absence.subject.total_absences = (db_absence.subject.total_absences or 0) + difference
+        attendance_service.ensure_limits(db_absence.subject)
         db_absence.quantity = new_quantity
         db.commit()
-        db.refresh(db_absence)
         return db_absence
     return None
 
@@ -1,9 +1,14 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from datetime import date
 from typing import List
 from datetime import date, timedelta
 
+from bot.core.settings import LIST_PAGE_SIZE
 from bot.db.models import Activity, User, Subject
+from bot.db.pagination import Cursor, Page, keyset_page
+
+# Tipos das posições do cursor de get_activities_page: (due_date, id)
+ACTIVITY_CURSOR = (date, int)
 
 def create_activity(db: Session, user: User, subject: Subject, name: str, due_date: date, notes: str | None, activity_type: str) -> Activity:
     """Cria uma nova atividade, agora com um tipo ('trabalho' ou 'prova')."""
@@ -14,7 +19,6 @@ def create_activity(db: Session, user: User, subject: Subject, name: str, due_da
     )
     db.add(db_activity)
     db.commit()
-    db.refresh(db_activity)
     return db_activity
 
 def get_activities_by_user(db: Session, user: User) -> List[Activity]:
@@ -25,6 +29,16 @@ def get_activities_by_user(db: Session, user: User) -> List[Activity]:
     # Filtra as atividades pelo ID do usuário e ordena pela data de entrega (due_date)
     return db.query(Activity).filter(Activity.user_id == user.user_id).order_by(Activity.due_date).all()
 
+def get_activities_page(
+    db: Session, user: User, cursor: Cursor | None = None, backward: bool = False, limit: int = LIST_PAGE_SIZE
+) -> Page:
+    """
+    Uma página das atividades do usuário, ordenadas por (due_date, id).
+    A matéria vem na mesma consulta, pois a listagem mostra o nome dela.
+    """
+    query = db.query(Activity).options(joinedload(Activity.subject)).filter(Activity.user_id == user.user_id)
+    return keyset_page(query, (Activity.due_date, Activity.id), cursor, limit, backward)
+
 def get_activities_by_user_and_type(db: Session, user: User, activity_type: str) -> List[Activity]:
     """
     Retorna uma lista de atividades de um usuário, filtrada por tipo ('trabalho' ou 'prova'),
@@ -51,7 +65,6 @@ def update_activity(db: Session, activity_id: int, new_data: dict) -> Activity |
         for key, value in new_data.items():
             setattr(db_activity, key, value)
         db.commit()
-        db.refresh(db_activity)
         return db_activity
     return None
 
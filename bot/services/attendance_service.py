@@ -0,0 +1,179 @@
+# bot/services/attendance_service.py
+"""
+Limite de faltas por matéria.
+
+O número de aulas de uma matéria no semestre sai do horário dela (dia da semana,
+início e fim) e do calendário letivo (SEMESTER_START/END e feriados). Com a
+frequência mínima (ATTENDANCE_MIN_PERCENT) isso dá as faltas permitidas, gravadas
+em subjects.absence_limit quando a matéria é criada ou tem o horário alterado.
+Como subjects.total_absences já é atualizado a cada falta, o saldo
+(Subject.absences_left) nunca precisa ser recalculado na leitura.
+
+Quando o semestre muda, attendance_term deixa de bater com o calendário atual e
+refresh_limits (tarefa diária) recalcula as matérias afetadas.
+"""
+
+import hashlib
+import math
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+from functools import lru_cache
+from typing import List
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from bot.core.settings import (
+    ATTENDANCE_MIN_PERCENT,
+    CLASS_LENGTH_MINUTES,
+    SEMESTER_END,
+    SEMESTER_HOLIDAYS,
+    SEMESTER_START,
+)
+from bot.db.models import Subject, User
+
+WEEKDAY_INDEX = {"Segunda": 0, "Terça": 1, "Quarta": 2, "Quinta": 3, "Sexta": 4, "Sábado": 5, "Domingo": 6}
+# Matérias recalculadas por lote em refresh_limits
+REFRESH_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class Semester:
+    start: date
+    end: date
+    holidays: tuple[date, ...] = ()
+
+    @property
+    def key(self) -> str:
+        """Identifica o calendário e as regras usados no cálculo (vai para subjects.attendance_term)."""
+        rules = f"{sorted(self.holidays)}|{ATTENDANCE_MIN_PERCENT}|{CLASS_LENGTH_MINUTES}"
+        return f"{self.start:%Y%m%d}-{self.end:%Y%m%d}-{hashlib.sha1(rules.encode()).hexdigest()[:8]}"
+
+
+def current_semester(today: date | None = None) -> Semester:
+    """O semestre configurado ou, sem configuração, o semestre padrão da data."""
+    if SEMESTER_START is not None:
+        return Semester(SEMESTER_START, SEMESTER_END, tuple(SEMESTER_HOLIDAYS))
+    today = today or date.today()
+    if today.month <= 6:
+        return Semester(date(today.year, 2, 1), date(today.year, 6, 30), tuple(SEMESTER_HOLIDAYS))
+    return Semester(date(today.year, 8, 1), date(today.year, 12, 15), tuple(SEMESTER_HOLIDAYS))
+
+
+@lru_cache(maxsize=8)
+def class_days(semester: Semester) -> tuple[int, ...]:
+    """Quantos dias de aula cada dia da semana (segunda = 0) tem no semestre, sem os feriados."""
+    counts = []
+    for weekday in range(7):
+        first = semester.start + timedelta(days=(weekday - semester.start.weekday()) % 7)
+        counts.append((semester.end - first).days // 7 + 1 if first <= semester.end else 0)
+    for holiday in set(semester.holidays):
+        if semester.start <= holiday <= semester.end:
+            counts[holiday.weekday()] -= 1
+    return tuple(counts)
+
+
+def lessons_per_class(start_time: time, end_time: time) -> int:
+    """Aulas em um encontro: 19:00–20:40 com aulas de 50 minutos são 2."""
+    minutes = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+    return max(1, round(minutes / CLASS_LENGTH_MINUTES))
+
+
+def limit_columns(day_of_week: str, start_time: time | None, end_time: time | None, semester: Semester | None = None) -> dict:
+    """
+    Valores de class_count, absence_limit e attendance_term para uma matéria com esse
+    horário. Com um limite novo os avisos recomeçam (absence_warned_level volta a None).
+    """
+    semester = semester or current_semester()
+    weekday = WEEKDAY_INDEX.get(day_of_week)
+    if weekday is None or start_time is None or end_time is None or end_time <= start_time:
+        return {"class_count": None, "absence_limit": None, "attendance_term": semester.key, "absence_warned_level": None}
+    class_count = class_days(semester)[weekday] * lessons_per_class(start_time, end_time)
+    # Arredonda para baixo: com 75% de frequência e 18 aulas, 4 faltas (não 4,5)
+    absence_limit = math.floor(class_count * (100 - ATTENDANCE_MIN_PERCENT) / 100 + 1e-9)
+    return {
+        "class_count": class_count, "absence_limit": absence_limit,
+        "attendance_term": semester.key, "absence_warned_level": None,
+    }
+
+
+def apply_limits(subject: Subject, semester: Semester | None = None) -> Subject:
+    """Calcula e atribui os limites de uma matéria (o COMMIT fica com quem chamou)."""
+    for key, value in limit_columns(subject.day_of_week, subject.start_time, subject.end_time, semester).items():
+        setattr(subject, key, value)
+    return subject
+
+
+def ensure_limits(subject: Subject, semester: Semester | None = None) -> Subject:
+    """Recalcula os limites só se foram calculados para outro semestre (ou nunca)."""
+    semester = semester or current_semester()
+    if subject.attendance_term != semester.key:
+        apply_limits(subject, semester)
+    return subject
+
+
+def refresh_limits(db: Session, semester: Semester | None = None) -> int:
+    """
+    Recalcula as matérias cujo attendance_term não é o do semestre atual (novas no
+    banco, virada de semestre ou mudança no calendário). Retorna quantas mudaram.
+    """
+    semester = semester or current_semester()
+    key = semester.key
+    refreshed = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Subject.id, Subject.day_of_week, Subject.start_time, Subject.end_time)
+            .where(or_(Subject.attendance_term.is_(None), Subject.attendance_term != key), Subject.id > last_id)
+            .order_by(Subject.id)
+            .limit(REFRESH_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        db.execute(update(Subject), [
+            {"id": subject_id, **limit_columns(day, start_time, end_time, semester)}
+            for subject_id, day, start_time, end_time in rows
+        ])
+        db.commit()
+        refreshed += len(rows)
+        last_id = rows[-1].id
+    return refreshed
+
+
+def warning_level(left: int) -> int:
+    """Nível do aviso para um saldo de faltas: o próprio saldo, e -1 para qualquer excesso."""
+    return max(left, -1)
+
+
+def get_subjects_near_limit(db: Session, remaining: int, semester: Semester | None = None) -> List[Subject]:
+    """
+    Matérias de usuários ativos com `remaining` faltas restantes ou menos que ainda não
+    foram avisadas nesse nível, lidas dos valores já calculados (só as do semestre atual).
+    """
+    key = (semester or current_semester()).key
+    left = Subject.absence_limit - Subject.total_absences
+    return (
+        db.query(Subject)
+        .join(User, Subject.user_id == User.user_id)
+        .filter(
+            User.is_active.is_(True),
+            Subject.attendance_term == key,
+            Subject.absence_limit.isnot(None),
+            Subject.total_absences > 0,
+            left <= remaining,
+            # Já avisada neste nível ou abaixo dele (-1 é o último nível)
+            or_(Subject.absence_warned_level.is_(None), (Subject.absence_warned_level > -1) & (left < Subject.absence_warned_level)),
+        )
+        .order_by(Subject.user_id, Subject.id)
+        .all()
+    )
+
+
+def mark_warned(db: Session, levels: dict[int, int]) -> None:
+    """Grava o nível avisado de cada matéria ({subject_id: nível}), para não repetir o aviso."""
+    if not levels:
+        return
+    db.execute(update(Subject), [
+        {"id": subject_id, "absence_warned_level": level} for subject_id, level in levels.items()
+    ])
+    db.commit()
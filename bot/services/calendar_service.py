@@ -0,0 +1,196 @@
+# bot/services/calendar_service.py
+"""
+Calendário do usuário no formato iCalendar (.ics, RFC 5545).
+
+As aulas viram eventos semanais (RRULE) do início ao fim do semestre de
+attendance_service.current_semester (o mesmo do cálculo de faltas), sem os feriados,
+e as atividades, eventos de dia inteiro. Os horários são "flutuantes" (sem fuso): o app de calendário os mostra no fuso do
+aparelho, que é o mesmo das aulas.
+
+O arquivo montado fica em cache por usuário, valendo enquanto users.data_version não
+mudar (veja bot/db/changes.py). O ETag é o hash do conteúdo: uma alteração que não
+mexe no calendário (uma falta, por exemplo) remonta o arquivo mas mantém o ETag, e
+os apps que assinam o link continuam recebendo 304.
+"""
+
+import hashlib
+import secrets
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterable, List
+
+from sqlalchemy.orm import Session, joinedload
+
+from bot.db.changes import changed_in
+from bot.db.models import Activity, Subject, User
+from . import attendance_service, subject_service
+from .attendance_service import Semester
+
+PRODID = "-//Jovis//Agenda Academica//PT-BR"
+UID_DOMAIN = "jovis.bot"
+# Quantos calendários ficam em memória (os de uso mais antigo saem primeiro)
+FEED_CACHE_SIZE = 5_000
+
+BYDAY = {"Segunda": "MO", "Terça": "TU", "Quarta": "WE", "Quinta": "TH", "Sexta": "FR", "Sábado": "SA", "Domingo": "SU"}
+WEEKDAY_INDEX = {day: i for i, day in enumerate(BYDAY)}
+
+
+@dataclass(frozen=True)
+class CalendarFeed:
+    body: bytes
+    etag: str
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """True se o cabeçalho If-None-Match do cliente já tem esta versão."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
+
+
+# users.id -> ((versão, chave do semestre), calendário). O servidor HTTP usa de outra thread.
+_feeds: dict[int, tuple[tuple, CalendarFeed]] = {}
+_feeds_lock = threading.Lock()
+
+
+def get_calendar_token(db: Session, user: User, renew: bool = False) -> str:
+    """Chave do link de assinatura do usuário; criada no primeiro uso. renew=True troca a chave."""
+    if user.calendar_token is None or renew:
+        user.calendar_token = secrets.token_urlsafe(24)
+        db.commit()
+    return user.calendar_token
+
+
+def get_user_by_calendar_token(db: Session, token: str) -> User | None:
+    if not token:
+        return None
+    return db.query(User).filter(User.calendar_token == token).one_or_none()
+
+
+def get_user_calendar(db: Session, user: User, today: date | None = None) -> CalendarFeed:
+    """O .ics do usuário, do cache se os dados dele não mudaram desde a última montagem."""
+    semester = attendance_service.current_semester(today)
+    key = (user.data_version, semester.key)
+    with _feeds_lock:
+        entry = _feeds.pop(user.id, None)
+        if entry is not None and entry[0] == key:
+            _feeds[user.id] = entry
+            return entry[1]
+
+    subjects = subject_service.get_subjects_by_user(db, user)
+    activities = (
+        db.query(Activity)
+        .options(joinedload(Activity.subject))
+        .filter(Activity.user_id == user.user_id)
+        .order_by(Activity.due_date, Activity.id)
+        .all()
+    )
+    body = render_ics(subjects, activities, semester).encode()
+    feed = CalendarFeed(body=body, etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+    # Alteração ainda sem COMMIT pode ser desfeita: não guarda
+    if user.user_id not in changed_in(db):
+        with _feeds_lock:
+            if len(_feeds) >= FEED_CACHE_SIZE:
+                del _feeds[next(iter(_feeds))]
+            _feeds[user.id] = (key, feed)
+    return feed
+
+
+def render_ics(subjects: Iterable[Subject], activities: Iterable[Activity], semester: Semester) -> str:
+    """Monta o VCALENDAR. As aulas se repetem de `semester.start` a `semester.end`."""
+    # DTSTAMP fixo por semestre: o mesmo conteúdo gera sempre o mesmo arquivo (e ETag)
+    stamp = f"{semester.start:%Y%m%d}T000000Z"
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        "X-WR-CALNAME:Jovis",
+    ]
+    for subject in subjects:
+        lines.extend(_subject_event(subject, semester, stamp))
+    for activity in activities:
+        lines.extend(_activity_event(activity, stamp))
+    lines.append("END:VCALENDAR")
+    return "".join(_fold(line) + "\r\n" for line in lines)
+
+
+def _subject_event(subject: Subject, semester: Semester, stamp: str) -> List[str]:
+    weekday = WEEKDAY_INDEX.get(subject.day_of_week)
+    if weekday is None or subject.start_time is None or subject.end_time is None:
+        return []
+    first = semester.start + timedelta(days=(weekday - semester.start.weekday()) % 7)
+    if first > semester.end:
+        return []
+    start = datetime.combine(first, subject.start_time)
+    end = datetime.combine(first, subject.end_time)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:subject-{subject.id}@{UID_DOMAIN}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{start:%Y%m%dT%H%M%S}",
+        f"DTEND:{end:%Y%m%dT%H%M%S}",
+        # Horário flutuante: o UNTIL também é flutuante (RFC 5545, 3.3.10)
+        f"RRULE:FREQ=WEEKLY;UNTIL={semester.end:%Y%m%d}T235959;BYDAY={BYDAY[subject.day_of_week]}",
+        f"SUMMARY:{_escape(subject.name)}",
+    ]
+    holidays = sorted(
+        datetime.combine(day, subject.start_time) for day in set(semester.holidays)
+        if first <= day <= semester.end and day.weekday() == weekday
+    )
+    if holidays:
+        lines.append("EXDATE:" + ",".join(f"{day:%Y%m%dT%H%M%S}" for day in holidays))
+    if subject.room:
+        lines.append(f"LOCATION:{_escape(subject.room)}")
+    if subject.professor:
+        lines.append(f"DESCRIPTION:{_escape(subject.professor)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def _activity_event(activity: Activity, stamp: str) -> List[str]:
+    kind = "Prova" if activity.activity_type == "prova" else "Trabalho"
+    summary = f"[{kind}] {activity.name}"
+    if activity.subject is not None:
+        summary += f" - {activity.subject.name}"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:activity-{activity.id}@{UID_DOMAIN}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART;VALUE=DATE:{activity.due_date:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{activity.due_date + timedelta(days=1):%Y%m%d}",
+        f"SUMMARY:{_escape(summary)}",
+    ]
+    if activity.notes:
+        lines.append(f"DESCRIPTION:{_escape(activity.notes)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str, limit: int = 75) -> str:
+    """Quebra linhas com mais de 75 bytes (a continuação começa com um espaço)."""
+    data = line.encode()
+    if len(data) <= limit:
+        return line
+    parts = []
+    start = 0
+    width = limit
+    while start < len(data):
+        end = min(start + width, len(data))
+        # Não corta um caractere UTF-8 ao meio
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode())
+        start = end
+        width = limit - 1
+    return "\r\n ".join(parts)
@@ -4,8 +4,8 @@ from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from bot.core import settings
 
-def send_bug_report_email(subject: str, body: str, image_data: bytearray) -> bool:
-    """Envia um email de relatório de bug com um anexo de imagem."""
+def send_bug_report_email(subject: str, body: str, image_path: str) -> bool:
+    """Envia um email de relatório de bug com a imagem salva em 'image_path' como anexo."""
     
     if not all([settings.EMAIL_HOST, settings.EMAIL_SENDER, settings.EMAIL_SENDER_PASSWORD, settings.EMAIL_RECEIVER]):
         print("ERRO: Variáveis de ambiente de e-mail não configuradas.")
@@ -20,8 +20,9 @@ def send_bug_report_email(subject: str, body: str, image_data: bytearray) -> boo
     # Corpo do email
     msg.attach(MIMEText(body, 'plain'))
     
-    # Anexo da imagem
-    image = MIMEImage(image_data, name="screenshot.jpg")
+    # Anexo da imagem (lida do arquivo temporário só no momento do envio)
+    with open(image_path, 'rb') as f:
+        image = MIMEImage(f.read(), name="screenshot.jpg")
     msg.attach(image)
     
     try:
@@ -0,0 +1,160 @@
+# bot/services/export_service.py
+"""
+Exportação de todos os dados de um usuário em um ZIP (/exportar dados).
+
+Tudo passa por geradores: as linhas são lidas do banco em lotes (yield_per), viram
+texto JSON/CSV em pedaços e são comprimidas direto no arquivo de destino, sem montar
+a lista completa na memória.
+
+materias.json e materias.csv usam o mesmo formato do /import, então o arquivo pode
+ser importado de volta.
+"""
+
+import csv
+import io
+import json
+import zipfile
+from typing import BinaryIO, Iterable, Iterator
+
+from sqlalchemy.orm import Session
+
+from bot.db.models import Absence, Activity, Grade, Subject, User
+
+# Linhas lidas do banco por vez
+FETCH_SIZE = 500
+# Tamanho aproximado (em caracteres) de cada pedaço escrito no ZIP
+CHUNK_SIZE = 64 * 1024
+
+# Mesmas colunas aceitas pelo /import (veja import_service.validate_subject_row)
+SUBJECT_FIELDS = ("nome", "professor", "dia_semana", "sala", "horario_inicio", "horario_fim", "semestre")
+ACTIVITY_FIELDS = ("materia", "tipo", "nome", "data", "observacoes")
+ABSENCE_FIELDS = ("materia", "data", "quantidade", "observacoes")
+GRADE_FIELDS = ("materia", "avaliacao", "nota")
+
+
+# =============================================================================
+# Linhas (geradores sobre o banco)
+# =============================================================================
+
+def iter_subject_rows(db: Session, user: User) -> Iterator[dict]:
+    """Matérias do usuário no formato do /import."""
+    query = (
+        db.query(Subject.name, Subject.professor, Subject.day_of_week, Subject.room,
+                 Subject.start_time, Subject.end_time, Subject.semestre)
+        .filter(Subject.user_id == user.user_id)
+        .order_by(Subject.id)
+        .yield_per(FETCH_SIZE)
+    )
+    for name, professor, day, room, start_time, end_time, semestre in query:
+        yield {
+            "nome": name,
+            "professor": professor,
+            "dia_semana": day,
+            "sala": room,
+            "horario_inicio": _hhmm(start_time),
+            "horario_fim": _hhmm(end_time),
+            "semestre": semestre,
+        }
+
+
+def iter_activity_rows(db: Session, user: User) -> Iterator[dict]:
+    query = (
+        db.query(Subject.name, Activity.activity_type, Activity.name, Activity.due_date, Activity.notes)
+        .join(Activity.subject)
+        .filter(Activity.user_id == user.user_id)
+        .order_by(Activity.due_date, Activity.id)
+        .yield_per(FETCH_SIZE)
+    )
+    for subject_name, kind, name, due_date, notes in query:
+        yield {"materia": subject_name, "tipo": kind, "nome": name, "data": due_date.isoformat(), "observacoes": notes}
+
+
+def iter_absence_rows(db: Session, user: User) -> Iterator[dict]:
+    query = (
+        db.query(Subject.name, Absence.absence_date, Absence.quantity, Absence.notes)
+        .join(Absence.subject)
+        .filter(Absence.user_id == user.user_id)
+        .order_by(Absence.absence_date, Absence.id)
+        .yield_per(FETCH_SIZE)
+    )
+    for subject_name, absence_date, quantity, notes in query:
+        yield {"materia": subject_name, "data": absence_date.isoformat(), "quantidade": quantity, "observacoes": notes}
+
+
+def iter_grade_rows(db: Session, user: User) -> Iterator[dict]:
+    query = (
+        db.query(Subject.name, Grade.name, Grade.value)
+        .join(Grade.subject)
+        .filter(Grade.user_id == user.user_id)
+        .order_by(Subject.id, Grade.id)
+        .yield_per(FETCH_SIZE)
+    )
+    for subject_name, name, value in query:
+        yield {"materia": subject_name, "avaliacao": name, "nota": str(value)}
+
+
+# =============================================================================
+# ZIP
+# =============================================================================
+
+def write_user_export(db: Session, user: User, target: BinaryIO) -> dict:
+    """
+    Escreve o ZIP com os dados do usuário em `target` (um arquivo aberto em modo binário).
+    Retorna quantas linhas foram exportadas de cada tipo.
+    """
+    counts = {"materias": 0, "atividades": 0, "faltas": 0, "notas": 0}
+    members = [
+        ("materias.json", _json_chunks(_counted(iter_subject_rows(db, user), counts, "materias"))),
+        ("materias.csv", _csv_chunks(iter_subject_rows(db, user), SUBJECT_FIELDS)),
+        ("atividades.csv", _csv_chunks(_counted(iter_activity_rows(db, user), counts, "atividades"), ACTIVITY_FIELDS)),
+        ("faltas.csv", _csv_chunks(_counted(iter_absence_rows(db, user), counts, "faltas"), ABSENCE_FIELDS)),
+        ("notas.csv", _csv_chunks(_counted(iter_grade_rows(db, user), counts, "notas"), GRADE_FIELDS)),
+    ]
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        # Os geradores são preguiçosos: cada consulta só roda quando o seu arquivo é escrito
+        for name, chunks in members:
+            with archive.open(name, "w") as member:
+                for chunk in chunks:
+                    member.write(chunk.encode())
+    return counts
+
+
+def _counted(rows: Iterable[dict], counts: dict, key: str) -> Iterator[dict]:
+    for row in rows:
+        counts[key] += 1
+        yield row
+
+
+def _json_chunks(rows: Iterable[dict]) -> Iterator[str]:
+    """Uma lista JSON, um item por linha (o /import lê do mesmo jeito, item por item)."""
+    parts, size = ["["], 1
+    separator = "\n  "
+    for row in rows:
+        item = separator + json.dumps(row, ensure_ascii=False)
+        separator = ",\n  "
+        parts.append(item)
+        size += len(item)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts)
+            parts, size = [], 0
+    parts.append("\n]\n")
+    yield "".join(parts)
+
+
+def _csv_chunks(rows: Iterable[dict], fields: tuple) -> Iterator[str]:
+    buffer = io.StringIO()
+    # BOM: o Excel abre com acentos corretos e o /import (utf-8-sig) ignora
+    buffer.write("\ufeff")
+    writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator="\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _hhmm(value) -> str | None:
+    return f"{value.hour:02d}:{value.minute:02d}" if value is not None else None
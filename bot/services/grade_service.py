@@ -16,7 +16,6 @@ def add_grade(db: Session, user: User, subject: Subject, name: str, value: Decim
     )
     db.add(db_grade)
     db.commit()
-    db.refresh(db_grade)
     return db_grade
 
 def get_grades_by_subject(db: Session, subject: Subject) -> List[Grade]:
@@ -41,7 +40,6 @@ def update_grade(db: Session, grade_id: int, new_name: str, new_value: Decimal)
         db_grade.name = new_name
         db_grade.value = new_value
         db.commit()
-        db.refresh(db_grade)
         return db_grade
     return None
 
@@ -0,0 +1,331 @@
+# bot/services/grade_stats_service.py
+"""
+Médias, projeções e comparação com a turma (/medias e /relatorio).
+
+As notas são lidas do banco em colunas (id da matéria, avaliação, valor) e viram
+arrays do NumPy; médias, médias ponderadas e a nota necessária saem de somas por
+grupo (np.bincount) em uma passada, sem laço em Python por nota. O mesmo cálculo
+serve para um usuário e para a turma inteira de uma matéria do catálogo, que pode
+ter dezenas de milhares de notas; as médias de cada turma ficam em cache por alguns
+minutos, então o /medias normalmente só lê as notas do próprio usuário.
+
+Pesos e avaliações esperadas vêm de GRADE_WEIGHTS (ex: "P1=1,P2=2"). Avaliações
+fora dessa lista entram na média com peso 1.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.orm import Session
+
+from bot.core.settings import GRADE_MAX, GRADE_PASSING_AVERAGE, GRADE_WEIGHTS
+from bot.db.models import Grade, Subject, User
+
+# Peso das avaliações que não estão em GRADE_WEIGHTS
+DEFAULT_WEIGHT = 1.0
+# Turmas menores que isso não mostram a posição (não dá para deduzir a nota de um colega)
+MIN_COHORT_SIZE = 5
+# Por quanto tempo (em segundos) as médias de uma turma são reaproveitadas, e quantas turmas ficam em memória
+COHORT_CACHE_TTL = 10 * 60
+COHORT_CACHE_SIZE = 2_000
+
+
+@dataclass(frozen=True)
+class SubjectStanding:
+    """Situação das notas de uma matéria do usuário."""
+    subject_id: int
+    name: str
+    grades_count: int
+    average: float | None       # média simples das notas lançadas
+    weighted: float | None      # média ponderada das notas lançadas
+    missing: tuple[str, ...]    # avaliações de GRADE_WEIGHTS ainda sem nota
+    needed: float | None        # nota necessária em cada avaliação restante para passar
+    percentile: float | None    # posição da média entre a turma (0 a 100)
+    cohort_size: int
+
+    @property
+    def final(self) -> float | None:
+        """Média final, quando todas as avaliações esperadas já têm nota."""
+        return self.weighted if not self.missing else None
+
+    @property
+    def passed(self) -> bool | None:
+        if self.final is not None:
+            return self.final >= GRADE_PASSING_AVERAGE
+        return None
+
+    @property
+    def reachable(self) -> bool:
+        return self.needed is None or self.needed <= GRADE_MAX
+
+
+@dataclass(frozen=True)
+class CohortSummary:
+    """Notas de uma matéria do catálogo entre todos os alunos de um curso."""
+    name: str
+    students: int
+    mean: float
+    median: float
+    p25: float
+    p75: float
+    pass_rate: float            # % com média ponderada >= GRADE_PASSING_AVERAGE
+
+
+# (curso, nome da matéria) -> (validade, médias ordenadas da turma)
+_cohorts: dict[tuple, tuple[float, np.ndarray]] = {}
+
+
+# =============================================================================
+# Cálculo vetorizado
+# =============================================================================
+
+class GradeArrays:
+    """
+    Notas como arrays paralelos: `group` é o índice (0..n_groups-1) da matéria de
+    cada nota, `assessment` o índice da avaliação em GRADE_WEIGHTS (-1 se não está lá).
+    """
+
+    def __init__(self, group: np.ndarray, n_groups: int, assessment_names: Sequence[str], values: np.ndarray):
+        self.group = group
+        self.n_groups = n_groups
+        self.values = values
+        self.scheme = list(GRADE_WEIGHTS)
+        self.scheme_weights = np.array(list(GRADE_WEIGHTS.values()), dtype=np.float64)
+
+        # Cada nome de avaliação distinto é resolvido uma vez só
+        names, inverse = np.unique(np.asarray(assessment_names, dtype=object), return_inverse=True)
+        position = {name: i for i, name in enumerate(self.scheme)}
+        self.assessment = np.array([position.get(name, -1) for name in names], dtype=np.int64)[inverse]
+        self.weights = np.array([GRADE_WEIGHTS.get(name, DEFAULT_WEIGHT) for name in names], dtype=np.float64)[inverse]
+
+        self.counts = np.bincount(group, minlength=n_groups)
+        self.weighted_sum = np.bincount(group, weights=values * self.weights, minlength=n_groups)
+        self.total_weight = np.bincount(group, weights=self.weights, minlength=n_groups)
+
+    def averages(self) -> np.ndarray:
+        """Média simples por matéria (NaN sem notas)."""
+        totals = np.bincount(self.group, weights=self.values, minlength=self.n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return totals / self.counts
+
+    def weighted_averages(self) -> np.ndarray:
+        """Média ponderada das notas lançadas, por matéria (NaN sem notas)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.weighted_sum / self.total_weight
+
+    def missing(self) -> np.ndarray:
+        """Matriz (matérias x avaliações de GRADE_WEIGHTS): True onde ainda não há nota."""
+        present = np.zeros((self.n_groups, len(self.scheme)), dtype=bool)
+        known = self.assessment >= 0
+        present[self.group[known], self.assessment[known]] = True
+        return ~present
+
+    def needed(self, missing: np.ndarray) -> np.ndarray:
+        """
+        Nota igual em cada avaliação restante que leva a média ponderada final a
+        GRADE_PASSING_AVERAGE (0 se já garantiu; NaN se não falta nenhuma avaliação).
+        """
+        missing_weight = missing @ self.scheme_weights
+        with np.errstate(invalid="ignore", divide="ignore"):
+            needed = (GRADE_PASSING_AVERAGE * (self.total_weight + missing_weight) - self.weighted_sum) / missing_weight
+        needed[missing_weight == 0] = np.nan
+        return np.maximum(needed, 0)
+
+
+def percentile_ranks(cohort_scores: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    Posição (0 a 100) de cada nota de `scores` entre as médias da turma (já ordenadas):
+    % abaixo + metade dos empates, com duas buscas binárias.
+    """
+    below = np.searchsorted(cohort_scores, scores, side="left")
+    equal = np.searchsorted(cohort_scores, scores, side="right") - below
+    return (below + equal / 2) / len(cohort_scores) * 100
+
+
+def _grade_arrays(rows: Sequence, n_groups: int) -> GradeArrays:
+    """rows: (índice da matéria, nome da avaliação normalizado, valor)."""
+    count = len(rows)
+    return GradeArrays(
+        np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+        n_groups,
+        [row[1] for row in rows],
+        np.fromiter((row[2] for row in rows), dtype=np.float64, count=count),
+    )
+
+
+def _subject_averages(rows: Sequence, names: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    rows: (id da matéria, nome da matéria, avaliação, valor), de vários usuários.
+    Retorna, para cada matéria com nota, o índice do seu nome em `names` e a média ponderada.
+    """
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    subject_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    unique_ids, group = np.unique(subject_ids, return_inverse=True)
+    grades = GradeArrays(
+        group, len(unique_ids), [row[2] for row in rows],
+        np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows)),
+    )
+
+    # Uma linha qualquer de cada matéria diz o nome dela
+    sample = np.empty(len(unique_ids), dtype=np.int64)
+    sample[group] = np.arange(len(rows))
+    name_code = {name: i for i, name in enumerate(names)}
+    codes = np.array([name_code[rows[i][1]] for i in sample.tolist()], dtype=np.int64)
+    return codes, grades.weighted_averages()
+
+
+def _cohort_rows_query():
+    return (
+        select(Grade.subject_id, Subject.name, _assessment_column(), cast(Grade.value, Float))
+        .join(Subject, Grade.subject_id == Subject.id)
+    )
+
+
+def _assessment_column():
+    # Mesmo formato das chaves de GRADE_WEIGHTS ("p1 " -> "P1")
+    return func.upper(func.trim(Grade.name))
+
+
+# =============================================================================
+# Consultas
+# =============================================================================
+
+def get_user_standings(db: Session, user: User) -> List[SubjectStanding]:
+    """Situação das notas de todas as matérias do usuário, em ordem alfabética."""
+    subjects = db.execute(
+        select(Subject.id, Subject.name).where(Subject.user_id == user.user_id).order_by(Subject.name, Subject.id)
+    ).all()
+    return _standings(db, user, subjects)
+
+
+def get_subject_standing(db: Session, subject: Subject) -> SubjectStanding:
+    """Situação das notas de uma matéria (para o /relatorio)."""
+    return _standings(db, subject.owner, [(subject.id, subject.name)])[0]
+
+
+def _standings(db: Session, user: User, subjects: Sequence) -> List[SubjectStanding]:
+    if not subjects:
+        return []
+    index = {subject_id: i for i, (subject_id, _) in enumerate(subjects)}
+    rows = db.execute(
+        select(Grade.subject_id, _assessment_column(), cast(Grade.value, Float))
+        .where(Grade.subject_id.in_(index))
+    ).all()
+    grades = _grade_arrays([(index[subject_id], name, value) for subject_id, name, value in rows], len(subjects))
+
+    counts = grades.counts
+    averages = grades.averages()
+    weighted = grades.weighted_averages()
+    missing = grades.missing()
+    needed = grades.needed(missing)
+    percentiles, cohort_sizes = _cohort_ranks(db, user, subjects, weighted)
+
+    standings = []
+    for i, (subject_id, name) in enumerate(subjects):
+        standings.append(SubjectStanding(
+            subject_id=subject_id,
+            name=name,
+            grades_count=int(counts[i]),
+            average=_number(averages[i]),
+            weighted=_number(weighted[i]),
+            missing=tuple(grades.scheme[j] for j in np.flatnonzero(missing[i])),
+            needed=_number(needed[i]),
+            percentile=_number(percentiles[i]) if cohort_sizes[i] >= MIN_COHORT_SIZE else None,
+            cohort_size=int(cohort_sizes[i]),
+        ))
+    return standings
+
+
+def _cohort_ranks(db: Session, user: User, subjects: Sequence, weighted: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Posição de cada matéria do usuário entre as matérias de mesmo nome (a mesma do
+    catálogo) dos alunos do mesmo curso. Retorna (posições, tamanho de cada turma).
+    """
+    course = user.course if user is not None else None
+    cohorts = _get_cohorts(db, course, {name for _, name in subjects})
+    ranks = np.full(len(subjects), np.nan)
+    sizes = np.zeros(len(subjects), dtype=np.int64)
+    for i, (_, name) in enumerate(subjects):
+        cohort = cohorts[name]
+        sizes[i] = len(cohort)
+        if len(cohort) and not np.isnan(weighted[i]):
+            ranks[i] = percentile_ranks(cohort, weighted[i:i + 1])[0]
+    return ranks, sizes
+
+
+def _get_cohorts(db: Session, course: str | None, names: set) -> dict[str, np.ndarray]:
+    """Médias ordenadas da turma de cada matéria em `names`, do cache quando possível."""
+    now = time.monotonic()
+    cohorts, stale = {}, []
+    for name in names:
+        entry = _cohorts.get((course, name))
+        if entry is not None and entry[0] > now:
+            cohorts[name] = entry[1]
+        else:
+            stale.append(name)
+    if not stale:
+        return cohorts
+
+    # As turmas que faltam saem de uma consulta só e são separadas por uma ordenação
+    stale.sort()
+    codes, averages, bounds = _grouped(*_cohort_averages(db, stale, course), len(stale))
+    for i, name in enumerate(stale):
+        cohort = averages[bounds[i]:bounds[i + 1]]
+        cohorts[name] = cohort
+        if len(_cohorts) >= COHORT_CACHE_SIZE:
+            del _cohorts[next(iter(_cohorts))]
+        _cohorts[(course, name)] = (now + COHORT_CACHE_TTL, cohort)
+    return cohorts
+
+
+def _cohort_averages(db: Session, names: Sequence[str], course: str | None) -> tuple[np.ndarray, np.ndarray]:
+    """Médias das matérias chamadas `names[i]` de todos os usuários (só do `course`, se informado)."""
+    query = _cohort_rows_query().where(Subject.name.in_(names))
+    if course is not None:
+        query = query.join(User, Subject.user_id == User.user_id).where(User.course == course)
+    return _subject_averages(db.execute(query).all(), names)
+
+
+def get_course_summary(db: Session, course: str) -> List[CohortSummary]:
+    """(Admin) Resumo das notas de cada matéria entre todos os alunos de um curso."""
+    rows = db.execute(
+        _cohort_rows_query().join(User, Subject.user_id == User.user_id).where(User.course == course)
+    ).all()
+    names = sorted({row[1] for row in rows})
+    codes, averages, bounds = _grouped(*_subject_averages(rows, names), len(names))
+    students = np.diff(bounds)
+    means = np.bincount(codes, weights=averages, minlength=len(names)) / np.maximum(students, 1)
+    passed = np.bincount(codes, weights=averages >= GRADE_PASSING_AVERAGE, minlength=len(names))
+
+    summary = []
+    for i, name in enumerate(names):
+        scores = averages[bounds[i]:bounds[i + 1]]
+        p25, median, p75 = np.percentile(scores, [25, 50, 75])
+        summary.append(CohortSummary(
+            name=name,
+            students=int(students[i]),
+            mean=round(float(means[i]), 2),
+            median=round(float(median), 2),
+            p25=round(float(p25), 2),
+            p75=round(float(p75), 2),
+            pass_rate=round(float(passed[i] / students[i] * 100), 1),
+        ))
+    return summary
+
+
+def _grouped(codes: np.ndarray, averages: np.ndarray, n_groups: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Ordena por (matéria, média): cada matéria vira uma fatia contínua e já ordenada,
+    averages[bounds[i]:bounds[i + 1]].
+    """
+    order = np.lexsort((averages, codes))
+    codes = codes[order]
+    return codes, averages[order], np.searchsorted(codes, np.arange(n_groups + 1))
+
+
+def _number(value) -> float | None:
+    return None if np.isnan(value) else round(float(value), 2)
@@ -0,0 +1,133 @@
+# bot/services/import_service.py
+
+import csv
+import json
+from datetime import datetime, time
+from functools import lru_cache
+from typing import Iterator, TextIO
+
+from bot.core import dialogs
+
+WEEKDAYS = {"Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"}
+CHUNK_SIZE = 64 * 1024
+
+
+# =============================================================================
+# Leitura em fluxo (JSON e CSV)
+# =============================================================================
+
+def iter_json_rows(stream: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Lê uma lista JSON ('[{...}, {...}]') item por item, sem carregar o arquivo inteiro.
+    Lança ValueError (ou json.JSONDecodeError) se o arquivo não for uma lista válida.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill() -> None:
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace() -> str:
+        """Avança até o próximo caractere significativo e o retorna ('' no fim do arquivo)."""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ""
+            fill()
+
+    if skip_whitespace() != "[":
+        raise ValueError(dialogs.IMPORT_JSON_NOT_A_LIST)
+    pos += 1
+
+    if skip_whitespace() == "]":
+        return
+
+    while True:
+        skip_whitespace()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # Um valor que termina exatamente no fim do buffer pode estar incompleto
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        pos = end
+        yield item
+
+        separator = skip_whitespace()
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(dialogs.IMPORT_JSON_NOT_A_LIST)
+
+
+def iter_csv_rows(stream: TextIO) -> Iterator[dict]:
+    """Lê um CSV com as mesmas colunas do JSON, linha por linha. Campos vazios viram None."""
+    for row in csv.DictReader(stream):
+        yield {key.strip(): (value.strip() or None) if value is not None else None
+               for key, value in row.items() if key}
+
+
+# =============================================================================
+# Validação
+# =============================================================================
+
+@lru_cache(maxsize=256)
+def parse_time(value: str) -> time:
+    """Converte 'HH:MM' em time. Em cache, já que os mesmos horários se repetem muito."""
+    return datetime.strptime(value.strip(), "%H:%M").time()
+
+
+def validate_subject_row(data) -> dict:
+    """
+    Valida uma linha do arquivo de importação e a converte nas colunas de Subject.
+    Lança ValueError com uma mensagem legível se a linha for inválida.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("cada item deve ser um objeto com os campos da matéria")
+
+    missing = [field for field in ("nome", "dia_semana", "horario_inicio", "horario_fim") if not data.get(field)]
+    if missing:
+        raise ValueError(f"campo(s) obrigatório(s) ausente(s): {', '.join(missing)}")
+
+    day = str(data["dia_semana"]).strip()
+    if day not in WEEKDAYS:
+        raise ValueError(f"dia_semana inválido: '{day}'")
+
+    try:
+        start_time = parse_time(str(data["horario_inicio"]))
+        end_time = parse_time(str(data["horario_fim"]))
+    except ValueError:
+        raise ValueError("horários devem estar no formato HH:MM") from None
+    if end_time <= start_time:
+        raise ValueError("horario_fim deve ser depois de horario_inicio")
+
+    semestre = data.get("semestre")
+    if semestre is not None:
+        try:
+            semestre = int(semestre)
+        except (TypeError, ValueError):
+            raise ValueError(f"semestre inválido: '{semestre}'") from None
+
+    return {
+        "name": str(data["nome"]).strip(),
+        "professor": data.get("professor"),
+        "day_of_week": day,
+        "room": data.get("sala"),
+        "start_time": start_time,
+        "end_time": end_time,
+        "semestre": semestre,
+    }
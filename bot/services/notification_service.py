@@ -0,0 +1,117 @@
+# bot/services/notification_service.py
+
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from bot.db.models import NotificationOutbox
+
+# Tempo que um despachante tem para enviar um lote antes que outro possa reservá-lo
+CLAIM_LEASE = timedelta(minutes=2)
+
+
+def enqueue_notifications(db: Session, notifications: List[dict]) -> int:
+    """
+    Enfileira várias notificações de uma vez. Cada item tem 'user_id' e 'text' e,
+    opcionalmente, 'parse_mode', 'dedup_key' e 'send_after'.
+    Itens cujo dedup_key já existe são ignorados, então repetir uma tarefa não duplica avisos.
+    Retorna quantas notificações foram realmente enfileiradas.
+    """
+    if not notifications:
+        return 0
+    now = datetime.now()
+    rows = [
+        {
+            "user_id": item["user_id"],
+            "text": item["text"],
+            "parse_mode": item.get("parse_mode"),
+            "dedup_key": item.get("dedup_key"),
+            "send_after": item.get("send_after") or now,
+            "status": "pending",
+            "attempts": 0,
+        }
+        for item in notifications
+    ]
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    result = db.execute(insert(NotificationOutbox).values(rows).on_conflict_do_nothing(index_elements=["dedup_key"]))
+    db.commit()
+    return result.rowcount
+
+
+def claim_due_notifications(db: Session, limit: int) -> List[dict]:
+    """
+    Reserva até 'limit' notificações vencidas para este despachante.
+    O SELECT ... FOR UPDATE SKIP LOCKED permite vários despachantes (em várias instâncias)
+    sem que dois peguem a mesma linha; a reserva vale por CLAIM_LEASE.
+    Retorna dicionários com 'id', 'user_id', 'text' e 'parse_mode'.
+    """
+    now = datetime.now()
+    stmt = (
+        select(NotificationOutbox)
+        .where(
+            NotificationOutbox.status == "pending",
+            NotificationOutbox.send_after <= now,
+            or_(NotificationOutbox.locked_until.is_(None), NotificationOutbox.locked_until < now),
+        )
+        .order_by(NotificationOutbox.send_after, NotificationOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = []
+    for notification in db.execute(stmt).scalars():
+        notification.locked_until = now + CLAIM_LEASE
+        notification.attempts += 1
+        claimed.append({
+            "id": notification.id,
+            "user_id": notification.user_id,
+            "text": notification.text,
+            "parse_mode": notification.parse_mode,
+        })
+    db.commit()
+    return claimed
+
+
+def mark_notifications_sent(db: Session, notification_ids: List[int]) -> None:
+    """Marca como entregues as notificações enviadas com sucesso."""
+    if not notification_ids:
+        return
+    db.execute(
+        update(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(notification_ids))
+        .values(status="sent", sent_at=datetime.now(), locked_until=None, last_error=None)
+    )
+    db.commit()
+
+
+def mark_notification_failed(db: Session, notification_id: int, error: str, retry_in: float | None, max_attempts: int) -> None:
+    """
+    Registra uma falha de envio. Com 'retry_in' (segundos) a notificação volta para a fila
+    depois desse tempo; sem ele, ou depois de 'max_attempts' tentativas, desiste de vez.
+    """
+    notification = db.get(NotificationOutbox, notification_id)
+    if notification is None:
+        return
+    notification.last_error = error[:500]
+    if retry_in is None or notification.attempts >= max_attempts:
+        notification.status = "failed"
+        notification.locked_until = None
+    else:
+        notification.locked_until = datetime.now() + timedelta(seconds=retry_in)
+    db.commit()
+
+
+def purge_old_notifications(db: Session, older_than_days: int) -> int:
+    """Apaga notificações já resolvidas (enviadas ou com falha) há mais de 'older_than_days' dias."""
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    result = db.execute(
+        delete(NotificationOutbox).where(
+            NotificationOutbox.status != "pending",
+            NotificationOutbox.send_after < cutoff,
+        )
+    )
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,104 @@
+# bot/services/stats_service.py
+"""
+Estatísticas de uso para os admins (/stats).
+
+Tudo é calculado no banco, com COUNT/SUM e GROUP BY: o custo não depende de trazer
+usuários para o Python. Mesmo assim as consultas varrem tabelas inteiras, então o
+resultado é guardado em stats_snapshots por uma tarefa periódica (veja
+bot/jobs.py) e o /stats só lê a última versão.
+"""
+
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from bot.db.models import Absence, Activity, Grade, StatsSnapshot, Subject, User
+
+SNAPSHOT_NAME = "admin_stats"
+
+# Faixas da distribuição de faltas por matéria: (rótulo, mínimo, máximo ou None)
+ABSENCE_BUCKETS = [
+    ("0", 0, 0),
+    ("1-2", 1, 2),
+    ("3-5", 3, 5),
+    ("6-10", 6, 10),
+    ("11+", 11, None),
+]
+
+
+def compute_stats(db: Session, today: date | None = None) -> dict:
+    """Calcula as estatísticas agregadas (um dicionário serializável em JSON)."""
+    today = today or date.today()
+    week_start = today - timedelta(days=6)
+    month_start = today - timedelta(days=29)
+
+    users = db.execute(
+        select(
+            func.count(),
+            func.count().filter(User.is_active.is_(True)),
+            func.count().filter(User.last_seen_on >= today),
+            func.count().filter(User.last_seen_on >= week_start),
+            func.count().filter(User.last_seen_on >= month_start),
+        ).select_from(User)
+    ).one()
+
+    courses = db.execute(
+        select(User.course, func.count()).group_by(User.course).order_by(func.count().desc())
+    ).all()
+
+    totals = db.execute(
+        select(
+            select(func.count()).select_from(Subject).scalar_subquery(),
+            select(func.count()).select_from(Activity).scalar_subquery(),
+            select(func.count()).select_from(Absence).scalar_subquery(),
+            select(func.coalesce(func.sum(Absence.quantity), 0)).scalar_subquery(),
+            select(func.count()).select_from(Grade).scalar_subquery(),
+        )
+    ).one()
+
+    bucket = case(
+        *[
+            (Subject.total_absences <= high, label) if high is not None else (Subject.total_absences >= low, label)
+            for label, low, high in ABSENCE_BUCKETS
+        ],
+    ).label("bucket")
+    # GROUP BY pelo rótulo: repetir o CASE geraria parâmetros diferentes e o PostgreSQL recusaria
+    distribution = dict(db.execute(select(bucket, func.count()).group_by("bucket")).all())
+
+    return {
+        "computed_at": datetime.now().isoformat(timespec="seconds"),
+        "users": {"total": users[0], "active": users[1], "dau": users[2], "wau": users[3], "mau": users[4]},
+        "courses": [[course, count] for course, count in courses],
+        "totals": {
+            "subjects": totals[0],
+            "activities": totals[1],
+            "absence_records": totals[2],
+            "absences": int(totals[3]),
+            "grades": totals[4],
+        },
+        "absence_distribution": [[label, distribution.get(label, 0)] for label, _, _ in ABSENCE_BUCKETS],
+    }
+
+
+def save_stats(db: Session, stats: dict) -> None:
+    db.merge(StatsSnapshot(
+        name=SNAPSHOT_NAME,
+        data=json.dumps(stats, ensure_ascii=False),
+        computed_at=datetime.fromisoformat(stats["computed_at"]),
+    ))
+    db.commit()
+
+
+def get_stats(db: Session) -> dict | None:
+    """Última versão calculada das estatísticas (None se a tarefa ainda não rodou)."""
+    snapshot = db.get(StatsSnapshot, SNAPSHOT_NAME)
+    return json.loads(snapshot.data) if snapshot else None
+
+
+def refresh_stats(db: Session, read_db: Session | None = None) -> dict:
+    """Recalcula (lendo de read_db, se informado, ex: a réplica) e grava a nova versão."""
+    stats = compute_stats(read_db if read_db is not None else db)
+    save_stats(db, stats)
+    return stats
@@ -2,16 +2,23 @@
 
 import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import case
+from sqlalchemy import case, insert
 from bot.db.models import Subject, User, Absence, Grade
-from typing import List
-from datetime import datetime, time
+from typing import Iterable, List
+from datetime import time
 from bot.db.models import CourseSubject
+from bot.db.changes import mark_changed
+from . import attendance_service, import_service
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Quantidade de linhas por INSERT na importação em massa
+IMPORT_BATCH_SIZE = 1000
+# Campos que mudam o número de aulas (e o limite de faltas) da matéria
+SCHEDULE_FIELDS = {"day_of_week", "start_time", "end_time"}
+
 
 
 def create_subject(db: Session, user: User, name: str, professor: str, day: str, room: str, start_time: time, end_time: time, semestre: int) -> Subject:
@@ -20,9 +27,9 @@ def create_subject(db: Session, user: User, name: str, professor: str, day: str,
         name=name, professor=professor, day_of_week=day, room=room,
         start_time=start_time, end_time=end_time, semestre=semestre, owner=user
     )
+    attendance_service.apply_limits(db_subject)
     db.add(db_subject)
     db.commit()
-    db.refresh(db_subject)
     return db_subject
 
 def get_subjects_by_user(db: Session, user: User) -> List[Subject]:
@@ -49,8 +56,9 @@ def update_subject(db: Session, subject_id: int, new_data: dict) -> Subject | No
     if db_subject:
         for key, value in new_data.items():
             setattr(db_subject, key, value)
+        if SCHEDULE_FIELDS & new_data.keys():
+            attendance_service.apply_limits(db_subject)
         db.commit()
-        db.refresh(db_subject)
         return db_subject
     return None
 
@@ -64,45 +72,56 @@ def delete_subject_by_id(db: Session, subject_id: int) -> bool:
 
 
 
-def bulk_create_subjects(db: Session, user: User, subjects_data: list) -> dict:
+def bulk_create_subjects(db: Session, user: User, subjects_data: Iterable[dict]) -> dict:
     """
-    Cria múltiplas matérias de uma vez a partir de uma lista de dicionários.
-    Retorna um relatório com sucessos e falhas.
+    Cria múltiplas matérias de uma vez a partir de uma lista (ou gerador) de dicionários.
+    Cada linha é validada; as válidas são inseridas com INSERTs de várias linhas,
+    tudo em uma única transação. Retorna um relatório com sucessos e falhas.
     """
     created_count = 0
     errors = []
-    for index, data in enumerate(subjects_data, 1):
-        try:
-            # Converte os horários de string para time object
-            start_time = datetime.strptime(data['horario_inicio'], '%H:%M').time()
-            end_time = datetime.strptime(data['horario_fim'], '%H:%M').time()
-
-            db_subject = Subject(
-                name=data['nome'],
-                professor=data.get('professor'), # .get() para campos opcionais
-                day_of_week=data['dia_semana'],
-                room=data.get('sala'),
-                start_time=start_time,
-                end_time=end_time,
-                semestre=data.get('semestre'),
-                owner=user
-            )
-            db.add(db_subject)
-            created_count += 1
-        except Exception as e:
-            logger.error(f"Erro ao importar matéria na linha {index}: {e}")
-            errors.append(f"Linha {index} ({data.get('nome', 'N/A')}): {e}")
-
-    if errors:
-        db.rollback() # Se houve qualquer erro, desfaz tudo para não salvar dados parciais
-        return {"success": 0, "errors": errors}
-    else:
-        db.commit() # Se tudo deu certo, salva tudo de uma vez
-        return {"success": created_count, "errors": []}
+    batch = []
+    semester = attendance_service.current_semester()
+    # SAVEPOINT: desfazer a importação não pode desfazer o resto da transação da
+    # atualização (o usuário criado agora, o mark_user_seen...). Uma exceção no meio da
+    # leitura (arquivo quebrado) também desfaz os lotes já inseridos
+    with db.begin_nested() as savepoint:
+        for index, data in enumerate(subjects_data, 1):
+            try:
+                row = import_service.validate_subject_row(data)
+            except ValueError as e:
+                name = data.get('nome', 'N/A') if isinstance(data, dict) else 'N/A'
+                errors.append(f"Linha {index} ({name}): {e}")
+                continue
+
+            # Depois do primeiro erro nada será salvo; só continuamos validando para o relatório
+            if errors:
+                continue
+            row["user_id"] = user.user_id
+            row.update(attendance_service.limit_columns(row["day_of_week"], row["start_time"], row["end_time"], semester))
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                db.execute(insert(Subject), batch)
+                created_count += len(batch)
+                batch.clear()
+
+        if errors:
+            logger.info(f"Importação do usuário {user.user_id} rejeitada com {len(errors)} erro(s).")
+            savepoint.rollback() # Se houve qualquer erro, desfaz tudo para não salvar dados parciais
+            return {"success": 0, "errors": errors}
+
+        if batch:
+            db.execute(insert(Subject), batch)
+            created_count += len(batch)
+        if created_count:
+            mark_changed(db, user)
+    db.commit() # Se tudo deu certo, salva tudo de uma vez
+    return {"success": created_count, "errors": []}
     
     
 def bulk_create_from_course_subjects(db: Session, user: User, course_subjects: List[CourseSubject], semester_override: int | None = None) -> int:
     """Cria múltiplas matérias para um usuário a partir do catálogo mestre."""
+    semester = attendance_service.current_semester()
     for course_sub in course_subjects:
         db_subject = Subject(
             name=course_sub.subject_name,
@@ -114,6 +133,7 @@ def bulk_create_from_course_subjects(db: Session, user: User, course_subjects: L
             semestre=semester_override if semester_override is not None else course_sub.semester,
             owner=user
         )
+        attendance_service.apply_limits(db_subject, semester)
         db.add(db_subject)
     
     db.commit()
@@ -0,0 +1,201 @@
+# bot/services/timetable_service.py
+"""
+Índice da grade semanal de cada usuário (/hoje, /proxima).
+
+Cada dia da semana guarda as aulas ordenadas pelo início (para achar a próxima com
+uma busca binária) e um mapa de bits com um bit por intervalo de 5 minutos (para
+saber se um horário está livre, ou cruzar a grade de vários alunos, com operações
+de bits).
+
+O índice fica em memória por usuário e vale enquanto users.data_version não mudar:
+toda escrita de matéria pelo subject_service muda a versão (veja bot/db/changes.py),
+então o índice é refeito na próxima leitura, em qualquer instância.
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from bot.db.changes import changed_in
+from bot.db.models import Subject, User
+from bot.services.attendance_service import WEEKDAY_INDEX
+
+WEEKDAYS = list(WEEKDAY_INDEX)
+SLOT_MINUTES = 5
+
+
+@dataclass(frozen=True)
+class ClassSlot:
+    """Uma aula da grade (mesmos nomes de campo de Subject, para as views)."""
+    subject_id: int
+    name: str
+    room: str | None
+    start_time: time
+    end_time: time
+
+    @property
+    def start_minute(self) -> int:
+        return _minute(self.start_time)
+
+    @property
+    def end_minute(self) -> int:
+        return _minute(self.end_time)
+
+
+class Timetable:
+    """Grade semanal indexada de um usuário (segunda = 0)."""
+
+    def __init__(self, classes: Iterable[tuple[ClassSlot, int]]):
+        """classes: pares (aula, dia da semana)."""
+        self._days: list[list[ClassSlot]] = [[] for _ in WEEKDAYS]
+        for slot, weekday in classes:
+            self._days[weekday].append(slot)
+        for day in self._days:
+            day.sort(key=lambda s: (s.start_minute, s.end_minute))
+        self._starts = [[s.start_minute for s in day] for day in self._days]
+        self._busy = [_mask(day) for day in self._days]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "Timetable":
+        """rows: (id, nome, sala, dia da semana, início, fim), como em load_timetable."""
+        return cls(
+            (ClassSlot(subject_id, name, room, start_time, end_time), WEEKDAY_INDEX[day])
+            for subject_id, name, room, day, start_time, end_time in rows
+            if day in WEEKDAY_INDEX and start_time is not None and end_time is not None and end_time > start_time
+        )
+
+    def __bool__(self) -> bool:
+        return any(self._days)
+
+    def classes_on(self, weekday: int) -> List[ClassSlot]:
+        return self._days[weekday]
+
+    def busy_mask(self, weekday: int) -> int:
+        """Bit i ligado: há aula entre i*5 e (i+1)*5 minutos depois da meia-noite."""
+        return self._busy[weekday]
+
+    def is_free(self, weekday: int, at: time) -> bool:
+        return not self._busy[weekday] >> (_minute(at) // SLOT_MINUTES) & 1
+
+    def current_class(self, now: datetime) -> ClassSlot | None:
+        """A aula em andamento em `now` (a que começou por último, se houver sobreposição)."""
+        weekday, minute = now.weekday(), _minute(now.time())
+        if self.is_free(weekday, now.time()):
+            return None
+        day = self._days[weekday]
+        for i in range(bisect_right(self._starts[weekday], minute) - 1, -1, -1):
+            if day[i].end_minute > minute:
+                return day[i]
+        return None
+
+    def next_class(self, now: datetime) -> tuple[date, ClassSlot] | None:
+        """
+        A próxima aula que começa depois de `now` (hoje ou nos próximos 7 dias). A que
+        começa no próprio minuto de `now` já está em andamento (veja current_class).
+        """
+        minute = _minute(now.time())
+        for offset in range(8):
+            weekday = (now.weekday() + offset) % 7
+            starts = self._starts[weekday]
+            i = bisect_right(starts, minute) if offset == 0 else 0
+            if i < len(starts):
+                return now.date() + timedelta(days=offset), self._days[weekday][i]
+        return None
+
+
+class TimetableCache:
+    """Grades por users.id e versão; descarta os usuários menos recentes quando enche."""
+
+    def __init__(self, max_users: int = 10_000):
+        self.max_users = max_users
+        self._users: dict[int, tuple[int, Timetable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, user: User) -> Timetable | None:
+        entry = self._users.pop(user.id, None)
+        if entry is None or entry[0] != user.data_version:
+            return None
+        self._users[user.id] = entry
+        return entry[1]
+
+    def put(self, user: User, timetable: Timetable) -> None:
+        if user.id not in self._users and len(self._users) >= self.max_users:
+            del self._users[next(iter(self._users))]
+        self._users[user.id] = (user.data_version, timetable)
+
+    def clear(self) -> None:
+        self._users.clear()
+
+
+timetables = TimetableCache()
+
+
+def load_timetable(db: Session, user: User) -> Timetable:
+    """Monta a grade do usuário a partir do banco (sem cache)."""
+    rows = db.execute(
+        select(Subject.id, Subject.name, Subject.room, Subject.day_of_week, Subject.start_time, Subject.end_time)
+        .where(Subject.user_id == user.user_id)
+    ).all()
+    return Timetable.from_rows(rows)
+
+
+def get_timetable(db: Session, user: User) -> Timetable:
+    """A grade do usuário, do cache se as matérias dele não mudaram desde a montagem."""
+    timetable = timetables.get(user)
+    if timetable is not None:
+        return timetable
+    timetable = load_timetable(db, user)
+    # Alteração ainda sem COMMIT pode ser desfeita: não guarda
+    if user.user_id not in changed_in(db):
+        timetables.put(user, timetable)
+    return timetable
+
+
+def free_slots(busy: int, start: time = time(7, 0), end: time = time(23, 0), min_minutes: int = 30) -> List[tuple[time, time]]:
+    """Intervalos livres (sem bit ligado em `busy`) entre `start` e `end` com pelo menos `min_minutes`."""
+    first, last = _minute(start) // SLOT_MINUTES, -(-_minute(end) // SLOT_MINUTES)
+    free = ~busy & ((1 << last) - (1 << first))
+    min_slots = -(-min_minutes // SLOT_MINUTES)
+    slots = []
+    while free:
+        low = (free & -free).bit_length() - 1
+        run = free >> low
+        length = (run ^ (run + 1)).bit_length() - 1
+        if length >= min_slots:
+            slots.append((_time(low * SLOT_MINUTES), _time((low + length) * SLOT_MINUTES)))
+        free &= ~(((1 << length) - 1) << low)
+    return slots
+
+
+def common_free_slots(
+    timetables_: Sequence[Timetable], weekday: int, start: time = time(7, 0), end: time = time(23, 0), min_minutes: int = 60,
+) -> List[tuple[time, time]]:
+    """Horários em que todos os alunos de um grupo de estudo estão livres no dia da semana."""
+    busy = 0
+    for timetable in timetables_:
+        busy |= timetable.busy_mask(weekday)
+    return free_slots(busy, start, end, min_minutes)
+
+
+def _minute(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _time(minute: int) -> time:
+    # 24:00 (fim do dia) vira 23:59
+    return time(minute // 60, minute % 60) if minute < 24 * 60 else time(23, 59)
+
+
+def _mask(classes: Iterable[ClassSlot]) -> int:
+    busy = 0
+    for slot in classes:
+        first = slot.start_minute // SLOT_MINUTES
+        last = -(-slot.end_minute // SLOT_MINUTES)
+        busy |= ((1 << (last - first)) - 1) << first
+    return busy
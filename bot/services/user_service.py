@@ -1,9 +1,13 @@
-from datetime import date, timedelta
-from sqlalchemy.orm import Session
-from bot.db.models import Activity, User
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import delete, or_, update
+from sqlalchemy.orm import Session, joinedload
+from bot.db.models import Activity, NotificationOutbox, User
 from typing import Tuple 
 from typing import List
 
+# Limites das preferências de lembrete (/lembretes)
+REMINDER_MAX_DAYS = 30
+REMINDER_MAX_COUNT = 5
 
 
 def get_or_create_user(db: Session, user_id: int, first_name: str, username: str | None) -> Tuple[User, bool]:
@@ -11,7 +15,13 @@ def get_or_create_user(db: Session, user_id: int, first_name: str, username: str
     Busca um usuário no banco de dados pelo user_id.
     Se o usuário não existir, cria um novo.
     Retorna a instância do usuário e um booleano 'is_new' (True se foi criado agora).
+    O usuário fica guardado na sessão: chamadas repetidas na mesma atualização não vão ao banco.
     """
+    cache = db.info.setdefault("users_by_telegram_id", {})
+    cached = cache.get(user_id)
+    if cached is not None and cached in db:
+        return cached, False
+
     db_user = db.query(User).filter(User.user_id == user_id).first()
     
     if not db_user:
@@ -23,15 +33,63 @@ def get_or_create_user(db: Session, user_id: int, first_name: str, username: str
         )
         db.add(db_user)
         db.commit()
-        db.refresh(db_user)
     else:
         is_new = False
         
+    cache[user_id] = db_user
     return db_user, is_new
 
 def get_all_active_users(db: Session) -> List[User]:
-    """Retorna uma lista de todos os usuários no banco de dados."""
-    return db.query(User).all()
+    """Retorna os usuários que ainda recebem mensagens (não bloquearam o bot)."""
+    return db.query(User).filter(User.is_active.is_(True)).all()
+
+def mark_user_blocked(db: Session, user_id: int) -> bool:
+    """
+    Marca o usuário como inativo (bloqueou o bot ou o chat não existe mais).
+    Retorna True se o usuário estava ativo.
+    """
+    result = db.execute(
+        update(User)
+        .where(User.user_id == user_id, User.is_active.is_(True))
+        .values(is_active=False, blocked_at=datetime.now())
+    )
+    db.commit()
+    return result.rowcount > 0
+
+def reactivate_user(db: Session, user_id: int) -> bool:
+    """
+    Reativa um usuário marcado como inativo. Não escreve nada se ele já estiver ativo.
+    Retorna True se o usuário foi reativado.
+    """
+    result = db.execute(
+        update(User)
+        .where(User.user_id == user_id, User.is_active.is_(False))
+        .values(is_active=True, blocked_at=None)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+def mark_user_seen(db: Session, user_id: int, today: date | None = None) -> None:
+    """
+    Registra o dia de uso (last_seen_on) e reativa o usuário, se estava inativo.
+    Só escreve na primeira vez do dia (ou se ele estava inativo).
+    """
+    today = today or date.today()
+    db.execute(
+        update(User)
+        .where(
+            User.user_id == user_id,
+            or_(User.is_active.is_(False), User.last_seen_on.is_(None), User.last_seen_on < today),
+        )
+        .values(is_active=True, blocked_at=None, last_seen_on=today)
+    )
+    db.commit()
+
+def set_user_course(db: Session, user: User, course: str) -> None:
+    """Guarda o curso escolhido no /fatec (usado nas estatísticas por curso)."""
+    if user.course != course:
+        user.course = course
+        db.commit()
 
 def get_user_by_telegram_id(db: Session, user_id: int) -> User | None:
     """Busca um usuário pelo seu ID do Telegram."""
@@ -45,13 +103,64 @@ def delete_user_by_id(db: Session, user_id: int) -> bool:
     db_user = db.query(User).filter(User.user_id == user_id).first()
     if db_user:
         db.delete(db_user)
+        # Notificações pendentes não têm chave estrangeira; são removidas à parte
+        db.execute(delete(NotificationOutbox).where(NotificationOutbox.user_id == user_id))
         db.commit()
         return True
     return False
 
 def get_upcoming_activities(db: Session, days_ahead: int) -> List[Activity]:
     """
-    Busca todas as atividades de todos os usuários que vencem em exatamente 'days_ahead' dias.
+    Busca todas as atividades de todos os usuários ativos que vencem em exatamente 'days_ahead' dias.
     """
     target_date = date.today() + timedelta(days=days_ahead)
-    return db.query(Activity).filter(Activity.due_date == target_date).all()
\ No newline at end of file
+    return (
+        db.query(Activity)
+        .join(User, User.user_id == Activity.user_id)
+        .filter(Activity.due_date == target_date, User.is_active.is_(True))
+        .all()
+    )
+
+def get_reminder_days(user: User) -> List[int]:
+    """Converte o campo reminder_days ("1,3") na lista de dias de antecedência."""
+    return sorted({int(day) for day in user.reminder_days.split(",") if day.strip()})
+
+def update_reminder_preferences(db: Session, user_id: int, reminder_time: time, reminder_days: List[int] | None = None) -> User | None:
+    """
+    Atualiza o horário (e, opcionalmente, os dias de antecedência) dos lembretes de prazos.
+    Lança ValueError se os dias estiverem fora dos limites. Retorna None se o usuário não existir.
+    """
+    db_user = db.query(User).filter(User.user_id == user_id).first()
+    if not db_user:
+        return None
+
+    db_user.reminder_time = reminder_time.replace(second=0, microsecond=0)
+    if reminder_days is not None:
+        days = sorted(set(reminder_days))
+        if not days or len(days) > REMINDER_MAX_COUNT or not all(0 <= d <= REMINDER_MAX_DAYS for d in days):
+            raise ValueError("Dias de antecedência inválidos.")
+        db_user.reminder_days = ",".join(str(d) for d in days)
+    db.commit()
+    return db_user
+
+def get_users_to_remind(db: Session, start: time, end: time) -> List[User]:
+    """
+    Busca os usuários ativos cujo horário de lembrete está entre 'start' e 'end' (inclusive).
+    Usa o índice parcial ix_users_reminder_time, então cada minuto lê só a sua "fatia".
+    """
+    return (
+        db.query(User)
+        .filter(User.is_active.is_(True), User.reminder_time >= start, User.reminder_time <= end)
+        .all()
+    )
+
+def get_activities_due_for_users(db: Session, user_ids: List[int], start_date: date, end_date: date) -> List[Activity]:
+    """Busca, em uma única consulta, as atividades dos usuários informados que vencem entre as duas datas."""
+    if not user_ids:
+        return []
+    return (
+        db.query(Activity)
+        .options(joinedload(Activity.subject))
+        .filter(Activity.user_id.in_(user_ids), Activity.due_date >= start_date, Activity.due_date <= end_date)
+        .all()
+    )
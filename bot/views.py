@@ -0,0 +1,366 @@
+# bot/views.py
+"""
+Montagem das mensagens das listagens e relatórios.
+
+Funções puras (sem banco nem Telegram): recebem os objetos já carregados e devolvem
+o HTML. As partes são acumuladas numa lista e unidas uma única vez no final, e os
+textos vêm dos templates compilados (que escapam os nomes digitados pelo usuário).
+Mensagens que passarem do limite do Telegram são divididas por split_message().
+"""
+
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, Mapping, Sequence
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MessageLimit
+
+from bot.core import dialogs
+from bot.core.settings import ATTENDANCE_MIN_PERCENT, ATTENDANCE_WARN_REMAINING, GRADE_MAX, GRADE_PASSING_AVERAGE
+from bot.core.templates import Safe, tpl
+
+WEEKDAYS = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"]
+# Índice de date.weekday() -> nome
+WEEKDAY_NAMES = WEEKDAYS + ["Domingo"]
+
+
+def _hhmm(value, missing: str = "--:--") -> str:
+    return f"{value.hour:02d}:{value.minute:02d}" if value else missing
+
+
+def _ddmmyyyy(value: date) -> str:
+    # strftime é bem mais lento que uma f-string, e as listas chamam isto para cada item
+    return f"{value.day:02d}/{value.month:02d}/{value.year}"
+
+
+def _grade(value: float) -> str:
+    return f"{value:.2f}"
+
+
+def activity_icon(activity) -> str:
+    return "📝" if activity.activity_type == "trabalho" else "❗️"
+
+
+def render_subject_list(subjects: Sequence, grades_by_subject: Mapping[int, Sequence]) -> str:
+    """Grade horária semanal (/grade), agrupada por dia, com notas e faltas de cada matéria."""
+    if not subjects:
+        return dialogs.SUBJECT_LIST_NO_SUBJECTS
+
+    days = defaultdict(list)
+    for s in subjects:
+        days[s.day_of_week].append(s)
+
+    parts = [dialogs.SUBJECT_LIST_HEADER]
+    append = parts.append
+    for day in WEEKDAYS:
+        day_subjects = days.get(day)
+        if not day_subjects:
+            continue
+        append(tpl.SUBJECT_LIST_DAY_HEADER(day=day.upper()))
+        for s in day_subjects:
+            append(tpl.SUBJECT_LIST_ITEM(
+                st=_hhmm(s.start_time), et=_hhmm(s.end_time),
+                name=s.name, professor=s.professor, room=s.room,
+            ))
+            grades = grades_by_subject.get(s.id)
+            if grades:
+                grade_list = ", ".join(tpl.SUBJECT_LIST_GRADE(name=g.name, value=f"{g.value:.2f}") for g in grades)
+                append(tpl.SUBJECT_LIST_GRADES_LINE(grades=Safe(grade_list)))
+            if s.total_absences > 0:
+                append(tpl.SUBJECT_LIST_ABSENCES_LINE(absences=s.total_absences))
+            # Um pequeno espaço entre as matérias de um mesmo dia
+            append("\n")
+        append(dialogs.SEPARATOR)
+    return "".join(parts)
+
+
+def render_activity_list(activities: Iterable) -> str:
+    """Calendário de trabalhos e provas (/calendario)."""
+    parts = [dialogs.ACTIVITY_LIST_HEADER]
+    append = parts.append
+    for a in activities:
+        append(tpl.ACTIVITY_LIST_ITEM(
+            icon=activity_icon(a), name=a.name, activity_type=a.activity_type.capitalize(),
+            subject_name=a.subject.name, due_date=_ddmmyyyy(a.due_date),
+        ))
+        if a.notes:
+            append(tpl.ACTIVITY_LIST_NOTES_LINE(notes=a.notes))
+        append(dialogs.SEPARATOR)
+    if len(parts) == 1:
+        return dialogs.ACTIVITY_LIST_NO_ACTIVITIES
+    return "".join(parts)
+
+
+def render_subject_report(subject, activities: Sequence, grades: Sequence, standing=None) -> str:
+    """Relatório completo de uma matéria (/relatorio)."""
+    parts = [
+        tpl.REPORT_HEADER(subject_name=subject.name),
+        tpl.REPORT_SUBJECT_DETAILS(
+            semestre=subject.semestre or "N/A", professor=subject.professor,
+            day_of_week=subject.day_of_week, start_str=_hhmm(subject.start_time, "N/A"),
+            end_str=_hhmm(subject.end_time, "N/A"), room=subject.room,
+            total_absences=subject.total_absences,
+        ),
+        "\n", dialogs.SEPARATOR, "\n",
+        dialogs.REPORT_ACTIVITIES_HEADER,
+    ]
+    if not activities:
+        parts.append(dialogs.REPORT_NO_ACTIVITIES)
+    for act in activities:
+        parts.append(tpl.REPORT_ACTIVITY_ITEM(due_date=_ddmmyyyy(act.due_date), activity_name=act.name))
+    parts += ["\n", dialogs.SEPARATOR, "\n", dialogs.REPORT_GRADES_HEADER]
+    if not grades:
+        parts.append(dialogs.REPORT_NO_GRADES)
+    for grade in grades:
+        parts.append(tpl.REPORT_GRADE_ITEM(grade_name=grade.name, grade_value=f"{grade.value:.2f}"))
+    if standing is not None:
+        parts += ["\n", dialogs.AVERAGES_REPORT_HEADER]
+        parts += _standing_lines(standing)
+    return "".join(parts)
+
+
+def render_averages(standings: Sequence) -> str:
+    """Médias, nota necessária e posição na turma de cada matéria (/medias)."""
+    parts = [tpl.AVERAGES_HEADER(passing=_grade(GRADE_PASSING_AVERAGE))]
+    for standing in standings:
+        parts.append(tpl.AVERAGES_SUBJECT(subject_name=standing.name))
+        parts += _standing_lines(standing)
+        parts.append("\n")
+    return "".join(parts)
+
+
+def _standing_lines(standing) -> list:
+    lines = []
+    if standing.grades_count == 0:
+        lines.append(dialogs.AVERAGES_NO_GRADES)
+    elif standing.final is not None:
+        final_line = tpl.AVERAGES_FINAL_PASSED if standing.passed else tpl.AVERAGES_FINAL_FAILED
+        lines.append(final_line(final=_grade(standing.final)))
+    else:
+        lines.append(tpl.AVERAGES_CURRENT(weighted=_grade(standing.weighted), grades_count=standing.grades_count))
+
+    if standing.missing:
+        missing = " e ".join(standing.missing)
+        if standing.needed == 0:
+            lines.append(tpl.AVERAGES_SAFE(missing=missing))
+        elif not standing.reachable:
+            lines.append(tpl.AVERAGES_UNREACHABLE(grade_max=_grade(GRADE_MAX), missing=missing))
+        else:
+            lines.append(tpl.AVERAGES_NEEDED(needed=_grade(standing.needed), missing=missing))
+    if standing.percentile is not None:
+        lines.append(tpl.AVERAGES_PERCENTILE(percentile=f"{standing.percentile:.0f}", cohort_size=standing.cohort_size))
+    return lines
+
+
+def render_course_not_found(courses: Iterable[str]) -> str:
+    course_list = "".join(tpl.AVERAGES_COURSE_ITEM_NAME(course=course) for course in sorted(courses))
+    return tpl.AVERAGES_COURSE_NOT_FOUND(courses=Safe(course_list))
+
+
+def render_course_summary(course: str, summary: Sequence) -> str:
+    """(Admin) Notas de cada matéria entre os alunos de um curso (/medias <curso>)."""
+    if not summary:
+        return tpl.AVERAGES_COURSE_EMPTY(course=course)
+    parts = [tpl.AVERAGES_COURSE_HEADER(course=course, passing=_grade(GRADE_PASSING_AVERAGE))]
+    parts += [
+        tpl.AVERAGES_COURSE_ITEM(
+            subject_name=s.name, students=s.students, mean=_grade(s.mean), median=_grade(s.median),
+            p25=_grade(s.p25), p75=_grade(s.p75), pass_rate=f"{s.pass_rate:.0f}",
+        )
+        for s in summary
+    ]
+    return "".join(parts)
+
+
+def render_absence_report(subjects: Sequence, semester=None) -> str:
+    """Total de faltas por matéria (/faltas) e, onde já calculado, o saldo até o limite."""
+    parts = [dialogs.ABSENCE_REPORT_HEADER]
+    for s in subjects:
+        left = s.absences_left
+        if left is None:
+            parts.append(tpl.ABSENCE_REPORT_ITEM(subject_name=s.name, total_absences=s.total_absences))
+            continue
+        if left < 0:
+            parts.append(tpl.ABSENCE_REPORT_ITEM_OVER(
+                subject_name=s.name, total_absences=s.total_absences, absence_limit=s.absence_limit,
+            ))
+            continue
+        item = tpl.ABSENCE_REPORT_ITEM_WARNING if left <= ATTENDANCE_WARN_REMAINING else tpl.ABSENCE_REPORT_ITEM_LIMIT
+        parts.append(item(subject_name=s.name, total_absences=s.total_absences, absence_limit=s.absence_limit, left=left))
+    if semester is not None and any(s.absence_limit is not None for s in subjects):
+        parts.append(tpl.ABSENCE_REPORT_FOOTER(
+            min_percent=f"{ATTENDANCE_MIN_PERCENT:g}", start=_ddmmyyyy(semester.start), end=_ddmmyyyy(semester.end),
+        ))
+    return "".join(parts)
+
+
+def render_stats(stats: Mapping) -> str:
+    """Estatísticas agregadas do bot (/stats, só admins)."""
+    computed_at = stats["computed_at"].replace("T", " ")
+    parts = [tpl.ADMIN_STATS_USERS(computed_at=computed_at, **stats["users"]), dialogs.ADMIN_STATS_COURSES_HEADER]
+    for course, count in stats["courses"]:
+        parts.append(tpl.ADMIN_STATS_COURSE_ITEM(course=course or dialogs.ADMIN_STATS_NO_COURSE, count=count))
+    parts.append(tpl.ADMIN_STATS_TOTALS(**stats["totals"]))
+    parts.append(dialogs.ADMIN_STATS_ABSENCES_HEADER)
+    for bucket, count in stats["absence_distribution"]:
+        parts.append(tpl.ADMIN_STATS_ABSENCES_ITEM(bucket=bucket, count=count))
+    return "".join(parts)
+
+
+def render_absence_history(subject, absences: Sequence, first_number: int = 1) -> str:
+    """Uma página do histórico de faltas (/gerenciarfaltas), numerada a partir de first_number."""
+    parts = [tpl.ABSENCE_HISTORY_HEADER(subject_name=subject.name)]
+    append = parts.append
+    for number, absence in enumerate(absences, first_number):
+        append(tpl.ABSENCE_HISTORY_ITEM(number=number, date=_ddmmyyyy(absence.absence_date), quantity=absence.quantity))
+        if absence.notes:
+            append(tpl.ABSENCE_HISTORY_NOTES_LINE(notes=absence.notes))
+        append(dialogs.SEPARATOR)
+    append(dialogs.ABSENCE_HISTORY_CHOOSE)
+    return "".join(parts)
+
+
+def render_today(today: date, weekday: str, subjects: Sequence, activities: Sequence) -> str:
+    """Resumo do dia (/hoje): aulas e entregas."""
+    parts = [
+        tpl.SUMMARY_TODAY_HEADER(date=_ddmmyyyy(today), weekday=weekday),
+        dialogs.TODAY_COURSES_HEADER,
+    ]
+    if not subjects:
+        parts.append(dialogs.TODAY_NO_COURSES)
+    for s in subjects:
+        parts.append(tpl.TODAY_COURSE_LINE(start=_hhmm(s.start_time), end=_hhmm(s.end_time), name=s.name, room=s.room))
+    parts += ["\n", dialogs.SEPARATOR, "\n\n", dialogs.ACTIVITIES_FOR_TODAY_HEADER]
+    if not activities:
+        parts.append(dialogs.NO_ACTIVITIES_TODAY)
+    for act in activities:
+        parts.append(tpl.TODAY_ACTIVITY_LINE(icon=activity_icon(act), name=act.name, subject_name=act.subject.name))
+    return "".join(parts)
+
+
+def render_next_class(now: datetime, current, upcoming: tuple[date, object] | None) -> str:
+    """Aula em andamento e próxima aula (/proxima); upcoming é (data, aula) ou None."""
+    if current is None and upcoming is None:
+        return dialogs.NEXT_CLASS_NO_SUBJECTS
+    parts = []
+    if current is not None:
+        parts.append(tpl.NEXT_CLASS_NOW(name=current.name, end=_hhmm(current.end_time), room=current.room))
+    if upcoming is not None:
+        day, slot = upcoming
+        if day == now.date():
+            when = dialogs.NEXT_CLASS_TODAY
+        elif day == now.date() + timedelta(days=1):
+            when = dialogs.NEXT_CLASS_TOMORROW
+        else:
+            when = dialogs.NEXT_CLASS_DAY.format(weekday=WEEKDAY_NAMES[day.weekday()], date=day.strftime("%d/%m"))
+        parts.append(tpl.NEXT_CLASS(
+            name=slot.name, when=when, start=_hhmm(slot.start_time), end=_hhmm(slot.end_time), room=slot.room,
+        ))
+        # Minutos cheios até o início: 18:59:30 para 19:00 é "1 min", nunca negativo
+        start = datetime.combine(day, slot.start_time)
+        minutes = max(0, int((start - now.replace(second=0, microsecond=0)).total_seconds() // 60))
+        if minutes < 24 * 60:
+            wait = f"{minutes // 60}h{minutes % 60:02d}" if minutes >= 60 else f"{minutes} min"
+            parts.append(tpl.NEXT_CLASS_WAIT(wait=wait))
+    return "".join(parts)
+
+
+def render_week(start: date, end: date, activities: Sequence) -> str:
+    """Atividades dos próximos 7 dias (/semana)."""
+    parts = [tpl.AGENDA_WEEK_HEADER(start=start.strftime("%d/%m"), end=end.strftime("%d/%m"))]
+    if not activities:
+        parts.append(dialogs.NO_ACTIVITIES_WEEK)
+    for act in activities:
+        parts.append(tpl.WEEK_ACTIVITY_LINE(
+            date_str=act.due_date.strftime("%d/%m (%a)"), icon=activity_icon(act),
+            name=act.name, subject_name=act.subject.name,
+        ))
+    return "".join(parts)
+
+
+def page_keyboard(prev_data: str | None, next_data: str | None) -> InlineKeyboardMarkup | None:
+    """Botões Anterior/Próxima de uma listagem paginada (None quando há uma página só)."""
+    row = []
+    if prev_data:
+        row.append(InlineKeyboardButton(dialogs.PAGE_PREVIOUS, callback_data=prev_data))
+    if next_data:
+        row.append(InlineKeyboardButton(dialogs.PAGE_NEXT, callback_data=next_data))
+    return InlineKeyboardMarkup([row]) if row else None
+
+
+# =============================================================================
+# Divisão de mensagens longas
+# =============================================================================
+
+# O Telegram conta o tamanho em unidades UTF-16 (emojis fora do BMP contam 2)
+MESSAGE_LIMIT = MessageLimit.MAX_TEXT_LENGTH
+# Tags, entidades, espaços, palavras e um "<" ou "&" solto: nunca são cortados ao meio
+_ATOM = re.compile(r"<[^>]*>|&#?\w+;|\s+|[^<&\s]+|[<&]")
+_TAG = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9-]*)[^>]*>")
+
+
+def _units(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _pieces(text: str, limit: int) -> Iterator[str]:
+    """Linhas inteiras; linhas grandes demais viram palavras (e palavras enormes, fatias)."""
+    piece_limit = limit // 2
+    for line in text.splitlines(keepends=True):
+        if _units(line) <= piece_limit:
+            yield line
+            continue
+        for atom in _ATOM.findall(line):
+            while _units(atom) > piece_limit:
+                yield atom[:piece_limit // 2]
+                atom = atom[piece_limit // 2:]
+            yield atom
+
+
+def _open_tags(stack: list, piece: str) -> list:
+    """Pilha de tags abertas (nome, tag de abertura) depois de `piece`."""
+    if "<" not in piece:
+        return stack
+    stack = list(stack)
+    for match in _TAG.finditer(piece):
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            stack.append((name, match.group(0)))
+            continue
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == name:
+                del stack[i:]
+                break
+    return stack
+
+
+def _closing(stack: list) -> str:
+    return "".join(f"</{name}>" for name, _ in reversed(stack))
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Divide um HTML em mensagens de até `limit` unidades, de preferência em quebras de
+    linha. Tags abertas no ponto de corte são fechadas no fim de uma parte e reabertas
+    no começo da seguinte, então cada parte é um HTML válido por si só.
+    """
+    if len(text) * 2 <= limit or _units(text) <= limit:
+        return [text]
+
+    chunks = []
+    parts, size, stack, has_content = [], 0, [], False
+    for piece in _pieces(text, limit):
+        new_stack = _open_tags(stack, piece)
+        needed = _units(piece) + _units(_closing(new_stack))
+        if has_content and size + needed > limit:
+            chunks.append("".join(parts) + _closing(stack))
+            reopen = "".join(tag for _, tag in stack)
+            parts, size, has_content = [reopen], _units(reopen), False
+        parts.append(piece)
+        size += _units(piece)
+        stack = new_stack
+        has_content = has_content or not piece.isspace()
+    if has_content:
+        chunks.append("".join(parts) + _closing(stack))
+    return chunks
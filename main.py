@@ -1,32 +1,69 @@
 # main.py
 
 import logging
-from telegram import BotCommand
+from telegram import BotCommand, Update
 from telegram.ext import (
     Application,
     ApplicationBuilder,
+    ContextTypes,
     CommandHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
+    TypeHandler,
 )
-from datetime import time
-
-from bot.core.settings import TELEGRAM_TOKEN
-from bot.db.base import Base, engine
+from datetime import datetime, time
+
+from bot.core.settings import (
+    TELEGRAM_TOKEN,
+    USER_DATA_SWEEP_INTERVAL,
+    LEADER_LOCK_KEY,
+    LEADER_HEARTBEAT_INTERVAL,
+    NOTIFICATION_DISPATCH_INTERVAL,
+    FLOOD_RATE,
+    FLOOD_BURST,
+    FLOOD_COALESCE_WINDOW,
+    DB_POOL_MODE,
+    DB_DIRECT_URL,
+    STATS_REFRESH_INTERVAL,
+    CALENDAR_HTTP_HOST,
+    CALENDAR_HTTP_PORT,
+)
+from bot.calendar_server import CALENDAR_SERVER_KEY, start_calendar_server, stop_calendar_server
+from bot.core.callbacks import router
+from bot.core.cluster import ELECTOR_KEY, LeaderElector
+from bot.core.outbound import PriorityRateLimiter
+from bot.core.ratelimit import FLOOD_CONTROL_KEY, FloodControl
+from bot.db.base import direct_engine
 from bot.db import models
+from bot.db.leader import create_leader_lock
+from bot.db.migrations import ensure_schema
+from bot.db.persistence import SQLAlchemyPersistence
+from bot.db.unit_of_work import BotContext, UnitOfWorkApplication, commit_current
 
 # Importa todas as funções e setups de handlers
-from bot.handlers.common import start, help_command, button_handler, today_command, week_command
+from bot.handlers.common import start, help_command, today_command, next_class_command, week_command, track_user_activity, track_bot_membership, flood_control, error_handler
 from bot.handlers.reminder_handler import setup_reminder_handler
 from bot.handlers.subject_handler import list_subjects, setup_subject_handler, setup_management_handler, setup_report_handler
 from bot.handlers.activity_handler import list_activities, setup_activity_handler, setup_activity_management_handler
 from bot.handlers.absence_handler import setup_absence_handler, setup_absence_management_handler, report_absences
-from bot.handlers.grade_handler import setup_grade_handler, setup_grade_management_handler
+from bot.handlers.grade_handler import setup_grade_handler, setup_grade_management_handler, averages_command
 from bot.handlers.import_handler import setup_import_handler
 from bot.handlers.bug_report_handler import setup_bug_report_handler
 from bot.handlers.fatec_handler import setup_fatec_handler
-from bot.handlers.user_settings_handler import setup_delete_user_handler
+from bot.handlers.user_settings_handler import setup_delete_user_handler, reminder_preferences
 from bot.handlers.admin_handler import setup_admin_handlers
-from bot.jobs import check_deadlines_job
+from bot.handlers.export_handler import export_command
+from bot.jobs import (
+    check_deadlines_job,
+    sweep_stale_user_data_job,
+    leader_heartbeat_job,
+    dispatch_notifications_job,
+    purge_notifications_job,
+    log_metrics_job,
+    refresh_stats_job,
+    attendance_warnings_job,
+    refresh_attendance_limits_job,
+)
 
 
 # Configura o logging
@@ -45,6 +82,7 @@ async def post_init_configuration(application: Application) -> None:
         BotCommand("start", "Inicia o bot e mostra o menu principal"),
         BotCommand("help", "Mostra a lista de todos os comandos"),
         BotCommand("hoje", "Resumo do dia (aulas e atividades)"),
+        BotCommand("proxima", "Mostra a próxima aula"),
         BotCommand("semana", "Lista as atividades dos próximos 7 dias"),
         BotCommand("grade", "Exibe sua grade horária completa"),
         BotCommand("calendario", "Lista seus trabalhos e provas"),
@@ -55,6 +93,7 @@ async def post_init_configuration(application: Application) -> None:
         BotCommand("faltei", "Registra uma ou mais faltas"),
         BotCommand("faltas", "Exibe o total de faltas por matéria"),
         BotCommand("addnota", "Lança uma nova nota para uma matéria"),
+        BotCommand("medias", "Mostra suas médias e quanto falta para passar"),
         BotCommand("gerenciarmaterias", "Edita ou exclui suas matérias"),
         BotCommand("gerenciarfaltas", "Edita ou exclui registros de faltas"),
         BotCommand("gerenciartrabalhos", "Edita ou exclui trabalhos"),
@@ -64,36 +103,103 @@ async def post_init_configuration(application: Application) -> None:
         BotCommand("deletardados", "Apaga permanentemente todos os seus dados do bot"),
         BotCommand("broadcast", "(Admin) Envia uma mensagem para todos os usuários"),
         BotCommand("enviar", "(Admin) Envia mensagem para um usuário"),
+        BotCommand("stats", "(Admin) Estatísticas de uso do bot"),
         BotCommand("lembrar", "Cria um lembrete personalizado"),
+        BotCommand("lembretes", "Escolhe o horário e a antecedência dos lembretes de prazos"),
+        BotCommand("exportar", "Envia suas aulas e atividades para o app de calendário"),
     ]
     await application.bot.set_my_commands(commands)
 
+    # Decide já na inicialização quem roda as tarefas agendadas
+    if DB_POOL_MODE == "transaction" and not DB_DIRECT_URL:
+        logger.warning("DB_POOL_MODE=transaction sem DB_DIRECT_URL: o lock de liderança pode não ser confiável.")
+    elector = LeaderElector(create_leader_lock(direct_engine, LEADER_LOCK_KEY))
+    application.bot_data[ELECTOR_KEY] = elector
+    await elector.heartbeat()
+
+    # Link de assinatura do calendário (.ics), se configurado
+    if CALENDAR_HTTP_PORT:
+        application.bot_data[CALENDAR_SERVER_KEY] = start_calendar_server(CALENDAR_HTTP_HOST, CALENDAR_HTTP_PORT)
+
+
+async def post_shutdown_cleanup(application: Application) -> None:
+    """Libera a liderança para que outra instância assuma sem esperar e para o servidor do calendário."""
+    server = application.bot_data.pop(CALENDAR_SERVER_KEY, None)
+    if server is not None:
+        stop_calendar_server(server)
+    elector = application.bot_data.get(ELECTOR_KEY)
+    if elector is not None:
+        await elector.resign()
+
 
 def main() -> None:
     """Inicia o bot e o mantém rodando."""
 
-    logger.info("Criando/Verificando tabelas no banco de dados...")
-    Base.metadata.create_all(bind=engine)
-    logger.info("Tabelas verificadas/criadas com sucesso.")
+    # Uma consulta à schema_version; só migra se o banco estiver desatualizado
+    schema_version = ensure_schema(direct_engine)
+    logger.info(f"Esquema do banco na versão {schema_version}.")
 
-    application = ApplicationBuilder().token(TELEGRAM_TOKEN).post_init(post_init_configuration).build()
+    # O estado das conversas e o user_data sobrevivem a reinícios (veja bot/db/persistence.py)
+    application = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        # Cada atualização usa uma única sessão do banco (context.db), confirmada no final
+        .application_class(UnitOfWorkApplication)
+        .context_types(ContextTypes(context=BotContext))
+        .persistence(SQLAlchemyPersistence())
+        # Todas as chamadas à API passam por uma fila com prioridades e limites de envio;
+        # antes de cada uma, o que a atualização gravou é confirmado
+        .rate_limiter(PriorityRateLimiter(before_send=commit_current))
+        .post_init(post_init_configuration)
+        .post_shutdown(post_shutdown_cleanup)
+        .build()
+    )
 
 
 
      # --- Agendamento de Tarefas Recorrentes ---
     job_queue = application.job_queue
-    # Agenda a tarefa para rodar todo dia às 09:00 da manhã
-    job_queue.run_daily(check_deadlines_job, time=time(hour=9, minute=0), name="check_deadlines_daily")
+    # Com várias instâncias, só a líder roda as tarefas globais (veja bot/core/cluster.py)
+    job_queue.run_repeating(leader_heartbeat_job, interval=LEADER_HEARTBEAT_INTERVAL, name="leader_heartbeat")
+    # A cada minuto, enfileira os lembretes de prazo de quem escolheu aquele horário (/lembretes)
+    job_queue.run_repeating(check_deadlines_job, interval=60, first=60 - datetime.now().second, name="check_deadlines")
+    # Envia o que estiver pendente na fila de notificações (roda em todas as instâncias)
+    job_queue.run_repeating(dispatch_notifications_job, interval=NOTIFICATION_DISPATCH_INTERVAL, name="dispatch_notifications")
+    job_queue.run_daily(purge_notifications_job, time=time(hour=4, minute=0), name="purge_notifications_daily")
+    job_queue.run_repeating(log_metrics_job, interval=5 * 60, name="log_metrics")
+    # Estatísticas do /stats: a líder recalcula e grava; o comando só lê
+    job_queue.run_repeating(refresh_stats_job, interval=STATS_REFRESH_INTERVAL, first=30, name="refresh_stats")
+    # Limites de faltas: recalcula na virada do semestre (e logo após subir); os avisos só leem o saldo
+    job_queue.run_repeating(refresh_attendance_limits_job, interval=24 * 60 * 60, first=20, name="refresh_attendance_limits")
+    job_queue.run_repeating(attendance_warnings_job, interval=60 * 60, first=5 * 60, name="attendance_warnings")
+    # Limpa periodicamente o user_data de quem abandonou um fluxo no meio
+    job_queue.run_repeating(sweep_stale_user_data_job, interval=USER_DATA_SWEEP_INTERVAL, name="sweep_stale_user_data")
     
     
+    # --- Controle de flood: descarta rajadas de um mesmo usuário antes de tudo ---
+    application.bot_data[FLOOD_CONTROL_KEY] = FloodControl(FLOOD_RATE, FLOOD_BURST, FLOOD_COALESCE_WINDOW)
+    application.add_handler(TypeHandler(Update, flood_control), group=-2)
+
+    # --- Registra a atividade de cada usuário antes de qualquer outro handler ---
+    application.add_handler(TypeHandler(Update, track_user_activity), group=-1)
+    # Marca como inativo quem bloqueia o bot (e reativa quem desbloqueia)
+    application.add_handler(ChatMemberHandler(track_bot_membership, ChatMemberHandler.MY_CHAT_MEMBER))
+
+    # Erros dos handlers (e do COMMIT de cada atualização) viram um aviso para o usuário
+    application.add_error_handler(error_handler)
+
     # --- Registra os Handlers de Comando ---
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("hoje", today_command))
+    application.add_handler(CommandHandler("proxima", next_class_command))
     application.add_handler(CommandHandler("semana", week_command))
     application.add_handler(CommandHandler("grade", list_subjects))
     application.add_handler(CommandHandler("calendario", list_activities))
     application.add_handler(CommandHandler("faltas", report_absences))
+    application.add_handler(CommandHandler("lembretes", reminder_preferences))
+    application.add_handler(CommandHandler("exportar", export_command))
+    application.add_handler(CommandHandler("medias", averages_command))
     
     # --- Registra os Handlers de Conversa ---
     application.add_handler(setup_subject_handler())
@@ -113,7 +219,8 @@ def main() -> None:
     application.add_handler(setup_reminder_handler())
     
     # --- Handlers de Callback (Botões Genéricos) ---
-    application.add_handler(CallbackQueryHandler(button_handler))
+    # Cliques que nenhuma conversa tratou: despacho por ação (veja bot/core/callbacks.py)
+    application.add_handler(CallbackQueryHandler(router.dispatch))
 
     logger.info("Iniciando o bot e o agendador de tarefas...")
     application.run_polling()
@@ -2,15 +2,16 @@
 
 import json
 from datetime import datetime
-from bot.db.base import SessionLocal, engine
-from bot.db.models import CourseSubject, Base
+from bot.db.base import SessionLocal, direct_engine
+from bot.db.models import CourseSubject
+from bot.db.migrations import ensure_schema
 
 def seed_database():
     """
     Lê o arquivo JSON e popula a tabela de matérias do curso usando uma
     estratégia de 'update ou insert' (upsert) para manter os dados existentes.
     """
-    Base.metadata.create_all(bind=engine)
+    ensure_schema(direct_engine)
     db = SessionLocal()
 
     print("Lendo o arquivo courses.json...")